@@ -4,7 +4,13 @@ import argparse
 import vcf
 import subprocess
 import shlex
+from contextlib import ExitStack
 import tabix
+import pandas as pd
+from circos_io import open_input, open_output, as_file, has_tabix_index, fetch_chromosome, map_chromosomes, index_circos_data, sorted_lines, karyotype_key
+from circos_cache import add_cache_arguments, cached_conversion
+from circos_stats import stats, add_stats_arguments, instrument
+from circos_tracks import collapse_segments, add_downsample_arguments, downsample_track
 
 # Prepare chromosome conversio ndictionary
 chrDict = dict() 
@@ -14,45 +20,117 @@ for i in chromosomeList:
 
 svtype2color = dict({'BND': 'black', 'DEL': 'yellow', 'DUP': 'blue', 'INV': 'orange', 'INS': 'green', 'TRA': 'black'})
 
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 2
+
 def argument_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', required=True, help='input smoothened CNV file')
+    parser.add_argument('-i', '--input', required=True, help='input smoothened CNV file, - for stdin')
     parser.add_argument('-o', '--output_dir', required=False, default=os.getcwd(), help='folder to write output')
+    parser.add_argument('--output', required=False, default=None, help='output .circosData file, - for stdout, overrides --output_dir')
+    parser.add_argument('--chunk_size', required=False, default=500000, type=int, help='number of rows read and written at a time')
+    parser.add_argument('--collapse', required=False, action='store_true', help='merge consecutive points with the same copy number into one segment')
+    parser.add_argument('--tolerance', required=False, default=0, type=float, help='with --collapse, also merge points within this copy number difference')
+    parser.add_argument('-t', '--threads', required=False, default=1, type=int, help='processes converting chromosomes in parallel, if the input is bgzipped and tabix indexed')
+    parser.add_argument('--unsorted', required=False, action='store_true', help='input is not coordinate sorted, sort it in bounded memory first')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_downsample_arguments(parser)
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
     args = parser.parse_args()
-    return args.input, args.output_dir
+    if args.input == '-' and args.output == None:
+        parser.error('--output is required when reading from stdin')
+    if args.output == '-' and args.index:
+        parser.error('--index needs an output file')
+    if args.output == None:
+        args.output = output_path(args.input, args.output_dir)
+    return args.input, args.output, args.chunk_size, args.collapse, args.tolerance, args.threads, args.unsorted, args.max_points, args.cluster_distance, args.index, args.cache_dir, args.cache_max_size, args.stats, args.profile
 
 
 def output_path(inputfile, output_dir):
     return os.path.join(output_dir, os.path.basename(inputfile) + '.circosData')
 
 
-def parse_smoothened_cnv_file(inputfile, output_dir):
-    """takes structural variation vcf file as input and parse them into 
-    appropriately formatted data file for Circos"""
-    outputfile = output_path(inputfile, output_dir)
+def read_smoothened_cnv_chunks(handle, chunk_size):
+    """yields chunks of chromosome, position, end, cnv columns with hs chromosome names, 
+    other contigs and NA values already removed. Each point is a zero length interval"""
+    chunks = pd.read_csv(handle, sep=r'\s+', comment='#', header=None, usecols=[0, 1, 4], names=['chromosome', 'position', 'cnv'],
+                         dtype=str, keep_default_na=False, na_values=['NA'], chunksize=chunk_size)
+    for chunk in chunks:
+        read = len(chunk)
+        chunk = chunk[chunk['chromosome'].isin(chrDict.keys())]
+        major = len(chunk)
+        chunk = chunk.dropna(subset=['cnv'])
+        stats.count('records_read', read)
+        stats.count('filtered_contig', read - major)
+        stats.count('na_dropped', major - len(chunk))
+        yield chunk.assign(chromosome=chunk['chromosome'].map(chrDict), end=chunk['position'])[['chromosome', 'position', 'end', 'cnv']]
+
+
+def iter_smoothened_cnv_lines(lines, chunk_size=500000, collapse=False, tolerance=0):
+    """yields circosData lines from smoothened CNV lines, 
+    such as an open file or the output of another generator"""
+    chunks = read_smoothened_cnv_chunks(as_file(lines), chunk_size)
+    if collapse:
+        rows = (row for chunk in chunks for row in chunk.itertuples(index=False, name=None))
+        for hschr, start, end, cnv in collapse_segments(rows, tolerance):
+            stats.count('records_written')
+            yield f'{hschr}\t{start}\t{end}\t{cnv}\n'
+    else:
+        for chunk in chunks:
+            stats.count('records_written', len(chunk))
+            yield from chunk.to_csv(sep='\t', header=False, index=False).splitlines(keepends=True)
+
 
-    with open(outputfile, 'w') as g:
-        with open(inputfile, 'r') as f:
-            for line in f:
-                if not line.startswith('#'):
-                    chromosome, position, _, _, cnv = line.strip().split()
-                    if cnv != 'NA':
-                        
-                        if chromosome in chrDict.keys():
-                            hschr = chrDict[chromosome]
-                            information = f'{hschr}\t{position}\t{position}\t{cnv}\n'
-                            g.write(information)
+def convert_smoothened_cnv_chromosome(inputfile, chromosome, chunk_size, collapse=False, tolerance=0):
+    """circosData of one chromosome of a tabix indexed smoothened CNV file, run in a worker process"""
+    return ''.join(iter_smoothened_cnv_lines(fetch_chromosome(inputfile, chromosome), chunk_size, collapse, tolerance))
 
 
+def convert_smoothened_cnv_file(inputfile, outputfile, chunk_size=500000, collapse=False, tolerance=0, threads=1, unsorted=False, max_points=None, cluster_distance=0):
+    """takes smoothened CNV file as input and parse them into 
+    appropriately formatted data file for Circos, - for stdin or stdout
+    rows are read, filtered and written chunk_size at a time as columns
+    a tabix indexed input is converted one chromosome per process when threads > 1
+    an unsorted input is streamed through an external merge sort into karyotype order
+    with max_points, the lines are downsampled on their way to the output"""
+    with ExitStack() as stack:
+        if threads > 1 and has_tabix_index(inputfile):
+            texts = map_chromosomes(convert_smoothened_cnv_chromosome, inputfile, chromosomeList, threads, chunk_size, collapse, tolerance)
+            lines = (line for text in texts for line in text.splitlines(keepends=True))
+        else:
+            lines = stack.enter_context(open_input(inputfile))
+            if unsorted:
+                lines = sorted_lines(lines, karyotype_key(chromosomeList))
+            lines = iter_smoothened_cnv_lines(lines, chunk_size, collapse, tolerance)
+        if max_points != None:
+            lines = downsample_track(lines, max_points, cluster_distance)
 
-    
-    return 0                    
+        g = stack.enter_context(open_output(outputfile))
+        g.writelines(lines)
+
+    return 0
+
+
+def parse_smoothened_cnv_file(inputfile, output_dir, chunk_size=500000, collapse=False, tolerance=0, threads=1, unsorted=False, max_points=None, cluster_distance=0):
+    """convert_smoothened_cnv_file writing to output_dir"""
+    return convert_smoothened_cnv_file(inputfile, output_path(inputfile, output_dir), chunk_size, collapse, tolerance, threads, unsorted, max_points, cluster_distance)
         
                     
 def main():
     # take input file 
-    input, output_dir = argument_parser()
-    parse_smoothened_cnv_file(input, output_dir)
+    input, output, chunk_size, collapse, tolerance, threads, unsorted, max_points, cluster_distance, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
+    def convert():
+        with stats.stage('convert'):
+            convert_smoothened_cnv_file(input, output, chunk_size, collapse, tolerance, threads, unsorted, max_points, cluster_distance)
+
+    params = dict({'collapse': collapse, 'tolerance': tolerance, 'max_points': max_points, 'cluster_distance': cluster_distance, 'unsorted': unsorted})
+    with instrument('abscn2circos', stats_path, profile_path):
+        if cached_conversion(cache_dir, 'abscn2circos', CONVERTER_VERSION, [input], params, dict({'circosData': output}), convert, cache_max_size):
+            stats.count('cache_hit')
+        if index:
+            with stats.stage('index'):
+                index_circos_data(output)
 
 
 
@@ -0,0 +1,117 @@
+"""
+Binned coverage track for Circos computed straight from an indexed BAM/CRAM file
+
+"""
+
+import os, sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pysam
+from circos_cache import add_cache_arguments, cached_conversion, file_signature
+from circos_stats import stats, add_stats_arguments, instrument
+from circos_io import index_circos_data
+
+
+# Prepare chromosome conversio ndictionary
+chrDict = dict()
+chromosomeList = [str(i) for i in range(1,23)] + ['X', 'Y', 'MT']
+for i in chromosomeList:
+    chrDict.update({i: 'hs'+i})
+
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 1
+
+def argument_parser():
+    parser = argparse.ArgumentParser(
+        description='Writes binned coverage .circosData from an indexed BAM/CRAM file, one worker per chromosome')
+    parser.add_argument('-i', '--input', required=True, help='indexed BAM or CRAM file')
+    parser.add_argument('-o', '--output', required=False, default=None, help='output .circosData file, defaults to input file name + .circosData')
+    parser.add_argument('-w', '--window', required=False, default=100000, type=int, help='bin size in bases')
+    parser.add_argument('-q', '--min_mapq', required=False, default=0, type=int, help='skip reads below this mapping quality')
+    parser.add_argument('-r', '--reference', required=False, default=None, help='reference fasta, needed for CRAM input')
+    parser.add_argument('-t', '--threads', required=False, default=1, type=int, help='number of chromosomes processed in parallel')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+    return args.input, args.output, args.window, args.min_mapq, args.reference, args.threads, args.index, args.cache_dir, args.cache_max_size, args.stats, args.profile
+
+def output_path(inputfile):
+    return inputfile + '.circosData'
+
+
+def alignment_index(bamfile):
+    """path of the .bai, .csi or .crai index of a BAM/CRAM file, None if there is none"""
+    candidates = [bamfile + '.bai', os.path.splitext(bamfile)[0] + '.bai', bamfile + '.csi', bamfile + '.crai', os.path.splitext(bamfile)[0] + '.crai']
+    return next((candidate for candidate in candidates if os.path.isfile(candidate)), None)
+
+
+def chromosome_coverage(bamfile, chromosome, window, min_mapq, reference=None):
+    """mean depth per window of a single chromosome as circosData lines
+    runs in its own worker process, so it opens its own handle to the BAM/CRAM"""
+    with pysam.AlignmentFile(bamfile, reference_filename=reference) as bam:
+        length = bam.get_reference_length(chromosome)
+        covered_bases = np.zeros(length // window + 1, dtype=np.int64)
+        for read in bam.fetch(chromosome):
+            if read.is_unmapped or read.is_secondary or read.is_supplementary or read.is_duplicate or read.is_qcfail:
+                continue
+            if read.mapping_quality < min_mapq:
+                continue
+            # spread each aligned block over the windows it spans
+            for block_start, block_end in read.get_blocks():
+                first, last = block_start // window, (block_end - 1) // window
+                if first == last:
+                    covered_bases[first] += block_end - block_start
+                else:
+                    covered_bases[first] += (first + 1) * window - block_start
+                    covered_bases[first + 1:last] += window
+                    covered_bases[last] += block_end - last * window
+
+    circosChr = chrDict[chromosome]
+    lines = []
+    for index, bases in enumerate(covered_bases):
+        start = index * window
+        end = min(start + window, length)
+        if end > start:
+            lines.append(f'{circosChr}\t{start + 1}\t{end}\t{bases / (end - start):.2f}\n')
+    return lines
+
+
+def parse_bam_coverage(inputfile, outputfile, window, min_mapq=0, reference=None, threads=1):
+    """computes binned coverage of every major chromosome in the BAM/CRAM header in a process pool
+    and writes them in karyotype order"""
+    with pysam.AlignmentFile(inputfile, reference_filename=reference) as bam:
+        chromosomes = [chromosome for chromosome in chromosomeList if chromosome in bam.references]
+
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        jobs = [executor.submit(chromosome_coverage, inputfile, chromosome, window, min_mapq, reference) for chromosome in chromosomes]
+        with open(outputfile, 'w') as f:
+            # first line
+            f.write('# chr1 start1 end1 chr2 start2 end2 [options]\n')
+            for job in jobs:
+                lines = job.result()
+                f.writelines(lines)
+                stats.count('records_written', len(lines))
+
+
+def main():
+    input, output, window, min_mapq, reference, threads, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
+    if output == None:
+        output = output_path(input)
+    # the BAM/CRAM is keyed by size and modification time rather than hashed, which would read all of it on every run
+    params = dict({'window': window, 'min_mapq': min_mapq, 'alignments': file_signature(input), 'index': file_signature(alignment_index(input)),
+                   'reference': file_signature(reference)})
+    with instrument('bam2circos', stats_path, profile_path):
+        with stats.stage('convert'):
+            if cached_conversion(cache_dir, 'bam2circos', CONVERTER_VERSION, [], params, dict({'circosData': output}),
+                                 lambda: parse_bam_coverage(input, output, window, min_mapq, reference, threads), cache_max_size):
+                stats.count('cache_hit')
+        if index:
+            with stats.stage('index'):
+                index_circos_data(output)
+    print(f'Output Circos Data file is written: {output}')
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Benchmarks of the *2circos converters on deterministic synthetic inputs
+
+Each converter is run as a separate process on fixtures generated from a fixed seed, reporting
+records per second, peak RSS and whether its outputs match a golden manifest of sha256 digests.
+Record a manifest with --update_golden before a change, then rerun after it to compare.
+
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from circos_tracks import chromosomeLength
+
+
+scriptDIR = os.path.dirname(os.path.abspath(__file__))
+chromosomeList = [str(i) for i in range(1,23)] + ['X', 'Y']
+bases = 'ACGT'
+
+def argument_parser():
+    """parses argument passed on from command line"""
+    parser = argparse.ArgumentParser(
+        description='Runs every converter on synthetic fixtures and reports records/sec, peak RSS and output equivalence')
+
+    parser.add_argument('-s', '--sizes', required=False, nargs='+', default=[1000, 100000], type=int, help='number of records of each fixture, e.g. 1000 100000 10000000')
+    parser.add_argument('-b', '--benchmarks', required=False, nargs='+', default=None, help='benchmarks to run, defaults to all')
+    parser.add_argument('-w', '--workdir', required=False, default=os.path.join(os.getcwd(), 'benchmark_data'), help='folder for fixtures and outputs, fixtures are reused between runs')
+    parser.add_argument('-g', '--golden', required=False, default=None, help='golden manifest of output digests, defaults to golden.json in workdir')
+    parser.add_argument('-u', '--update_golden', required=False, action='store_true', help='record the outputs of this run as the golden manifest')
+    parser.add_argument('--seed', required=False, default=1, type=int, help='seed of the fixture generators')
+    parser.add_argument('--json', required=False, default=None, help='also write the results as JSON to this file')
+    args = parser.parse_args()
+    if args.golden == None:
+        args.golden = os.path.join(args.workdir, 'golden.json')
+    return args.sizes, args.benchmarks, args.workdir, args.golden, args.update_golden, args.seed, args.json
+
+
+# fixture generators, each writes n records to path deterministically from seed
+def chromosome_counts(n):
+    """n records split over the chromosomes in proportion to their length"""
+    total = sum(chromosomeLength[chromosome] for chromosome in chromosomeList)
+    counts = [n * chromosomeLength[chromosome] // total for chromosome in chromosomeList]
+    counts[0] += n - sum(counts)
+    return zip(chromosomeList, counts)
+
+
+def snv_positions(rng, chromosome, count):
+    """sorted SNV positions of one chromosome, about 5% of them in kataegis like clusters"""
+    positions = []
+    while len(positions) < count:
+        if rng.random() < 0.005:
+            focus = rng.randint(1, chromosomeLength[chromosome] - 20000)
+            positions.extend(focus + rng.randint(0, 5000) for _ in range(rng.randint(6, 20)))
+        else:
+            positions.append(rng.randint(1, chromosomeLength[chromosome]))
+    return sorted(positions[:count])
+
+
+def vcf_header(f, samples, formats):
+    f.write('##fileformat=VCFv4.2\n')
+    for chromosome in chromosomeList:
+        f.write(f'##contig=<ID={chromosome},length={chromosomeLength[chromosome]}>\n')
+    for key, number, kind in [('SVTYPE', '1', 'String'), ('END', '1', 'Integer'), ('CHR2', '1', 'String'), ('SVLEN', '.', 'Integer')]:
+        f.write(f'##INFO=<ID={key},Number={number},Type={kind},Description="{key}">\n')
+    for key, number, kind in formats:
+        f.write(f'##FORMAT=<ID={key},Number={number},Type={kind},Description="{key}">\n')
+    f.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t' + '\t'.join(samples) + '\n')
+
+
+def generate_snv_vcf(path, n, seed, caller='mutect'):
+    """Mutect (GT:AD:FA) or Strelka (tier counts per base) somatic SNV vcf"""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        if caller == 'mutect':
+            vcf_header(f, ['TUMOR', 'NORMAL'], [('GT', '1', 'String'), ('AD', 'R', 'Integer'), ('FA', 'A', 'Float')])
+        else:
+            vcf_header(f, ['NORMAL', 'TUMOR'], [('DP', '1', 'Integer')] + [(base + 'U', '2', 'Integer') for base in bases])
+        for chromosome, count in chromosome_counts(n):
+            for position in snv_positions(rng, chromosome, count):
+                REF = rng.choice(bases)
+                ALT = rng.choice(bases.replace(REF, ''))
+                depth = rng.randint(20, 120)
+                alt_count = rng.randint(1, depth)
+                if caller == 'mutect':
+                    samples = f'GT:AD:FA\t0/1:{depth - alt_count},{alt_count}:{alt_count / depth:.3f}\t0/0:{depth},0:0.000'
+                else:
+                    tumor = ':'.join(f'{alt_count},{alt_count}' if base == ALT else (f'{depth - alt_count},{depth - alt_count}' if base == REF else '0,0') for base in bases)
+                    normal = ':'.join(f'{depth},{depth}' if base == REF else '0,0' for base in bases)
+                    samples = f'DP:AU:CU:GU:TU\t{depth}:{normal}\t{depth}:{tumor}'
+                f.write(f'{chromosome}\t{position}\t.\t{REF}\t{ALT}\t.\tPASS\t.\t{samples}\n')
+
+
+def sv_events(n, seed):
+    """(svtype, chromosome1, position1, chromosome2, position2) of n SVs, a third of the
+    breakpoints clustered around a few hotspots as in chromothripsis or amplicons"""
+    rng = random.Random(seed)
+    hotspots = [(rng.choice(chromosomeList[:22]), rng.randint(1000000, 40000000)) for _ in range(20)]
+    def random_breakpoint():
+        if rng.random() < 0.33:
+            chromosome, center = rng.choice(hotspots)
+            return chromosome, max(1, center + rng.randint(-50000, 50000))
+        chromosome = rng.choice(chromosomeList)
+        return chromosome, rng.randint(1, chromosomeLength[chromosome] - 1000000)
+
+    events = []
+    for _ in range(n):
+        svtype = rng.choice(['DEL', 'DUP', 'INV', 'INS', 'BND'])
+        chromosome1, position1 = random_breakpoint()
+        if svtype == 'BND':
+            chromosome2, position2 = random_breakpoint()
+        else:
+            chromosome2, position2 = chromosome1, position1 + (rng.randint(1, 50) if svtype == 'INS' else rng.randint(50, 1000000))
+        events.append((svtype, chromosome1, position1, chromosome2, position2))
+    return events
+
+
+def generate_sv_vcf(path, n, seed, caller='delly'):
+    """Delly or Manta SV vcf of the same n events, each caller missing some and placing breakpoints
+    up to 300bp apart, Manta writing both mates of a BND"""
+    rng = random.Random(seed + (1 if caller == 'delly' else 2))
+    records = []
+    for i, (svtype, chromosome1, position1, chromosome2, position2) in enumerate(sv_events(n, seed)):
+        if rng.random() < 0.15:
+            continue
+        position1 += rng.randint(-300, 300)
+        position2 += rng.randint(-300, 300)
+        position2 = max(position2, position1) if chromosome1 == chromosome2 else max(1, position2)
+        position1 = max(1, position1)
+        if caller == 'delly':
+            ALT = f'N]{chromosome2}:{position2}]' if svtype == 'BND' else f'<{svtype}>'
+            records.append((chromosome1, position1, f'{caller}{i}', ALT, f'SVTYPE={svtype};CHR2={chromosome2};END={position2}'))
+        elif svtype == 'BND':
+            records.append((chromosome1, position1, f'{caller}{i}_1', f'N]{chromosome2}:{position2}]', 'SVTYPE=BND'))
+            records.append((chromosome2, position2, f'{caller}{i}_2', f'N]{chromosome1}:{position1}]', 'SVTYPE=BND'))
+        else:
+            records.append((chromosome1, position1, f'{caller}{i}', f'<{svtype}>', f'END={position2};SVTYPE={svtype};SVLEN={position2 - position1}'))
+
+    records.sort(key=lambda record: (chromosomeList.index(record[0]), record[1]))
+    with open(path, 'w') as f:
+        vcf_header(f, ['TUMOR', 'NORMAL'], [('GT', '1', 'String')])
+        for chromosome, position, ID, ALT, INFO in records:
+            f.write(f'{chromosome}\t{position}\t{ID}\tN\t{ALT}\t.\tPASS\t{INFO}\tGT\t0/1\t0/0\n')
+
+
+def generate_depth(path, n, seed):
+    """samtools depth output of n consecutive bases, with copy number steps every 100kb"""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        written = 0
+        for chromosome in chromosomeList:
+            for start in range(1, chromosomeLength[chromosome] + 1, 100000):
+                level = rng.choice([15, 30, 30, 30, 45, 60])
+                for position in range(start, min(start + 100000, chromosomeLength[chromosome] + 1)):
+                    if written == n:
+                        return
+                    f.write(f'{chromosome}\t{position}\t{max(0, int(rng.gauss(level, 5)))}\n')
+                    written += 1
+
+
+def generate_cnr(path, n, seed):
+    """CNVkit .cnr of n 1kb bins, log2 ratios drawn around piecewise constant segments"""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('chromosome\tstart\tend\tgene\tlog2\tdepth\tweight\n')
+        for chromosome, count in chromosome_counts(n):
+            segment = 0.0
+            for i in range(count):
+                if rng.random() < 0.001:
+                    segment = rng.choice([-1.0, -0.4, 0.0, 0.0, 0.3, 0.6])
+                f.write(f'{chromosome}\t{i * 1000}\t{(i + 1) * 1000}\t-\t{rng.gauss(segment, 0.15):.5f}\t{rng.uniform(5, 60):.3f}\t{rng.uniform(0.5, 1):.3f}\n')
+
+
+def generate_smoothened_cnv(path, n, seed):
+    """whitespace separated smoothened absolute copy number points, copy number in the fifth column"""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('#chrom\tpos\tratio\tsmoothed\tcn\n')
+        for chromosome, count in chromosome_counts(n):
+            copy_number = 2
+            for i in range(count):
+                if rng.random() < 0.001:
+                    copy_number = rng.choice([0, 1, 2, 2, 3, 4])
+                f.write(f'{chromosome}\t{i * 1000}\t{rng.uniform(0.5, 1.5):.3f}\t{rng.uniform(0.5, 1.5):.3f}\t{copy_number}\n')
+
+
+# every benchmark: fixtures to generate as (name, generator, keyword arguments) and the converter command line,
+# where {workdir} and fixture names are filled in and {out} is an output prefix. Outputs are the files starting with {out}
+benchmarks = dict({
+    'snv2circos_mutect': dict({
+        'fixtures': [('mutect.vcf', generate_snv_vcf, dict({'caller': 'mutect'}))],
+        'command': ['snv2circos.py', '-i', '{mutect.vcf}', '-c', 'mutect', '-y', 'vaf', 'rainfall', 'kataegis', '-o', '{out}.circosData']}),
+    'snv2circos_strelka': dict({
+        'fixtures': [('strelka.vcf', generate_snv_vcf, dict({'caller': 'strelka'}))],
+        'command': ['snv2circos.py', '-i', '{strelka.vcf}', '-c', 'strelka', '-y', 'vaf', '-o', '{out}.vaf.circosData']}),
+    'sv2circos': dict({
+        'fixtures': [('delly.vcf', generate_sv_vcf, dict({'caller': 'delly'}))],
+        'command': ['sv2circos.py', '-i', '{delly.vcf}', '-c', 'delly', '-o', '{out}.circosData']}),
+    'delly_vs_manta': dict({
+        'fixtures': [('delly.vcf', generate_sv_vcf, dict({'caller': 'delly'})), ('manta.vcf', generate_sv_vcf, dict({'caller': 'manta'}))],
+        'command': ['delly_vs_manta.py', '--delly', '{delly.vcf}', '--manta', '{manta.vcf}', '-d', '1000', '-o', '{workdir}', '-s', '{name}']}),
+    'depth2circos': dict({
+        'fixtures': [('depth.txt', generate_depth, dict())],
+        'command': ['depth2circos.py', '-i', '{depth.txt}', '-o', '{out}.circosData', '-w', '1000']}),
+    'cnvkit2circos': dict({
+        'fixtures': [('cnvkit.cnr', generate_cnr, dict())],
+        'command': ['cnvkit2circos.py', '-i', '{cnvkit.cnr}']}),
+    'abscn2circos': dict({
+        'fixtures': [('smoothened.txt', generate_smoothened_cnv, dict())],
+        'command': ['abscn2circos.py', '-i', '{smoothened.txt}', '-o', '{workdir}']}),
+})
+
+
+def fixture_path(workdir, name, n, seed):
+    return os.path.join(workdir, f'{n}.{seed}.{name}')
+
+
+def prepare_fixtures(benchmark, workdir, n, seed):
+    """paths of the fixtures of a benchmark, generated only if missing"""
+    paths = dict()
+    for name, generator, kwargs in benchmarks[benchmark]['fixtures']:
+        path = fixture_path(workdir, name, n, seed)
+        if not os.path.isfile(path):
+            generator(path + '.tmp', n, seed, **kwargs)
+            os.replace(path + '.tmp', path)
+        paths[name] = path
+    return paths
+
+
+def output_files(workdir, benchmark, n, seed):
+    """outputs of a benchmark run, the .circosData files named after its run or fixtures"""
+    prefixes = [f'{benchmark}.{n}.{seed}'] + [os.path.basename(fixture_path(workdir, name, n, seed)) for name, _, _ in benchmarks[benchmark]['fixtures']]
+    return sorted(os.path.join(workdir, name) for name in os.listdir(workdir)
+                  if name.endswith('.circosData') and any(name.startswith(prefix + '.') for prefix in prefixes))
+
+
+def run_converter(command):
+    """runs a converter in a child process, returns wall time in seconds and its peak RSS in MB"""
+    env = dict(os.environ)
+    env.pop('CIRCOSPREP_CACHE', None) # always convert, never copy from the cache
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable] + command, stdout=subprocess.DEVNULL, env=env)
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return wall, rusage.ru_maxrss / 1024 # ru_maxrss is in KB on Linux
+
+
+def digest(paths):
+    """sha256 over the content of output files"""
+    total = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                total.update(block)
+    return total.hexdigest()
+
+
+def fill(argument, fields):
+    """replaces {field} placeholders of a command line argument, fixture names contain dots so str.format does not fit"""
+    for field, value in fields.items():
+        argument = argument.replace('{' + field + '}', value)
+    return argument
+
+
+def run_benchmark(benchmark, workdir, n, seed):
+    """generates the fixtures and runs one benchmark, returns its result as a dictionary"""
+    fixtures = prepare_fixtures(benchmark, workdir, n, seed)
+    for output in output_files(workdir, benchmark, n, seed):
+        os.remove(output)
+
+    name = f'{benchmark}.{n}.{seed}'
+    fields = dict(fixtures, workdir=workdir, name=name, out=os.path.join(workdir, name))
+    command = [os.path.join(scriptDIR, benchmarks[benchmark]['command'][0])] + [fill(argument, fields) for argument in benchmarks[benchmark]['command'][1:]]
+    wall, peak_rss = run_converter(command)
+    return dict({'benchmark': benchmark, 'records': n, 'seconds': round(wall, 3), 'records_per_second': round(n / wall),
+                 'peak_rss_mb': round(peak_rss, 1), 'digest': digest(output_files(workdir, benchmark, n, seed))})
+
+
+def main():
+    sizes, selected, workdir, golden_path, update_golden, seed, json_path = argument_parser()
+    os.makedirs(workdir, exist_ok=True)
+    golden = dict()
+    if os.path.isfile(golden_path):
+        with open(golden_path, 'r') as f:
+            golden = json.load(f)
+
+    results = []
+    failed = 0
+    print(f'{"benchmark":<20}{"records":>10}{"seconds":>10}{"records/s":>12}{"peak MB":>10}  output')
+    for benchmark in (selected if selected != None else benchmarks):
+        for n in sizes:
+            result = run_benchmark(benchmark, workdir, n, seed)
+            key = f'{benchmark}/{n}/{seed}'
+            if update_golden:
+                golden[key] = result['digest']
+                result['output'] = 'recorded'
+            elif key not in golden:
+                result['output'] = 'no golden'
+            elif golden[key] == result['digest']:
+                result['output'] = 'same'
+            else:
+                result['output'] = 'DIFFERENT'
+                failed += 1
+            results.append(result)
+            print(f'{benchmark:<20}{n:>10}{result["seconds"]:>10.2f}{result["records_per_second"]:>12}{result["peak_rss_mb"]:>10.1f}  {result["output"]}')
+
+    if update_golden:
+        with open(golden_path, 'w') as f:
+            json.dump(golden, f, indent=1, sort_keys=True)
+    if json_path != None:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=1)
+    return 1 if failed else 0
+
+if __name__=='__main__':
+    sys.exit(main())
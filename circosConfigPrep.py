@@ -4,10 +4,9 @@ Combined Structural variation callset from both DELLY and MANTA
 """
 
 import argparse
-import re
 import os
-import subprocess
-import shlex
+import sys
+from circos_template import load_template, placeholder_name, read_manifest, render_manifest
 
 
 def argument_parser():
@@ -16,56 +15,54 @@ def argument_parser():
         description='Writes a configuration file for Circos Plot from .circosData inputs')
 
 
-    parser.add_argument('--cnv', required=True, help='CNV circosData')
-    parser.add_argument('--sv', required=True, help='SV circosData')
-    parser.add_argument('--sampleName', required=True, help='Sample name prefix for output configuration file')
+    parser.add_argument('--cnv', required=False, help='CNV circosData')
+    parser.add_argument('--sv', required=False, help='SV circosData')
+    parser.add_argument('--sampleName', required=False, help='Sample name prefix for output configuration file')
     parser.add_argument('-o', '--outputDIR', required=False, default=os.getcwd())
     parser.add_argument('-t', '--template', required=True, help='Template configuration file')
-    parser.add_argument('--vaf', required=True, help='SNV Vaf circosData')
-    parser.add_argument('--rainfall', required=True, help='SNV Rainfall circosData')
+    parser.add_argument('--vaf', required=False, help='SNV Vaf circosData')
+    parser.add_argument('--rainfall', required=False, help='SNV Rainfall circosData')
+    parser.add_argument('--set', required=False, action='append', default=[], metavar='PLACEHOLDER=VALUE', help='binds any other <PLACEHOLDER> of the template, repeat for several')
+    parser.add_argument('-m', '--manifest', required=False, help='tab separated sample manifest with a header of sample and one column per placeholder (sv, cnv, vaf, rainfall or the placeholder name), writes one configuration per sample')
 
     args = vars(parser.parse_args())
+    if (args['manifest'] == None) == (args['sampleName'] == None):
+        parser.error('give either --sampleName or --manifest')
 
-    outputDIR = args['outputDIR']
-    sampleName = args['sampleName']
-    sv = args['sv']
-    cnv = args['cnv']
-    template = args['template']
-    rainfall = args['rainfall']
-    vaf = args['vaf']
-    return sv, cnv, outputDIR, sampleName, template, rainfall, vaf
+    bindings = dict()
+    for assignment in args['set']:
+        name, separator, value = assignment.partition('=')
+        if separator == '':
+            parser.error(f'--set needs PLACEHOLDER=VALUE, got {assignment}')
+        bindings[placeholder_name(name)] = value
+    for option in ['sv', 'cnv', 'vaf', 'rainfall']:
+        if args[option] != None:
+            bindings[placeholder_name(option)] = args[option]
+
+    return bindings, args['outputDIR'], args['sampleName'], args['template'], args['manifest']
 
 
 def create_configuration(template, sv, cnv, snv_vaf, snv_rainfall, circosConfig, circosPlot):
-    """read in template file, 
-    substitue <SVCIRCOS>, <CNVCIRCOS>, <SNV_VAF_CIRCOS>, <SNV_RAINFALL_CIRCOS>, <OUTPUTFILE> to respective file names"""
-    with open(template, 'r') as f:
-        with open(circosConfig, 'w') as g:
-            for line in f:
-                if re.search(string=line, pattern=r'<OUTPUTFILE>') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<OUTPUTFILE>', repl=circosPlot)
-                elif re.search(string=line, pattern=r'<SVCIRCOS>') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<SVCIRCOS>', repl=sv)
-                elif re.search(string=line, pattern=r'<CNVCIRCOS>') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<CNVCIRCOS>', repl=cnv)
-                elif re.search(string=line, pattern=r'<SNV_VAF_CIRCOS') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<SNV_VAF_CIRCOS>', repl=snv_vaf)
-                elif re.search(string=line, pattern=r'<SNV_RAINFALL_CIRCOS') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<SNV_RAINFALL_CIRCOS>', repl=snv_rainfall)
-                else:
-                    replaced_line = line 
-            
-                g.write(replaced_line)
+    """renders template with <SVCIRCOS>, <CNVCIRCOS>, <SNV_VAF_CIRCOS>, <SNV_RAINFALL_CIRCOS>, <OUTPUTFILE>
+    substituted by the respective file names"""
+    bindings = dict({'SVCIRCOS': sv, 'CNVCIRCOS': cnv, 'SNV_VAF_CIRCOS': snv_vaf, 'SNV_RAINFALL_CIRCOS': snv_rainfall, 'OUTPUTFILE': circosPlot})
+    load_template(template).write(bindings, circosConfig)
 
 
 
 def main():
-    sv, cnv, outputDIR, sampleName, template, rainfall, vaf = argument_parser()
-
-    circosConfig= os.path.join(outputDIR, sampleName + '.conf')
-    circosPlot = os.path.join(outputDIR, sampleName + '.circosPlot.png')
-    create_configuration(template, sv, cnv, vaf, rainfall, circosConfig, circosPlot)
-    print(f'Output Circos Configuration file is written: {circosConfig}')
+    bindings, outputDIR, sampleName, template, manifest = argument_parser()
+
+    if manifest != None:
+        samples = read_manifest(manifest)
+    else:
+        samples = [(sampleName, dict())]
+    try:
+        circosConfigs = render_manifest(load_template(template), samples, outputDIR, bindings)
+    except ValueError as e:
+        sys.exit(f'error: {e}')
+    for circosConfig in circosConfigs:
+        print(f'Output Circos Configuration file is written: {circosConfig}')
     return 0
 
 if __name__=='__main__':
@@ -0,0 +1,145 @@
+"""
+Renders Circos configurations in a bounded process pool, with a timeout and memory cap per plot,
+retrying failed plots and skipping plots whose image is newer than their configuration and data
+
+"""
+
+import argparse
+import os
+import re
+import resource
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+DEFAULT_CIRCOS = os.environ.get('CIRCOS', 'circos') # circos executable, found on PATH unless set here or with --circos
+
+def argument_parser():
+    """parses argument passed on from command line"""
+    parser = argparse.ArgumentParser(
+        description='Runs Circos on every given configuration file, several at a time')
+
+    parser.add_argument('configs', nargs='+', help='Circos configuration files, e.g. written by circosConfigPrep.py')
+    parser.add_argument('--circos', required=False, default=DEFAULT_CIRCOS, help='circos executable, defaults to $CIRCOS or circos on PATH')
+    parser.add_argument('-j', '--jobs', required=False, default=os.cpu_count(), type=int, help='number of plots rendered in parallel')
+    parser.add_argument('--timeout', required=False, default=None, type=float, help='seconds after which a Circos run is killed')
+    parser.add_argument('--max_memory', required=False, default=None, type=float, help='address space limit of each Circos run in GB')
+    parser.add_argument('-r', '--retries', required=False, default=1, type=int, help='times a failed or timed out plot is rerun')
+    parser.add_argument('-f', '--force', required=False, action='store_true', help='render plots even if their images are up to date')
+    args = vars(parser.parse_args())
+
+    return args['configs'], args['circos'], args['jobs'], args['timeout'], args['max_memory'], args['retries'], args['force']
+
+
+def config_files(circosConfig):
+    """(image, data files) of a Circos configuration
+    the image is dir/file of the <image> block, data files are the file = entries of all other blocks"""
+    image_dir, image_file = '.', None
+    data = []
+    block = []
+    with open(circosConfig, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            opening = re.fullmatch(r'<(/?)(\w+)>', line)
+            if opening != None:
+                if opening.group(1):
+                    block.pop()
+                else:
+                    block.append(opening.group(2))
+                continue
+            match = re.fullmatch(r'(dir|file)\s*=\s*(\S+)', line)
+            if match == None:
+                continue
+            key, value = match.groups()
+            if 'image' in block:
+                if key == 'dir':
+                    image_dir = value
+                else:
+                    image_file = value
+            elif key == 'file':
+                data.append(value)
+
+    image = os.path.join(image_dir, image_file) if image_file != None else None
+    return image, data
+
+
+def is_up_to_date(image, inputs):
+    """true if the image exists and is newer than every existing input"""
+    if image == None or not os.path.isfile(image):
+        return False
+    inputs = [input for input in inputs if os.path.isfile(input)]
+    return os.path.getmtime(image) >= max(os.path.getmtime(input) for input in inputs)
+
+
+def limit_memory(max_memory):
+    """preexec function capping the address space of a Circos run at max_memory GB"""
+    def preexec():
+        limit = int(max_memory * (1 << 30))
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return preexec
+
+
+def run_circos(circos, circosConfig, timeout=None, max_memory=None):
+    """runs Circos once on circosConfig, logging to circosConfig + .log
+    returns the exit code, or None if the run was killed after timeout seconds"""
+    with open(circosConfig + '.log', 'w') as log:
+        process = subprocess.Popen([circos, '-conf', circosConfig], stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                                   preexec_fn=limit_memory(max_memory) if max_memory != None else None)
+        try:
+            return process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL) # Circos and anything it spawned
+            process.wait()
+            return None
+
+
+def render(circos, circosConfig, timeout=None, max_memory=None, retries=1, force=False):
+    """renders one configuration in this worker process, retrying failed runs
+    returns (status, attempts, seconds); a failed plot leaves no partial image behind"""
+    image, data = config_files(circosConfig)
+    if not force and is_up_to_date(image, [circosConfig] + data):
+        return 'up to date', 0, 0.0
+
+    start = time.perf_counter()
+    for attempt in range(1, retries + 2):
+        returncode = run_circos(circos, circosConfig, timeout, max_memory)
+        if returncode == 0:
+            return 'rendered', attempt, time.perf_counter() - start
+    if image != None and os.path.isfile(image):
+        os.remove(image)
+    reason = f'timed out after {timeout:g}s' if returncode == None else f'exit code {returncode}'
+    return f'failed: {reason}, see {circosConfig}.log', attempt, time.perf_counter() - start
+
+
+def render_all(circosConfigs, circos, jobs, timeout=None, max_memory=None, retries=1, force=False):
+    """renders configurations in a pool of at most jobs processes, printing progress, returns the number of failed plots"""
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = dict({executor.submit(render, circos, circosConfig, timeout, max_memory, retries, force): circosConfig for circosConfig in circosConfigs})
+        for done, future in enumerate(as_completed(futures), start=1):
+            circosConfig = futures[future]
+            try:
+                status, attempts, seconds = future.result()
+                if status == 'rendered':
+                    status = f'rendered in {seconds:.1f}s' + (f' on attempt {attempts}' if attempts > 1 else '')
+            except Exception as e:
+                status = f'failed: {e!r}'
+            if status.startswith('failed'):
+                failed += 1
+            print(f'[{done}/{len(futures)}] {circosConfig}: {status}', flush=True)
+
+    return failed
+
+
+def main():
+    circosConfigs, circos, jobs, timeout, max_memory, retries, force = argument_parser()
+    failed = render_all(circosConfigs, circos, jobs, timeout, max_memory, retries, force)
+    if failed:
+        print(f'{failed} of {len(circosConfigs)} plots failed')
+    return 1 if failed else 0
+
+if __name__=='__main__':
+    sys.exit(main())
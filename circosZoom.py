@@ -0,0 +1,135 @@
+"""
+Region of interest zoom plots from indexed .circosData.gz tracks
+
+"""
+
+import argparse
+import os
+import re
+
+from circos_io import fetch_region
+from circosConfigPrep import create_configuration
+
+
+WHOLE_CHROMOSOME = 1 << 29 # end of a region given as a bare chromosome, beyond any human chromosome
+
+def argument_parser():
+    """parses argument passed on from command line"""
+    parser = argparse.ArgumentParser(
+        description='Writes a Circos configuration restricted to given regions, fetching only those intervals from indexed .circosData.gz tracks')
+
+    parser.add_argument('-r', '--region', required=True, action='append', help='region to display as 8:120000000-130000000 or hs8:120000000-130000000, repeat for several regions')
+    parser.add_argument('--cnv', required=True, help='indexed CNV circosData.gz')
+    parser.add_argument('--sv', required=True, help='indexed SV circosData.gz')
+    parser.add_argument('--vaf', required=True, help='indexed SNV Vaf circosData.gz')
+    parser.add_argument('--rainfall', required=True, help='indexed SNV Rainfall circosData.gz')
+    parser.add_argument('--sampleName', required=True, help='Sample name prefix for output configuration file')
+    parser.add_argument('-o', '--outputDIR', required=False, default=os.getcwd())
+    parser.add_argument('-t', '--template', required=True, help='Template configuration file')
+
+    args = vars(parser.parse_args())
+    return args['region'], args['sv'], args['cnv'], args['vaf'], args['rainfall'], args['sampleName'], args['outputDIR'], args['template']
+
+
+def parse_region(region):
+    """(hs chromosome, start, end) of a region string, a bare chromosome spans the whole chromosome"""
+    chromosome, _, interval = region.replace(',', '').partition(':')
+    if not chromosome.startswith('hs'):
+        chromosome = 'hs' + chromosome
+    if interval == '':
+        return chromosome, 1, WHOLE_CHROMOSOME
+    start, end = interval.split('-')
+    return chromosome, int(start), int(end)
+
+
+def merge_regions(regions):
+    """regions sorted by chromosome and start, with overlapping or adjacent regions of a chromosome merged into one"""
+    merged = []
+    for chromosome, start, end in sorted(regions):
+        if merged and merged[-1][0] == chromosome and start <= merged[-1][2] + 1:
+            merged[-1] = (chromosome, merged[-1][1], max(end, merged[-1][2]))
+        else:
+            merged.append((chromosome, start, end))
+    return merged
+
+
+def in_regions(chromosome, position, regions):
+    """true if chromosome:position falls in any region"""
+    return any(chromosome == region_chromosome and start <= position <= end for region_chromosome, start, end in regions)
+
+
+def zoom_track(indexed, outputfile, regions, links=False):
+    """writes the lines of an indexed circosData track that overlap regions into a plain circosData file
+    for links both ends have to fall in a region, since Circos cannot draw a link to a hidden chromosome
+    regions have to be merged by merge_regions. A feature spanning the gap between two regions of a chromosome is written once"""
+    with open(outputfile, 'w') as f:
+        previous_chromosome, spanning = None, set()
+        for chromosome, start, end in regions:
+            if chromosome != previous_chromosome:
+                spanning = set()
+            written = spanning
+            spanning = set() # features reaching past this region, which the next one fetches again
+            for line in fetch_region(indexed, chromosome, start, end):
+                if int(line.split('\t', 3)[2]) > end:
+                    spanning.add(line)
+                if line in written:
+                    continue
+                if links:
+                    fields = line.split('\t')
+                    if not in_regions(fields[3], int(fields[4]), regions):
+                        continue
+                f.write(line)
+            previous_chromosome = chromosome
+
+
+def restrict_chromosomes(circosConfig, regions):
+    """replaces the chromosome selection of a rendered configuration by the merged zoom regions,
+    in units of the configuration's chromosomes_units, with the ranges of a chromosome joined by commas"""
+    with open(circosConfig, 'r') as f:
+        lines = f.readlines()
+
+    units = 1
+    for line in lines:
+        match = re.match(r'\s*chromosomes_units\s*=\s*(\d+)', line)
+        if match != None:
+            units = int(match.group(1))
+
+    ranges = dict()
+    for chromosome, start, end in regions:
+        ranges.setdefault(chromosome, []).append(None if end == WHOLE_CHROMOSOME else f'{(start - 1) / units:g}-{end / units:g}')
+    selection = ';'.join(chromosome if None in chromosome_ranges else f"{chromosome}:{','.join(chromosome_ranges)}"
+                         for chromosome, chromosome_ranges in ranges.items())
+    with open(circosConfig, 'w') as f:
+        for line in lines:
+            if re.match(r'\s*chromosomes_display_default\s*=', line):
+                line = 'chromosomes_display_default = no\n'
+            elif re.match(r'\s*chromosomes\s*=', line):
+                line = f'chromosomes = {selection}\n'
+            f.write(line)
+
+
+def zoom(regions, sv, cnv, vaf, rainfall, sampleName, outputDIR, template):
+    """fetches the regions from every track and writes a region restricted configuration"""
+    regions = merge_regions(regions)
+    tracks = dict({'sv': sv, 'cnv': cnv, 'vaf': vaf, 'rainfall': rainfall})
+    zoomed = dict()
+    for track, indexed in tracks.items():
+        zoomed[track] = os.path.join(outputDIR, f'{sampleName}.zoom.{track}.circosData')
+        zoom_track(indexed, zoomed[track], regions, links=(track == 'sv'))
+
+    circosConfig = os.path.join(outputDIR, sampleName + '.zoom.conf')
+    circosPlot = os.path.join(outputDIR, sampleName + '.zoom.circosPlot.png')
+    create_configuration(template, zoomed['sv'], zoomed['cnv'], zoomed['vaf'], zoomed['rainfall'], circosConfig, circosPlot)
+    restrict_chromosomes(circosConfig, regions)
+    return circosConfig
+
+
+def main():
+    region_strings, sv, cnv, vaf, rainfall, sampleName, outputDIR, template = argument_parser()
+    regions = [parse_region(region) for region in region_strings]
+    circosConfig = zoom(regions, sv, cnv, vaf, rainfall, sampleName, outputDIR, template)
+    print(f'Output Circos Configuration file is written: {circosConfig}')
+    return 0
+
+if __name__=='__main__':
+    main()
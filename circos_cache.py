@@ -0,0 +1,101 @@
+"""
+Content addressed on-disk cache of converter outputs
+
+A conversion is keyed by the converter name and version, the content of its input files and its
+parameters. A hit copies the cached outputs into place instead of recomputing them. Least recently
+used entries are evicted once the cache grows past its size limit. Inputs too large to hash on every
+run, such as BAM files, can instead be keyed by their file_signature among the parameters.
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+DEFAULT_CACHE_DIR = os.environ.get('CIRCOSPREP_CACHE') # caching is off unless set here or with --cache_dir
+DEFAULT_MAX_SIZE = 10 # GB
+
+
+def add_cache_arguments(parser):
+    """adds --cache_dir and --cache_max_size to a converter's argument parser"""
+    parser.add_argument('--cache_dir', required=False, default=DEFAULT_CACHE_DIR, help='reuse outputs of earlier runs with the same input content and parameters, defaults to $CIRCOSPREP_CACHE')
+    parser.add_argument('--cache_max_size', required=False, default=DEFAULT_MAX_SIZE, type=float, help='cache size in GB above which least recently used entries are evicted')
+
+
+def file_digest(path, blocksize=1 << 20):
+    """sha256 of the content of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    """path, size and modification time of a file, a stand-in for its digest that costs one stat call
+    None for a missing file or path"""
+    if path == None or not os.path.isfile(path):
+        return None
+    status = os.stat(path)
+    return [os.path.realpath(path), status.st_size, status.st_mtime_ns]
+
+
+def cache_key(converter, version, inputs, params):
+    """hex key of a conversion, changes with the converter version, input content or any parameter"""
+    digest = hashlib.sha256()
+    digest.update(f'{converter}\t{version}\n'.encode())
+    for input in inputs:
+        digest.update(file_digest(input).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def evict(cache_dir, max_size):
+    """removes least recently used entries until cache_dir holds at most max_size GB"""
+    entries = []
+    for key in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, key)
+        if os.path.isdir(entry) and not key.startswith('.'):
+            size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_size * 1e9:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def cached_conversion(cache_dir, converter, version, inputs, params, outputs, convert, max_size=DEFAULT_MAX_SIZE):
+    """runs convert() to write outputs, unless the cache already holds them for this conversion
+    outputs maps a name to each output path. Returns True on a cache hit.
+    the cache is bypassed if cache_dir is None, an input is stdin or an output is stdout"""
+    if cache_dir == None or '-' in inputs or '-' in outputs.values():
+        convert()
+        return False
+
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, cache_key(converter, version, inputs, params))
+    if all(os.path.isfile(os.path.join(entry, name)) for name in outputs):
+        for name, output in outputs.items():
+            shutil.copyfile(os.path.join(entry, name), output)
+        os.utime(entry) # mark as recently used
+        return True
+
+    convert()
+
+    # fill a temporary entry and rename it, so concurrent runs never see a partial entry
+    staging = tempfile.mkdtemp(dir=cache_dir, prefix='.staging.')
+    for name, output in outputs.items():
+        shutil.copyfile(output, os.path.join(staging, name))
+    try:
+        os.rename(staging, entry)
+    except OSError: # another run stored the same entry first
+        shutil.rmtree(staging, ignore_errors=True)
+
+    evict(cache_dir, max_size)
+    return False
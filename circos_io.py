@@ -0,0 +1,230 @@
+"""
+Streaming input helpers shared by the *2circos converters
+
+"""
+
+import gzip
+import heapq
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+import pysam
+import tabix
+from circos_stats import counted, collect_counts
+
+
+GZIP_MAGIC = b'\x1f\x8b' # gzip and BGZF both start with these two bytes
+SORT_CHUNK_SIZE = 1000000 # lines held in memory at a time by sorted_lines
+
+
+def is_gzipped(path):
+    """true if file at path is gzip or BGZF compressed, regardless of its extension"""
+    with open(path, 'rb') as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+class ProcessOutput(io.TextIOWrapper):
+    '''text stream of the stdout of a subprocess. Closing it waits for the process and raises
+    CalledProcessError if it failed, so a failing or killed decompressor cannot pass for a short input'''
+    def __init__(self, process):
+        super().__init__(process.stdout)
+        self.process = process
+
+    def close(self):
+        if self.closed:
+            return
+        stopped_early = self.buffer.read(1) != b'' # the reader did not consume the whole output
+        super().close()
+        if stopped_early:
+            self.process.kill()
+        returncode = self.process.wait()
+        if not stopped_early and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, self.process.args)
+
+
+def open_input(path, threads=1):
+    """open a plain, gzip or BGZF compressed text file for streaming, without temporary copies
+    '-' reads from stdin. If threads > 1 and bgzip is available, BGZF blocks of a file are
+    decompressed by `bgzip -@` and piped in, closing the file raises if bgzip failed"""
+    if path == '-':
+        stdin = sys.stdin.buffer
+        if stdin.peek(2)[:2] == GZIP_MAGIC:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=stdin))
+        return io.TextIOWrapper(stdin)
+
+    if not is_gzipped(path):
+        return open(path, 'r')
+
+    if threads > 1 and shutil.which('bgzip') != None:
+        bgzipcmd = ['bgzip', '--decompress', '--stdout', '--threads', str(threads), path]
+        process = subprocess.Popen(bgzipcmd, stdout=subprocess.PIPE)
+        return ProcessOutput(process)
+
+    return gzip.open(path, 'rt')
+
+
+def open_output(path):
+    """open a text file for writing, '-' writes to stdout, which is left open when the handle is closed"""
+    if path == '-':
+        return open(sys.stdout.fileno(), 'w', closefd=False)
+    return open(path, 'w')
+
+
+class LineFile(io.TextIOBase):
+    '''read only text file over an iterable of lines, for readers such as pandas that need a file'''
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.pending = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size == None or size < 0:
+            text, self.pending = self.pending + ''.join(self.lines), ''
+            return text
+        parts = [self.pending]
+        length = len(self.pending)
+        for line in self.lines:
+            parts.append(line)
+            length += len(line)
+            if length >= size:
+                break
+        text = ''.join(parts)
+        text, self.pending = text[:size], text[size:]
+        return text
+
+    def readline(self, size=-1):
+        if self.pending:
+            line, separator, rest = self.pending.partition('\n')
+            if separator:
+                self.pending = rest
+                return line + separator
+            self.pending = ''
+            return line + next(self.lines, '') # rest of a line split by read
+        return next(self.lines, '')
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if line == '':
+            raise StopIteration
+        return line
+
+
+def as_file(lines):
+    """lines as a readable text file, open files are returned as they are"""
+    return lines if hasattr(lines, 'read') else LineFile(lines)
+
+
+def has_tabix_index(path):
+    """true if path is a file with a tabix index next to it, so it can be read one chromosome at a time"""
+    return path != '-' and os.path.isfile(path + '.tbi')
+
+
+def read_header(path, comment='#'):
+    """header lines at the top of a file, up to the first data line"""
+    header = []
+    with open_input(path) as f:
+        for line in f:
+            if not line.startswith(comment):
+                break
+            header.append(line)
+    return header
+
+
+def fetch_chromosome(path, chromosome):
+    """yields the data lines of one chromosome of a bgzipped, tabix indexed file
+    nothing is yielded if the index does not know the chromosome"""
+    try:
+        for fields in tabix.open(path).querys(chromosome):
+            yield '\t'.join(fields) + '\n'
+    except tabix.TabixError:
+        return
+
+
+def fetch_region(path, chromosome, start, end):
+    """yields the data lines of a bgzipped, tabix indexed file overlapping chromosome:start-end, 1-based"""
+    try:
+        for fields in tabix.open(path).query(chromosome, start - 1, end):
+            yield '\t'.join(fields) + '\n'
+    except tabix.TabixError:
+        return
+
+
+def circos_sort_key(line):
+    """orders circosData lines by the karyotype position of their first chromosome and start"""
+    chromosome, start, _ = line.split('\t', 2)
+    number = chromosome[2:]
+    return (int(number) if number.isdigit() else ord(number[0]) + 100, number, int(start))
+
+
+def karyotype_key(chromosomes):
+    """sort key of tab or space separated lines starting with chromosome and position, in the order of chromosomes
+    such as a chromosomeList, other contigs after them by name"""
+    rank = dict({chromosome: i for i, chromosome in enumerate(chromosomes)})
+    def key(line):
+        chromosome, position, _ = line.split(None, 2)
+        return (rank.get(chromosome, len(rank)), chromosome, int(position))
+    return key
+
+
+def sorted_lines(lines, key, comment='#', chunk_size=SORT_CHUNK_SIZE):
+    """yields the header lines starting with comment, then the remaining lines sorted by key
+    at most chunk_size lines are held in memory: each sorted chunk is spilled to a temporary file
+    and the spill files are k-way merged with heapq.merge, so inputs of any size can be sorted"""
+    chunk = []
+    with ExitStack() as stack:
+        spills = []
+        for line in lines:
+            if not line.endswith('\n'): # last line of a file without newline, would run into the next line of a spill
+                line += '\n'
+            if not chunk and not spills and line.startswith(comment):
+                yield line
+                continue
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                spill = stack.enter_context(tempfile.TemporaryFile('w+'))
+                spill.writelines(sorted(chunk, key=key))
+                spill.seek(0)
+                spills.append(spill)
+                chunk = []
+
+        chunk.sort(key=key)
+        yield from heapq.merge(*spills, chunk, key=key)
+
+
+def sort_to_file(inputfile, outputfile, key, comment='#', chunk_size=SORT_CHUNK_SIZE):
+    """writes the lines of inputfile sorted by key with sorted_lines, for readers that need a file"""
+    with open_input(inputfile) as f, open(outputfile, 'w') as g:
+        g.writelines(sorted_lines(f, key, comment, chunk_size))
+    return outputfile
+
+
+def index_circos_data(path, zerobased=False):
+    """writes a coordinate sorted, bgzipped copy of a circosData file to path + '.gz' and tabix indexes it
+    on the first chromosome, start and end columns. The plain file is kept for Circos itself
+    zerobased marks tracks whose starts are 0-based like BED, such as the CNVkit segments, so that region queries stay 1-based"""
+    indexed = path + '.gz'
+    with open(path, 'r') as f, pysam.BGZFile(indexed, 'wb') as g:
+        for line in sorted_lines(f, circos_sort_key):
+            g.write(line.encode())
+    pysam.tabix_index(indexed, seq_col=0, start_col=1, end_col=2, meta_char='#', zerobased=zerobased, force=True)
+    return indexed
+
+
+def map_chromosomes(function, path, chromosomes, threads, *args):
+    """runs function(path, chromosome, *args) for every chromosome in a pool of threads processes
+    and yields the results in the order of chromosomes, i.e. karyotype order for chromosomeList
+    the counts function adds to stats in the workers are added to the stats of this process"""
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        jobs = [executor.submit(counted, function, path, chromosome, *args) for chromosome in chromosomes]
+        for job in jobs:
+            yield collect_counts(job.result())
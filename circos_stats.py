@@ -0,0 +1,95 @@
+"""
+Run statistics of the *2circos converters: record counters, per-stage wall and CPU time and peak memory
+
+Converters count into the module level `stats` and time their stages with `stats.stage(name)`.
+`instrument` wraps a converter run, writing the statistics as JSON for --stats and a cProfile
+dump for --profile. Functions run in worker processes (-t/--threads) are wrapped in `counted`,
+which returns their counts with their result, and `collect_counts` adds them to the parent's `stats`.
+
+"""
+
+import cProfile
+import collections
+import json
+import resource
+import time
+from contextlib import contextmanager
+
+
+class Stats():
+    '''record counters and accumulated wall/CPU seconds per stage of one converter run'''
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.stages = dict()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name):
+        """times the enclosed block, adding to earlier time of the same stage"""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, dict({'wall_seconds': 0.0, 'cpu_seconds': 0.0}))
+            stage['wall_seconds'] += time.perf_counter() - wall
+            stage['cpu_seconds'] += time.process_time() - cpu
+
+    def report(self, converter):
+        """statistics as a JSON serialisable dictionary"""
+        # ru_maxrss is in KB on Linux, children are the worker processes
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        peak_rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        return dict({
+            'converter': converter,
+            'counters': dict(sorted(self.counters.items())),
+            'stages': dict({name: dict({key: round(value, 4) for key, value in stage.items()}) for name, stage in self.stages.items()}),
+            'peak_rss_mb': round(peak_rss, 1),
+            'peak_rss_children_mb': round(peak_rss_children, 1)})
+
+
+stats = Stats()
+
+
+def counted(function, *args):
+    """(function(*args), the counts it added to stats), for functions run in a worker process,
+    whose own stats are never seen by the parent. Pass the pair to collect_counts in the parent"""
+    before = stats.counters.copy()
+    result = function(*args)
+    # not stats.counters - before, which drops the zero counts a serial run reports
+    counts = collections.Counter({name: n - before[name] for name, n in stats.counters.items() if name not in before or n != before[name]})
+    return result, counts
+
+
+def collect_counts(counted_result):
+    """result of a counted call, after adding the counts of its worker to stats"""
+    result, counts = counted_result
+    stats.counters.update(counts)
+    return result
+
+
+def add_stats_arguments(parser):
+    """adds --stats and --profile to a converter's argument parser"""
+    parser.add_argument('--stats', required=False, default=None, help='write record counts, per-stage wall/CPU time and peak memory as JSON to this file')
+    parser.add_argument('--profile', required=False, default=None, help='write a cProfile dump of the run to this file, for pstats or snakeviz')
+
+
+@contextmanager
+def instrument(converter, stats_path=None, profile_path=None):
+    """runs the enclosed converter body under cProfile if profile_path is given
+    and writes the statistics of the run to stats_path if given, also when it fails"""
+    profiler = None
+    if profile_path != None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with stats.stage('total'):
+            yield stats
+    finally:
+        if profiler != None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if stats_path != None:
+            with open(stats_path, 'w') as f:
+                json.dump(stats.report(converter), f, indent=1)
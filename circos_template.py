@@ -0,0 +1,105 @@
+"""
+Circos configuration templates with <PLACEHOLDER> fields
+
+A template is parsed once into alternating literal text and placeholder names, so rendering a sample
+is a single join. Placeholders are upper case, e.g. <SVCIRCOS>, which keeps them apart from Circos'
+own lower case <plots> blocks and <<include>> directives. Rendering fails if a placeholder is left unbound.
+
+"""
+
+import csv
+import functools
+import os
+import re
+
+
+PLACEHOLDER = re.compile(r'<([A-Z][A-Z0-9_]*)>')
+
+# short names of the placeholders of the bundled templates, as used by the command line options and sample manifests
+placeholder_aliases = dict({
+    'sv': 'SVCIRCOS',
+    'cnv': 'CNVCIRCOS',
+    'vaf': 'SNV_VAF_CIRCOS',
+    'rainfall': 'SNV_RAINFALL_CIRCOS',
+    'plot': 'OUTPUTFILE'})
+
+
+class Template():
+    '''a template split into literal text (even indices of parts) and placeholder names (odd indices)'''
+    def __init__(self, text, name='<template>'):
+        self.name = name
+        self.parts = PLACEHOLDER.split(text)
+        self.placeholders = frozenset(self.parts[1::2])
+
+    def unbound(self, bindings):
+        """sorted placeholders of the template missing from bindings"""
+        return sorted(self.placeholders.difference(bindings))
+
+    def render(self, bindings):
+        """text of the template with every placeholder replaced by its value in bindings
+        raises ValueError naming the unbound placeholders, values are inserted literally"""
+        missing = self.unbound(bindings)
+        if missing:
+            raise ValueError(f"{self.name} has unbound placeholders: {', '.join(missing)}")
+        parts = list(self.parts)
+        parts[1::2] = [str(bindings[name]) for name in self.parts[1::2]]
+        return ''.join(parts)
+
+    def write(self, bindings, outputfile):
+        text = self.render(bindings)
+        with open(outputfile, 'w') as f:
+            f.write(text)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(path, mtime):
+    with open(path, 'r') as f:
+        return Template(f.read(), path)
+
+
+def load_template(path):
+    """compiled template of a file, parsed once per process unless the file changes"""
+    return _compile(path, os.path.getmtime(path))
+
+
+def placeholder_name(key):
+    """placeholder bound by a command line option or manifest column, either its alias or the placeholder itself"""
+    return placeholder_aliases.get(key, key.upper())
+
+
+def read_manifest(manifest):
+    """list of (sample, bindings) of a tab separated manifest with a header of sample and one column per placeholder
+    empty cells are left unbound, lines starting with # are skipped"""
+    samples = []
+    with open(manifest, 'r') as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            sample = row.pop('sample')
+            if sample.startswith('#'):
+                continue
+            samples.append((sample, dict({placeholder_name(key): value for key, value in row.items() if value})))
+    return samples
+
+
+def sample_paths(sample, outputDIR):
+    """configuration file and plot image of a sample"""
+    return os.path.join(outputDIR, sample + '.conf'), os.path.join(outputDIR, sample + '.circosPlot.png')
+
+
+def render_manifest(template, samples, outputDIR, defaults=None):
+    """writes one configuration per (sample, bindings), <OUTPUTFILE> defaults to the sample's plot in outputDIR
+    all samples are validated before any file is written, returns the configuration files"""
+    jobs = []
+    errors = []
+    for sample, bindings in samples:
+        circosConfig, circosPlot = sample_paths(sample, outputDIR)
+        bindings = dict({'OUTPUTFILE': circosPlot, **(defaults or dict()), **bindings})
+        missing = template.unbound(bindings)
+        if missing:
+            errors.append(f"{sample}: {', '.join(missing)}")
+        jobs.append((circosConfig, bindings))
+    if errors:
+        raise ValueError(f'{template.name} has unbound placeholders for ' + '; '.join(errors))
+
+    for circosConfig, bindings in jobs:
+        template.write(bindings, circosConfig)
+    return [circosConfig for circosConfig, _ in jobs]
@@ -0,0 +1,110 @@
+"""
+Track level helpers shared by the *2circos converters
+
+"""
+
+import itertools
+import math
+import os
+
+
+# GRCh37 (hs37d5) contig lengths, matching the hs karyotype used by the Circos templates
+chromosomeLength = dict({
+    '1': 249250621, '2': 243199373, '3': 198022430, '4': 191154276, '5': 180915260,
+    '6': 171115067, '7': 159138663, '8': 146364022, '9': 141213431, '10': 135534747,
+    '11': 135006516, '12': 133851895, '13': 115169878, '14': 107349540, '15': 102531392,
+    '16': 90354753, '17': 81195210, '18': 78077248, '19': 59128983, '20': 63025520,
+    '21': 48129895, '22': 51304566, 'X': 155270560, 'Y': 59373566, 'MT': 16569})
+
+
+def adaptive_window(chromosome, target_points):
+    """window size that splits chromosome into about target_points windows"""
+    return max(1, math.ceil(chromosomeLength[chromosome] / target_points))
+
+
+def collapse_segments(records, tolerance=0):
+    """merges runs of consecutive (chromosome, start, end, value) records on the same chromosome into
+    one segment, as long as each value is within tolerance of the value that opened the segment
+    the merged segment keeps that first value, so with tolerance 0 only equal values are merged"""
+    segment = None
+    for chromosome, start, end, value in records:
+        if segment != None and chromosome == segment[0] and abs(float(value) - first_value) <= tolerance:
+            segment[2] = end
+            continue
+        if segment != None:
+            yield tuple(segment)
+        segment = [chromosome, start, end, value]
+        first_value = float(value)
+
+    if segment != None:
+        yield tuple(segment)
+
+
+def add_downsample_arguments(parser):
+    """adds --max_points and --cluster_distance to a converter's argument parser"""
+    parser.add_argument('--max_points', required=False, default=None, type=int, help='downsample the track to about this many points per chromosome, keeping the lowest and highest point of each bin')
+    parser.add_argument('--cluster_distance', required=False, default=0, type=int, help='with --max_points, always keep points within this many bases of a neighbour, e.g. kataegis clusters')
+
+
+def reduce_chromosome(points, bin_size, cluster_distance=0):
+    """yields the lines of the lowest and highest valued point of every bin of bin_size bases
+    from (start, value, line) points of one chromosome in coordinate order, plus every point closer than 
+    cluster_distance to its previous or next point. Lines of a bin are written in coordinate order"""
+    current_bin = None
+    kept = dict()
+    low = high = None
+    last = None # point waiting for its next neighbour to decide if it is clustered
+    last_near_previous = False
+
+    def flush():
+        kept[low[2]] = low
+        kept[high[2]] = high
+        return [line for _, _, line in sorted(kept.values(), key=lambda point: point[0])]
+
+    for point in itertools.chain(points, [None]):
+        near_previous = point != None and last != None and cluster_distance > 0 and point[0] - last[0] <= cluster_distance
+        if last != None:
+            start, value, line = last
+            if start // bin_size != current_bin:
+                if current_bin != None:
+                    yield from flush()
+                current_bin = start // bin_size
+                kept = dict()
+                low = high = last
+            if value < low[1]:
+                low = last
+            if value > high[1]:
+                high = last
+            if last_near_previous or near_previous:
+                kept[line] = last
+        last = point
+        last_near_previous = near_previous
+
+    if current_bin != None:
+        yield from flush()
+
+
+def downsample_track(lines, max_points, cluster_distance=0):
+    """streams circosData lines and yields at most about max_points points per chromosome,
+    the lowest and highest valued point of each of max_points / 2 bins spanning the chromosome,
+    so peaks and troughs survive. Points within cluster_distance of a neighbour are always kept
+    and can exceed the budget. Header lines and chromosomes of unknown length pass through"""
+    def chromosome(line):
+        return line.split('\t', 1)[0]
+
+    for circosChr, group in itertools.groupby(lines, key=chromosome):
+        name = circosChr[2:] if circosChr.startswith('hs') else circosChr
+        if circosChr.startswith('#') or name not in chromosomeLength:
+            yield from group
+            continue
+        bin_size = adaptive_window(name, max(1, max_points // 2))
+        points = ((int(fields[1]), float(fields[3]), line) for line, fields in ((line, line.split('\t', 4)) for line in group))
+        yield from reduce_chromosome(points, bin_size, cluster_distance)
+
+
+def downsample_circos_data(path, max_points, cluster_distance=0):
+    """downsamples a .circosData file in place with downsample_track, streaming through a temporary file"""
+    reduced = path + '.downsample'
+    with open(path, 'r') as f, open(reduced, 'w') as g:
+        g.writelines(downsample_track(f, max_points, cluster_distance))
+    os.replace(reduced, path)
@@ -1,7 +1,13 @@
 import os, sys
 import re
 import argparse
-
+import itertools
+from contextlib import ExitStack
+import pandas as pd
+from circos_io import open_input, open_output, as_file, has_tabix_index, read_header, fetch_chromosome, map_chromosomes, index_circos_data, sorted_lines, karyotype_key
+from circos_cache import add_cache_arguments, cached_conversion
+from circos_stats import stats, add_stats_arguments, instrument
+from circos_tracks import collapse_segments, add_downsample_arguments, downsample_track
 
 # Prepare chromosome conversio ndictionary
 chrDict = dict() 
@@ -9,37 +15,113 @@ chromosomeList = [str(i) for i in range(1,23)] + ['X', 'Y']
 for i in chromosomeList:
     chrDict.update({i: 'hs'+i})
 
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 3
+
 def argument_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', required=True, help='CNVkit .cns file or .cnr file')
+    parser.add_argument('-i', '--input', required=True, help='CNVkit .cns file or .cnr file, - for stdin')
+    parser.add_argument('-o', '--output', required=False, default=None, help='output .circosData file, - for stdout, defaults to input file name + .circosData')
+    parser.add_argument('--chunk_size', required=False, default=500000, type=int, help='number of rows read and written at a time')
+    parser.add_argument('--collapse', required=False, action='store_true', help='merge consecutive bins with the same log2 into one segment')
+    parser.add_argument('--tolerance', required=False, default=0, type=float, help='with --collapse, also merge bins within this log2 difference')
+    parser.add_argument('-t', '--threads', required=False, default=1, type=int, help='processes converting chromosomes in parallel, if the input is bgzipped and tabix indexed (tabix -S 1 -s 1 -b 2 -e 3)')
+    parser.add_argument('--unsorted', required=False, action='store_true', help='input is not coordinate sorted, sort it in bounded memory first')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_downsample_arguments(parser)
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
     args = parser.parse_args()
-    return args.input
+    if args.input == '-' and args.output == None:
+        parser.error('--output is required when reading from stdin')
+    if args.output == '-' and args.index:
+        parser.error('--index needs an output file')
+    return args.input, args.output, args.chunk_size, args.collapse, args.tolerance, args.threads, args.unsorted, args.max_points, args.cluster_distance, args.index, args.cache_dir, args.cache_max_size, args.stats, args.profile
 
 def output_path(inputfile):
     return inputfile + '.circosData'
 
-def parse_cnvkit_cns(inputfile, outputfile):
+def read_cnvkit_chunks(handle, chunk_size):
+    """yields chunks of chromosome, start, end, log2 columns with hs chromosome names, 
+    other contigs and NA values already removed"""
+    chunks = pd.read_csv(handle, sep='\t', usecols=['chromosome', 'start', 'end', 'log2'], dtype=str, 
+                         keep_default_na=False, na_values=['NA', 'nan'], chunksize=chunk_size)
+    for chunk in chunks:
+        read = len(chunk)
+        chunk = chunk[chunk['chromosome'].isin(chrDict.keys())] # ignore MT, GLxxx contigs
+        major = len(chunk)
+        chunk = chunk.dropna(subset=['log2'])
+        stats.count('records_read', read)
+        stats.count('filtered_contig', read - major)
+        stats.count('na_dropped', major - len(chunk))
+        yield chunk.assign(chromosome=chunk['chromosome'].map(chrDict))[['chromosome', 'start', 'end', 'log2']]
+
+
+def iter_cnvkit_lines(lines, chunk_size=500000, collapse=False, tolerance=0):
+    """yields circosData lines from CNVkit lines, header included, 
+    such as an open file or the output of another generator"""
+    chunks = read_cnvkit_chunks(as_file(lines), chunk_size)
+    if collapse:
+        rows = (row for chunk in chunks for row in chunk.itertuples(index=False, name=None))
+        for circosChr, start, end, log2 in collapse_segments(rows, tolerance):
+            stats.count('records_written')
+            yield f'{circosChr}\t{start}\t{end}\t{log2}\n'
+    else:
+        for chunk in chunks:
+            stats.count('records_written', len(chunk))
+            yield from chunk.to_csv(sep='\t', header=False, index=False).splitlines(keepends=True)
+
+
+def convert_cnvkit_chromosome(inputfile, chromosome, header_line, chunk_size, collapse=False, tolerance=0):
+    """circosData of one chromosome of a tabix indexed CNVkit file, run in a worker process"""
+    lines = itertools.chain([header_line], fetch_chromosome(inputfile, chromosome))
+    return ''.join(iter_cnvkit_lines(lines, chunk_size, collapse, tolerance))
+
+
+def parse_cnvkit_cns(inputfile, outputfile, chunk_size=500000, collapse=False, tolerance=0, threads=1, unsorted=False, max_points=None, cluster_distance=0):
     """takes cnvkit cns output file as input and parse them into 
-    appropriately formatted data file for Circos"""
-    with open(outputfile, 'w') as f:
+    appropriately formatted data file for Circos, - for stdin or stdout
+    rows are read, filtered and written chunk_size at a time as columns
+    a tabix indexed input is converted one chromosome per process when threads > 1
+    an unsorted input is streamed through an external merge sort into karyotype order
+    with max_points, the lines are downsampled on their way to the output"""
+    with ExitStack() as stack:
+        if threads > 1 and has_tabix_index(inputfile):
+            header_line = read_header(inputfile, comment='chromosome')[0]
+            texts = map_chromosomes(convert_cnvkit_chromosome, inputfile, chromosomeList, threads, header_line, chunk_size, collapse, tolerance)
+            lines = (line for text in texts for line in text.splitlines(keepends=True))
+        else:
+            lines = stack.enter_context(open_input(inputfile))
+            if unsorted:
+                lines = sorted_lines(lines, karyotype_key(chromosomeList), comment='chromosome')
+            lines = iter_cnvkit_lines(lines, chunk_size, collapse, tolerance)
+        if max_points != None:
+            lines = downsample_track(lines, max_points, cluster_distance)
+
+        f = stack.enter_context(open_output(outputfile))
         # first line 
         f.write('# chr1 start1 end1 chr2 start2 end2 [options]\n')
-        with open(inputfile, 'r') as g:
-            for line in g:
-                if not line.startswith('chromosome'): # skip first line
-                    chr, start, end, _, log2, depth, *args = line.strip().split()
-                    if chr in chrDict.keys(): # ignore MT, GLxxx contigs
-                        circosChr = chrDict[chr]
-                        f.write(f'{circosChr}\t{start}\t{end}\t{log2}\n')
+        f.writelines(lines)
 
                     
 def main():
     # take input file 
-    input = argument_parser()
+    input, output, chunk_size, collapse, tolerance, threads, unsorted, max_points, cluster_distance, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
     # prepare ouptut file path
-    output = output_path(input)
+    if output == None:
+        output = output_path(input)
     # parse input cnvkit file and output circos data file
-    parse_cnvkit_cns(input, output)
+    def convert():
+        with stats.stage('convert'):
+            parse_cnvkit_cns(input, output, chunk_size, collapse, tolerance, threads, unsorted, max_points, cluster_distance)
+
+    params = dict({'collapse': collapse, 'tolerance': tolerance, 'max_points': max_points, 'cluster_distance': cluster_distance, 'unsorted': unsorted})
+    with instrument('cnvkit2circos', stats_path, profile_path):
+        if cached_conversion(cache_dir, 'cnvkit2circos', CONVERTER_VERSION, [input], params, dict({'circosData': output}), convert, cache_max_size):
+            stats.count('cache_hit')
+        if index:
+            with stats.stage('index'):
+                index_circos_data(output, zerobased=True) # CNVkit starts are 0-based
 
 
 
@@ -4,14 +4,22 @@ Combined Structural variation callset from both DELLY and MANTA
 """
 
 import argparse
+import collections
 import cyvcf2
+import numpy as np
 import re
 import time
 import datetime
+import heapq
 import os
 import shutil
 import sys
+import tempfile
 import vcf
+from concurrent.futures import ProcessPoolExecutor
+from circos_cache import add_cache_arguments, cached_conversion
+from circos_stats import stats, add_stats_arguments, instrument, counted, collect_counts
+from circos_io import index_circos_data, sort_to_file, sorted_lines, karyotype_key
 
 
 # Prepare chromosome conversion dictionary for circos
@@ -23,10 +31,21 @@ for i in chromosomeList:
 # make sure this matches with `sv2circos.py` for consistency
 svtype2color = dict({'BND': 'black', 'DEL': 'yellow', 'DUP': 'blue', 'INV': 'orange', 'INS': 'green', 'TRA': 'black'})
 
+# SV types compared between the two callsets
+compared_svtypes = ['BND', 'INV', 'DUP', 'DEL', 'INS']
+
+# integer codes of SV types in BreakpointTable
+svtype_codes = dict({svtype: code for code, svtype in enumerate(svtype2color)})
+
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 3
+
 class Position():
     ''' python class for handling genomic positions
     0-based
     '''
+    __slots__ = ('chromosome', 'start', 'end')
+
     def __init__(self, chromosome, start, end, is_bp=None, clipped_reads=None):
         self.chromosome = chromosome
         self.start = start
@@ -81,11 +100,17 @@ def argument_parser():
     parser = argparse.ArgumentParser(
         description='Find fusion evidence from WGS results')
 
-    parser.add_argument('-d', '--distance_threshold', required=True, type=int)
+    parser.add_argument('-d', '--distance_threshold', required=True, type=int, help='maximum distance in bp between matching break points of the two callsets')
     parser.add_argument('-o', '--outputDIR', required=False, default=os.getcwd())
     parser.add_argument('--delly', required=True, help='Delly SV vcf file')
     parser.add_argument('--manta', required=True, help='Manta SV vcf file')
     parser.add_argument('-s', '--sampleName', required=True, help='Sample Name to be used for output .circosData file')
+    parser.add_argument('-t', '--threads', required=False, default=1, type=int, help='processes parsing the VCFs and comparing SV types in parallel, ignored with --streaming')
+    parser.add_argument('--streaming', required=False, action='store_true', help='merge-join coordinate sorted VCFs in bounded memory instead of loading both callsets')
+    parser.add_argument('--unsorted', required=False, action='store_true', help='with --streaming, the VCFs are not coordinate sorted, sort them in bounded memory first')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
     args = vars(parser.parse_args())
 
     distance_threshold = args['distance_threshold']
@@ -93,7 +118,38 @@ def argument_parser():
     delly = args['delly']
     manta = args['manta']
     sampleName = args['sampleName']
-    return outputDIR, distance_threshold, delly, manta, sampleName
+    return outputDIR, distance_threshold, delly, manta, sampleName, args['threads'], args['streaming'], args['unsorted'], args['index'], args['cache_dir'], args['cache_max_size'], args['stats'], args['profile']
+
+
+def variant_breakpoints(variant):
+    ''' SV type, chromosome and position of both break points of a cyvcf2 variant
+    None for a single breakend, such as the N. ALT of GRIDSS, which has no second break point
+    '''
+    variant_type = variant.INFO.get('SVTYPE')
+    if variant_type  == "BND":
+        # this one can be used for any SV VCF with BND type
+        bnd_pos= re.search(string=variant.ALT[0], pattern=r'[a-zA-Z]*[0-9]*:[0-9]+')
+        if bnd_pos == None:
+            return None
+        bnd_chrom, bnd_pos = bnd_pos.group(0).split(':')
+        bp2 = (bnd_chrom, int(bnd_pos))
+    elif variant_type == "TRA":
+        # this one is specific for Delly v0.7.6 annotation
+        bp2 = (variant.INFO.get('CHR2'), variant.INFO.get('END'))
+    else:
+        bp2 = (variant.CHROM, variant.INFO.get('END'))
+
+    return variant_type, (variant.CHROM, variant.POS), bp2
+
+
+def variant2SVPosition(variant):
+    ''' SV type and the two break points of a cyvcf2 variant as Position objects, None for a single breakend
+    '''
+    breakpoints = variant_breakpoints(variant)
+    if breakpoints == None:
+        return None
+    variant_type, (bp1Chr, bp1Pos), (bp2Chr, bp2Pos) = breakpoints
+    return variant_type, Position(bp1Chr, bp1Pos, bp1Pos + 1), Position(bp2Chr, bp2Pos, bp2Pos + 1)
 
 
 def vcf2SVPosition(vcf_file):
@@ -105,21 +161,10 @@ def vcf2SVPosition(vcf_file):
 
     for variant in cyvcf2.VCF(vcf_file):
         # if variant.FILTER == None:
-        variant_type = variant.INFO.get('SVTYPE')
-        if variant_type  == "BND":
-            # this one can be used for any SV VCF with BND type
-            bnd_pos= re.search(string=variant.ALT[0], pattern=r'[a-zA-Z]*[0-9]*:[0-9]+').group(0)
-            bnd_chrom, bnd_pos = bnd_pos.split(':')
-            bp2String = f'{bnd_chrom}:{bnd_pos}-{int(bnd_pos) + 1}'
-        elif variant_type == "TRA":
-            # this one is specific for Delly v0.7.6 annotation
-            bp2String = f"{variant.INFO.get('CHR2')}:{variant.INFO.get('END')}-{variant.INFO.get('END') + 1}"
-        else:
-            bp2String = f'{variant.CHROM}:{variant.INFO.get("END")}-{variant.INFO.get("END") + 1}'
-
-        bp1 = Position.fromstring(f'{variant.CHROM}:{variant.POS}-{variant.POS + 1}')
-        bp2 = Position.fromstring(bp2String)
-
+        positions = variant2SVPosition(variant)
+        if positions == None:
+            continue
+        variant_type, bp1, bp2 = positions
         bp_dict[variant_type].append((bp1, bp2))
         
     return bp_dict
@@ -178,39 +223,346 @@ def support_breakpoint(upstream_bp1, downstream_bp1, upstream_bp2, downstream_bp
     return support_dict[sum([key for key, value in bp_support_status.items() if value == 1])]          # this is the number of break point support
     
 
-def compare_breakpoints(vcf1, vcf2, distance_threshold, circosDataFile):
-    vcf1_positions = vcf2SVPosition(vcf1)
-    vcf2_positions = vcf2SVPosition(vcf2)
-    with open(circosDataFile, 'w') as f:
-        for svtype in ['BND', 'INV', 'DUP', 'DEL', 'INS']:
-            print(svtype)
+# support_dict as a lookup array over the 4 bit edge mask, for BreakpointTable
+support_levels = np.array([support_dict[mask] for mask in range(16)])
+
+
+class BreakpointTable():
+    ''' columnar store of SVs, one row per SV with its two break points
+    chromosome codes, starts and ends (0-based, half open like Position), SV type and source caller codes are
+    NumPy arrays, so that extend, overlap and matching work on whole callsets at once.
+    Tables that are compared have to share one chromosome_codes dictionary
+    '''
+    columns = ('chromosome1', 'start1', 'end1', 'chromosome2', 'start2', 'end2', 'svtype', 'caller')
+
+    def __init__(self, chromosome_codes, chromosome1, start1, end1, chromosome2, start2, end2, svtype, caller):
+        self.chromosome_codes = chromosome_codes
+        self.chromosome1 = np.asarray(chromosome1, dtype=np.int32)
+        self.start1 = np.asarray(start1, dtype=np.int64)
+        self.end1 = np.asarray(end1, dtype=np.int64)
+        self.chromosome2 = np.asarray(chromosome2, dtype=np.int32)
+        self.start2 = np.asarray(start2, dtype=np.int64)
+        self.end2 = np.asarray(end2, dtype=np.int64)
+        self.svtype = np.asarray(svtype, dtype=np.int8)
+        self.caller = np.asarray(caller, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.start1)
+
+    def __repr__(self):
+        return f'BreakpointTable({len(self)} SVs)'
+
+    @classmethod
+    def fromvcf(cls, vcf_file, caller=0, chromosome_codes=None):
+        '''table of every SV in a vcf file, with caller as its source caller code
+        new chromosomes are added to chromosome_codes. Single breakends and SV types missing from svtype_codes
+        are skipped and counted, as they cannot be matched by both break points'''
+        if chromosome_codes == None:
+            chromosome_codes = dict()
+        columns = dict({column: [] for column in cls.columns})
+        for variant in cyvcf2.VCF(vcf_file):
+            breakpoints = variant_breakpoints(variant)
+            if breakpoints == None:
+                stats.count('skipped_single_breakend')
+                continue
+            variant_type, (bp1Chr, bp1Pos), (bp2Chr, bp2Pos) = breakpoints
+            if variant_type not in svtype_codes:
+                stats.count('skipped_svtype')
+                continue
+            columns['chromosome1'].append(chromosome_codes.setdefault(bp1Chr, len(chromosome_codes)))
+            columns['start1'].append(bp1Pos)
+            columns['chromosome2'].append(chromosome_codes.setdefault(bp2Chr, len(chromosome_codes)))
+            columns['start2'].append(bp2Pos)
+            columns['svtype'].append(svtype_codes[variant_type])
+        starts1 = np.array(columns['start1'], dtype=np.int64)
+        starts2 = np.array(columns['start2'], dtype=np.int64)
+        return cls(chromosome_codes, columns['chromosome1'], starts1, starts1 + 1, columns['chromosome2'], starts2, starts2 + 1, 
+                   columns['svtype'], np.full(len(starts1), caller))
+
+    @classmethod
+    def concatenate(cls, tables):
+        '''single table of the rows of tables, which have to share their chromosome_codes'''
+        return cls(tables[0].chromosome_codes, *(np.concatenate([getattr(table, column) for table in tables]) for column in cls.columns))
+
+    def select(self, rows):
+        '''table of the rows given by a boolean mask or an index array'''
+        return BreakpointTable(self.chromosome_codes, *(getattr(self, column)[rows] for column in self.columns))
+
+    def recode(self, chromosome_codes):
+        '''table with its chromosomes coded by chromosome_codes, new chromosomes are added to it
+        lets tables parsed in separate processes be compared'''
+        mapping = np.array([chromosome_codes.setdefault(chromosome, len(chromosome_codes)) for chromosome in self.chromosome_names()], dtype=np.int32)
+        recoded = self.select(slice(None))
+        recoded.chromosome_codes = chromosome_codes
+        recoded.chromosome1 = mapping[self.chromosome1]
+        recoded.chromosome2 = mapping[self.chromosome2]
+        return recoded
+
+    def chromosome_names(self):
+        '''chromosome name of each code, indexable by code'''
+        names = [None] * len(self.chromosome_codes)
+        for chromosome, code in self.chromosome_codes.items():
+            names[code] = chromosome
+        return names
+
+    def positions(self, row):
+        '''the two break points of one row as Position objects'''
+        names = self.chromosome_names()
+        return (Position(names[self.chromosome1[row]], int(self.start1[row]), int(self.end1[row])), 
+                Position(names[self.chromosome2[row]], int(self.start2[row]), int(self.end2[row])))
+
+    def breakpoints(self):
+        '''(chromosome, start, end) arrays of the upstream and of the downstream break points'''
+        return [(self.chromosome1, self.start1, self.end1), (self.chromosome2, self.start2, self.end2)]
+
+    def extend(self, direction, basepairs):
+        """table with both break points of every SV extended by basepairs, either upstream, downstream, or both"""
+        if direction not in ('up', 'down', 'both'):
+            print('direction has to be either up, down, or both')
+            raise ValueError
+        extended = self.select(slice(None))
+        if direction in ('up', 'both'):
+            extended.start1 = np.maximum(0, self.start1 - basepairs)
+            extended.start2 = np.maximum(0, self.start2 - basepairs)
+        if direction in ('down', 'both'):
+            extended.end1 = self.end1 + basepairs
+            extended.end2 = self.end2 + basepairs
+        return extended
+
+    @staticmethod
+    def overlap(chromosome1, start1, end1, chromosome2, start2, end2):
+        '''elementwise Position.overlap of two sets of positions given as arrays'''
+        return (chromosome1 == chromosome2) & (np.minimum(end1, end2) > np.maximum(start1, start2))
+
+    def candidate_pairs(self, other, distance_threshold):
+        '''(row of self, row of other) index arrays of every pair where a break point of other 
+        lies within distance_threshold of the upstream break point of self'''
+        # chromosome and start packed into one sortable key per break point of other
+        keys = np.concatenate([self.pack(other.chromosome1, other.start1), self.pack(other.chromosome2, other.start2)])
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        other_rows = np.concatenate([np.arange(len(other)), np.arange(len(other))])[order]
+
+        upstream = self.pack(self.chromosome1, self.start1)
+        left = np.searchsorted(keys, upstream - distance_threshold, side='left')
+        right = np.searchsorted(keys, upstream + distance_threshold, side='right')
+        counts = right - left
+        rows = np.repeat(np.arange(len(self)), counts)
+        # offsets of each pair within the left:right range of its row
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, other_rows[np.repeat(left, counts) + offsets]
+
+    @staticmethod
+    def pack(chromosome, start):
+        '''chromosome code and start as a single int64 that sorts by chromosome, then start'''
+        return chromosome.astype(np.int64) * (1 << 32) + start
+
+    def supported_by(self, other, distance_threshold):
+        '''boolean array, true for each SV of self that an SV of the same type in other supports at both break points,
+        the vectorized equivalent of support_breakpoint(...) == 2 over all pairs
+        every break point combination that support_dict maps to 2 contains an edge from the upstream break point, 
+        so only pairs from candidate_pairs need to be compared'''
+        rows, other_rows = self.candidate_pairs(other, distance_threshold)
+        same_type = self.svtype[rows] == other.svtype[other_rows]
+        rows, other_rows = rows[same_type], other_rows[same_type]
+
+        mask = np.zeros(len(rows), dtype=np.int64)
+        edge_number = 1
+        for chromosome, start, end in self.extend('both', distance_threshold).breakpoints():
+            for other_chromosome, other_start, other_end in other.breakpoints():
+                edge = self.overlap(chromosome[rows], start[rows], end[rows], other_chromosome[other_rows], other_start[other_rows], other_end[other_rows])
+                mask += edge * edge_number
+                edge_number *= 2 # multiply edge number by 2 to get binary representation
+
+        supported = np.zeros(len(self), dtype=bool)
+        supported[rows[support_levels[mask] == 2]] = True
+        return supported
+
+
+def load_tables(vcf_files, threads=1):
+    '''BreakpointTable of each vcf file with caller code i for the i-th file, sharing one chromosome_codes
+    the files are parsed concurrently in a pool of threads processes'''
+    if threads > 1:
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            jobs = [executor.submit(counted, BreakpointTable.fromvcf, vcf_file, caller) for caller, vcf_file in enumerate(vcf_files)]
+            tables = [collect_counts(job.result()) for job in jobs]
+    else:
+        tables = [BreakpointTable.fromvcf(vcf_file, caller) for caller, vcf_file in enumerate(vcf_files)]
+
+    chromosome_codes = dict()
+    return [table.recode(chromosome_codes) for table in tables]
+
+
+def supported_rows(table1, table2, distance_threshold):
+    '''indices of the SVs of table1 supported by table2, for running one SV type in a worker process'''
+    return np.flatnonzero(table1.supported_by(table2, distance_threshold))
+
+
+def compare_breakpoints(vcf1, vcf2, distance_threshold, circosDataFile, threads=1):
+    with stats.stage('parse'):
+        vcf1_table, vcf2_table = load_tables([vcf1, vcf2], threads)
+    stats.count('records_read', len(vcf1_table) + len(vcf2_table))
+
+    # one comparison per SV type, collected in compared_svtypes order whichever finishes first
+    rows = dict({svtype: np.flatnonzero(vcf1_table.svtype == svtype_codes[svtype]) for svtype in compared_svtypes})
+    stats.count('filtered_svtype', len(vcf1_table) - sum(len(svtype_rows) for svtype_rows in rows.values()))
+    vcf2_tables = dict({svtype: vcf2_table.select(vcf2_table.svtype == svtype_codes[svtype]) for svtype in compared_svtypes})
+    with stats.stage('match'):
+        if threads > 1:
+            with ProcessPoolExecutor(max_workers=threads) as executor:
+                jobs = dict({svtype: executor.submit(supported_rows, vcf1_table.select(rows[svtype]), vcf2_tables[svtype], distance_threshold) for svtype in compared_svtypes})
+                supported = dict({svtype: rows[svtype][job.result()] for svtype, job in jobs.items()})
+        else:
+            supported = dict({svtype: rows[svtype][supported_rows(vcf1_table.select(rows[svtype]), vcf2_tables[svtype], distance_threshold)] for svtype in compared_svtypes})
+
+    with stats.stage('write'), open(circosDataFile, 'w') as f:
+        for svtype in compared_svtypes:
             color = svtype2color[svtype]
-            sv_list = []
-            for vcf1_sv in vcf1_positions[svtype]:
-                upstream_vcf1_bp, downstream_vcf1_bp = vcf1_sv
-                status = False
-
-                for vcf2_sv in vcf2_positions[svtype]:
-                    upstream_vcf2_bp, downstream_vcf2_bp = vcf2_sv
-                    support = (support_breakpoint(upstream_vcf1_bp, downstream_vcf1_bp, upstream_vcf2_bp, downstream_vcf2_bp, distance_threshold))
-                    if support ==2 :
-                        status = True
-            
-                if status == True:
-                    print(vcf1_sv)
-                    bp1, bp2 = vcf1_sv
-                    bp1circosChrom = chrDict[bp1.chromosome]
-                    bp2circosChrom = chrDict[bp2.chromosome]
-                    f.write(f"{bp1circosChrom}\t{bp1.start}\t{bp1.start}\t{bp2circosChrom}\t{bp2.start}\t{bp2.start}\tcolor={color}\n")
+            for row in supported[svtype]:
+                bp1, bp2 = vcf1_table.positions(row)
+                bp1circosChrom = chrDict[bp1.chromosome]
+                bp2circosChrom = chrDict[bp2.chromosome]
+                f.write(f"{bp1circosChrom}\t{bp1.start}\t{bp1.start}\t{bp2circosChrom}\t{bp2.start}\t{bp2.start}\tcolor={color}\n")
+            stats.count('records_written', len(supported[svtype]))
+            stats.count(f'written.{svtype}', len(supported[svtype]))
+            stats.count('filtered_distance', len(rows[svtype]) - len(supported[svtype]))
     
 
     return 0
 
+
+def contig_order(vcf_files):
+    ''' contigs of the ##contig lines of all vcf_files in order of appearance, chromosomeList if none declares any
+    both streams of a comparison rank contigs in this one order, so their sort keys are comparable
+    '''
+    contigs = dict()
+    for vcf_file in vcf_files:
+        contigs.update(dict.fromkeys(cyvcf2.VCF(vcf_file).seqnames))
+    return list(contigs) or chromosomeList
+
+
+def sv_sort_key(contigs):
+    ''' sort key (rank, contig, position) of a break point in the order of contigs, other contigs after them by name
+    the same order as karyotype_key(contigs) sorts the lines of an unsorted vcf file
+    '''
+    rank = dict({contig: i for i, contig in enumerate(contigs)})
+    def key(chromosome, position):
+        return (rank.get(chromosome, len(rank)), chromosome, position)
+    return key
+
+
+def sorted_sv_stream(vcf_file, sort_key):
+    ''' yields (sort key of the upstream break point, SV type, bp1, bp2) of a coordinate sorted SV vcf file one record at a time
+    single breakends and SV types missing from svtype_codes are skipped and counted, as BreakpointTable.fromvcf does
+    Raises ValueError on input that is not sorted in the order of sort_key
+    '''
+    previous_key = None
+    for variant in cyvcf2.VCF(vcf_file):
+        positions = variant2SVPosition(variant)
+        if positions == None:
+            stats.count('skipped_single_breakend')
+            continue
+        variant_type, bp1, bp2 = positions
+        if variant_type not in svtype_codes:
+            stats.count('skipped_svtype')
+            continue
+        key = sort_key(bp1.chromosome, bp1.start)
+        if previous_key != None and key < previous_key:
+            raise ValueError(f'{vcf_file} is not coordinate sorted in karyotype or ##contig order at {bp1.chromosome}:{bp1.start}, use --unsorted')
+        previous_key = key
+        stats.count('records_read')
+        yield key, variant_type, bp1, bp2
+
+
+def downstream_sv_stream(vcf_file, sort_key):
+    ''' yields the records of an SV vcf file as sorted_sv_stream does, but keyed and sorted by their downstream break point
+    the records are external merge sorted by sorted_lines, so memory stays bounded
+    '''
+    def lines():
+        for variant in cyvcf2.VCF(vcf_file):
+            breakpoints = variant_breakpoints(variant)
+            if breakpoints == None or breakpoints[0] not in svtype_codes: # counted by sorted_sv_stream
+                continue
+            variant_type, (bp1Chr, bp1Pos), (bp2Chr, bp2Pos) = breakpoints
+            yield f'{bp2Chr}\t{bp2Pos}\t{variant_type}\t{bp1Chr}\t{bp1Pos}\n'
+
+    def line_key(line):
+        chromosome, position, _ = line.split('\t', 2)
+        return sort_key(chromosome, int(position))
+
+    for line in sorted_lines(lines(), line_key):
+        bp2Chr, bp2Pos, variant_type, bp1Chr, bp1Pos = line.rstrip('\n').split('\t')
+        bp1Pos, bp2Pos = int(bp1Pos), int(bp2Pos)
+        yield sort_key(bp2Chr, bp2Pos), variant_type, Position(bp1Chr, bp1Pos, bp1Pos + 1), Position(bp2Chr, bp2Pos, bp2Pos + 1)
+
+
+def compare_breakpoints_streaming(vcf1, vcf2, distance_threshold, circosDataFile, unsorted=False):
+    ''' same comparison as compare_breakpoints as a windowed merge-join of two coordinate sorted vcf files
+    every supported pattern of support_breakpoint has an edge from the upstream break point of the vcf1 record,
+    so the supporting vcf2 records are those with either break point within distance_threshold of it. Each vcf2 record
+    therefore enters the window twice, once at its upstream and once at its downstream break point, the latter from an
+    external sort of vcf2. This finds an inter-chromosomal event written once, as Delly does, from either of its ends,
+    and the result equals compare_breakpoints whichever callset is vcf1. Only the window is kept in memory, one per SV type.
+    Supported SVs are written in vcf1 order rather than grouped by type.
+
+    contigs are ranked by the ##contig lines of both files, or in karyotype order if they have none, other contigs after them by name.
+    unsorted vcf files are external merge sorted into temporary files in that order first
+    '''
+    contigs = contig_order([vcf1, vcf2])
+    if unsorted:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sorted_vcfs = [sort_to_file(vcf_file, os.path.join(tmpdir, f'{i}.vcf'), karyotype_key(contigs)) for i, vcf_file in enumerate([vcf1, vcf2])]
+            return compare_breakpoints_streaming(*sorted_vcfs, distance_threshold, circosDataFile)
+
+    sort_key = sv_sort_key(contigs)
+    stream2 = heapq.merge(sorted_sv_stream(vcf2, sort_key), downstream_sv_stream(vcf2, sort_key), key=lambda record: record[0])
+    pending = next(stream2, None)
+    windows = dict({svtype: collections.deque() for svtype in compared_svtypes})
+
+    with open(circosDataFile, 'w') as f:
+        for key, svtype, bp1, bp2 in sorted_sv_stream(vcf1, sort_key):
+            rank, chromosome, start = key
+            # pull vcf2 records up to the far edge of the window
+            while pending != None and pending[0] <= (rank, chromosome, start + distance_threshold):
+                if pending[1] in windows:
+                    windows[pending[1]].append(pending)
+                pending = next(stream2, None)
+            # drop records that fell behind the near edge
+            for window in windows.values():
+                while window and window[0][0] < (rank, chromosome, start - distance_threshold):
+                    window.popleft()
+
+            if svtype not in windows:
+                stats.count('filtered_svtype')
+                continue
+            for _, _, window_bp1, window_bp2 in windows[svtype]:
+                if support_breakpoint(bp1, bp2, window_bp1, window_bp2, distance_threshold) == 2:
+                    color = svtype2color[svtype]
+                    f.write(f"{chrDict[bp1.chromosome]}\t{bp1.start}\t{bp1.start}\t{chrDict[bp2.chromosome]}\t{bp2.start}\t{bp2.start}\tcolor={color}\n")
+                    stats.count('records_written')
+                    stats.count(f'written.{svtype}')
+                    break
+            else:
+                stats.count('filtered_distance')
+
+    return 0
+
 def main():
-    outputDIR, distance_threshold, delly, manta, sampleName = argument_parser()
+    outputDIR, distance_threshold, delly, manta, sampleName, threads, streaming, unsorted, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
 
     circosDataFile = os.path.join(outputDIR, sampleName + '.circosData')
-    compare_breakpoints(delly, manta, 1000, circosDataFile)
+    if streaming:
+        compare = lambda: compare_breakpoints_streaming(delly, manta, distance_threshold, circosDataFile, unsorted)
+    else:
+        compare = lambda: compare_breakpoints(delly, manta, distance_threshold, circosDataFile, threads)
+    params = dict({'distance_threshold': distance_threshold, 'streaming': streaming, 'unsorted': unsorted})
+    with instrument('delly_vs_manta', stats_path, profile_path):
+        if cached_conversion(cache_dir, 'delly_vs_manta', CONVERTER_VERSION, [delly, manta], params, dict({'circosData': circosDataFile}),
+                             compare, cache_max_size):
+            stats.count('cache_hit')
+        if index:
+            with stats.stage('index'):
+                index_circos_data(circosDataFile)
     print(f'Output Circos Data file is written: {circosDataFile}')
     return 0
 
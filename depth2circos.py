@@ -1,6 +1,12 @@
 import os, sys
 import re
 import argparse
+import itertools
+import numpy as np
+from circos_io import open_input, open_output, index_circos_data, sorted_lines, karyotype_key
+from circos_cache import add_cache_arguments, cached_conversion
+from circos_stats import stats, add_stats_arguments, instrument
+from circos_tracks import chromosomeLength, adaptive_window, add_downsample_arguments, downsample_track
 
 
 # Prepare chromosome conversio ndictionary
@@ -9,39 +15,181 @@ chromosomeList = [str(i) for i in range(1,23)] + ['X', 'Y', 'MT']
 for i in chromosomeList:
     chrDict.update({i: 'hs'+i})
 
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 2
+
+# per window summary of depth, used with --window or --target_points
+window_statistic = dict({'mean': np.mean, 'median': np.median, 'max': np.max})
+
 def argument_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', required=True, help='output from samtools depth command')
+    parser.add_argument('-i', '--input', required=True, help='output from samtools depth command, - for stdin')
+    parser.add_argument('-o', '--output', required=False, default=None, help='output .circosData file, - for stdout, defaults to input file name + .circosData')
+    parser.add_argument('-w', '--window', required=False, default=None, type=int, help='summarise depth in windows of this many bases instead of writing every base')
+    parser.add_argument('-p', '--target_points', required=False, default=None, type=int, help='choose the window size per chromosome so each has about this many points, overrides --window')
+    parser.add_argument('-s', '--statistic', required=False, default='mean', choices=window_statistic.keys(), help='depth summary per window')
+    parser.add_argument('--chunk_size', required=False, default=1000000, type=int, help='number of lines parsed into one NumPy chunk in windowed mode')
+    parser.add_argument('--unsorted', required=False, action='store_true', help='input is not coordinate sorted, sort it in bounded memory first')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_downsample_arguments(parser)
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
     args = parser.parse_args()
-    return args.input
+    if args.input == '-' and args.output == None:
+        parser.error('--output is required when reading from stdin')
+    if args.output == '-' and args.index:
+        parser.error('--index needs an output file')
+    return args.input, args.output, args.window, args.target_points, args.statistic, args.chunk_size, args.unsorted, args.max_points, args.cluster_distance, args.index, args.cache_dir, args.cache_max_size, args.stats, args.profile
 
 def output_path(inputfile):
     return inputfile + '.circosData'
 
-def parse_samtools_depth(inputfile, outputfile):
-    """takes samtools depth output file as input and parse them into 
-    appropriately formatted data file for Circos"""
-    with open(outputfile, 'w') as f:
+def depth_lines(handle, unsorted=False):
+    """lines of samtools depth output, passed through an external merge sort into karyotype order if unsorted"""
+    return sorted_lines(handle, karyotype_key(chromosomeList)) if unsorted else handle
+
+def iter_depth_points(lines):
+    """yields a circosData point for every base of samtools depth lines on the major chromosomes"""
+    read = written = 0 # counted locally, this loop is the hot path
+    try:
+        for line in lines:
+            read += 1
+            chr, start, depth, *args = line.strip().split()
+            if chr in chrDict.keys(): # ignore MT, GLxxx contigs
+                circosChr = chrDict[chr]
+                written += 1
+                yield f'{circosChr}\t{start}\t{start}\t{depth}\n'
+    finally:
+        stats.count('records_read', read)
+        stats.count('filtered_contig', read - written)
+        stats.count('records_written', written)
+
+
+def write_depth_track(outputfile, lines, max_points=None, cluster_distance=0):
+    """writes circosData lines to outputfile, - for stdout, downsampled on the way if max_points is given"""
+    if max_points != None:
+        lines = downsample_track(lines, max_points, cluster_distance)
+    with open_output(outputfile) as f:
         # first line 
         f.write('# chr1 start1 end1 chr2 start2 end2 [options]\n')
-        with open(inputfile, 'r') as g:
-            for line in g:
-                chr, start, depth, *args = line.strip().split()
-                if chr in chrDict.keys(): # ignore MT, GLxxx contigs
-                    circosChr = chrDict[chr]
-                    f.write(f'{circosChr}\t{start}\t{start}\t{depth}\n')
-
-                    
+        f.writelines(lines)
+
+
+def parse_samtools_depth(inputfile, outputfile, unsorted=False, max_points=None, cluster_distance=0):
+    """takes samtools depth output file as input and parse them into 
+    appropriately formatted data file for Circos"""
+    with open_input(inputfile) as g:
+        write_depth_track(outputfile, iter_depth_points(depth_lines(g, unsorted)), max_points, cluster_distance)
+
+
+def read_depth_chunks(handle, chunk_size):
+    """reads samtools depth output chunk_size lines at a time and yields
+    (chromosome, positions, depths) NumPy arrays, split wherever the chromosome changes"""
+    handle = iter(handle) # islice has to resume where the previous chunk ended
+    while True:
+        lines = list(itertools.islice(handle, chunk_size))
+        if not lines:
+            return
+        stats.count('records_read', len(lines))
+        fields = [line.split(None, 3) for line in lines]
+        chromosomes = np.array([field[0] for field in fields])
+        positions = np.fromiter((field[1] for field in fields), dtype=np.int64, count=len(fields))
+        depths = np.fromiter((field[2] for field in fields), dtype=np.int64, count=len(fields))
+
+        boundaries = np.flatnonzero(chromosomes[1:] != chromosomes[:-1]) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(fields)]):
+            yield chromosomes[start], positions[start:end], depths[start:end]
+
+
+def major_chromosome_chunks(chunks):
+    """depth chunks of the major chromosomes, counting the bases of other contigs as filtered"""
+    for chunk in chunks:
+        if chunk[0] in chrDict.keys(): # ignore MT, GLxxx contigs
+            yield chunk
+        else:
+            stats.count('filtered_contig', len(chunk[1]))
+
+
+def window_depth(chunks, window, statistic, target_points=None):
+    """aggregates depth chunks into (chromosome, start, end, value) windows in a single pass
+    only the depths of the window currently being filled are carried over between chunks,
+    so memory is bounded by the window and chunk size rather than the input"""
+    aggregate = window_statistic[statistic]
+    current_chromosome = None
+    current_window = None
+    carry = []
+
+    def summarise():
+        start = current_window * window_size + 1
+        end = min((current_window + 1) * window_size, chromosomeLength.get(current_chromosome, sys.maxsize))
+        return current_chromosome, start, end, aggregate(np.concatenate(carry))
+
+    for chromosome, positions, depths in chunks:
+        if chromosome != current_chromosome:
+            if carry:
+                yield summarise()
+            current_chromosome = chromosome
+            current_window = None
+            carry = []
+            if target_points != None and chromosome in chromosomeLength:
+                window_size = adaptive_window(chromosome, target_points)
+            else:
+                window_size = window
+
+        windows = (positions - 1) // window_size
+        boundaries = np.flatnonzero(windows[1:] != windows[:-1]) + 1
+        for window_index, window_depths in zip(windows[np.r_[0, boundaries]], np.split(depths, boundaries)):
+            if window_index != current_window:
+                if carry:
+                    yield summarise()
+                current_window = window_index
+                carry = []
+            carry.append(window_depths)
+
+    if carry:
+        yield summarise()
+
+
+def iter_depth_windows(lines, window, statistic, target_points=None, chunk_size=1000000):
+    """yields a circosData point for every window of samtools depth lines on the major chromosomes"""
+    chunks = major_chromosome_chunks(read_depth_chunks(lines, chunk_size))
+    for chr, start, end, value in window_depth(chunks, window, statistic, target_points):
+        circosChr = chrDict[chr]
+        stats.count('records_written')
+        yield f'{circosChr}\t{start}\t{end}\t{value:.2f}\n'
+
+
+def parse_samtools_depth_windowed(inputfile, outputfile, window, statistic, target_points=None, chunk_size=1000000, unsorted=False, max_points=None, cluster_distance=0):
+    """takes samtools depth output file as input and writes one Circos point per window
+    instead of one per base"""
+    with open_input(inputfile) as g:
+        lines = iter_depth_windows(depth_lines(g, unsorted), window, statistic, target_points, chunk_size)
+        write_depth_track(outputfile, lines, max_points, cluster_distance)
+
+
 def main():
     # take input file 
-    input = argument_parser()
+    input, output, window, target_points, statistic, chunk_size, unsorted, max_points, cluster_distance, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
     # prepare ouptut file path
-    output = output_path(input)
+    if output == None:
+        output = output_path(input)
     # parse input cnvkit file and output circos data file
-    parse_samtools_depth(input, output)
+    def convert():
+        with stats.stage('convert'):
+            if window != None or target_points != None:
+                parse_samtools_depth_windowed(input, output, window, statistic, target_points, chunk_size, unsorted, max_points, cluster_distance)
+            else:
+                parse_samtools_depth(input, output, unsorted, max_points, cluster_distance)
+
+    params = dict({'window': window, 'target_points': target_points, 'statistic': statistic, 'max_points': max_points, 'cluster_distance': cluster_distance, 'unsorted': unsorted})
+    with instrument('depth2circos', stats_path, profile_path):
+        if cached_conversion(cache_dir, 'depth2circos', CONVERTER_VERSION, [input], params, dict({'circosData': output}), convert, cache_max_size):
+            stats.count('cache_hit')
+        if index:
+            with stats.stage('index'):
+                index_circos_data(output)
 
 
 
 if __name__=='__main__':
     main()
-
@@ -0,0 +1,132 @@
+"""
+Runs every per-sample conversion of a cohort (SV intersect, CNV, SNV VAF/rainfall, Circos configuration)
+in a bounded process pool, skipping steps whose outputs are newer than their inputs
+
+"""
+
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import abscn2circos
+import circosConfigPrep
+import cnvkit2circos
+import delly_vs_manta
+import snv2circos
+
+
+def argument_parser():
+    """parses argument passed on from command line"""
+    parser = argparse.ArgumentParser(
+        description='Writes .circosData and Circos configuration files for every sample of a sample sheet')
+
+    parser.add_argument('-s', '--sample_sheet', required=True, help='tab separated sample sheet with a header of sample, delly, manta, cnv, snv columns')
+    parser.add_argument('-t', '--template', required=True, help='Template configuration file')
+    parser.add_argument('-o', '--outputDIR', required=False, default=os.getcwd())
+    parser.add_argument('-d', '--distance_threshold', required=False, default=1000, type=int, help='breakpoint distance for the Delly/Manta intersect')
+    parser.add_argument('-c', '--snv_caller', required=False, default='mutect', choices=snv2circos.vaf_plans.keys(), help='SNV caller of the snv column')
+    parser.add_argument('-j', '--jobs', required=False, default=os.cpu_count(), type=int, help='number of samples processed in parallel')
+    parser.add_argument('-f', '--force', required=False, action='store_true', help='rerun steps even if their outputs are up to date')
+    args = vars(parser.parse_args())
+
+    return args['sample_sheet'], args['template'], args['outputDIR'], args['distance_threshold'], args['snv_caller'], args['jobs'], args['force']
+
+
+def read_sample_sheet(sample_sheet):
+    """list of dictionaries, one per sample, keyed by the sample sheet header"""
+    with open(sample_sheet, 'r') as f:
+        return [row for row in csv.DictReader(f, delimiter='\t') if not row['sample'].startswith('#')]
+
+
+def is_up_to_date(outputs, inputs):
+    """true if every output exists and is newer than every input"""
+    if not all(os.path.isfile(output) for output in outputs):
+        return False
+    return min(os.path.getmtime(output) for output in outputs) >= max(os.path.getmtime(input) for input in inputs)
+
+
+def sample_outputs(sample, outputDIR):
+    """paths of the per-sample outputs, keyed by step
+    every path starts with the sample ID, as inputs of different samples often share a file name"""
+    prefix = os.path.join(outputDIR, sample['sample'])
+
+    return dict({
+        'sv': prefix + '_sv_filtered.circosData',
+        'cnv': prefix + '.cnv.circosData',
+        'vaf': snv2circos.output_path(prefix, 'vaf'),
+        'rainfall': snv2circos.output_path(prefix, 'rainfall'),
+        'config': prefix + '.conf',
+        'plot': prefix + '.circosPlot.png'})
+
+
+def run_step(outputs, function, *args):
+    """runs one conversion step, removing its partial outputs if it fails 
+    so that the next run does not mistake them for up to date results"""
+    try:
+        function(*args)
+    except Exception:
+        for output in outputs:
+            if os.path.isfile(output):
+                os.remove(output)
+        raise
+
+
+def process_sample(sample, template, outputDIR, distance_threshold, snv_caller, force=False):
+    """runs the conversions of one sample in this process, returns the names of the steps that ran"""
+    outputs = sample_outputs(sample, outputDIR)
+    steps_run = []
+
+    if force or not is_up_to_date([outputs['sv']], [sample['delly'], sample['manta']]):
+        run_step([outputs['sv']], delly_vs_manta.compare_breakpoints, sample['delly'], sample['manta'], distance_threshold, outputs['sv'])
+        steps_run.append('sv')
+
+    if force or not is_up_to_date([outputs['cnv']], [sample['cnv']]):
+        if sample['cnv'].endswith('.cns') or sample['cnv'].endswith('.cnr'):
+            run_step([outputs['cnv']], cnvkit2circos.parse_cnvkit_cns, sample['cnv'], outputs['cnv'])
+        else:
+            run_step([outputs['cnv']], abscn2circos.convert_smoothened_cnv_file, sample['cnv'], outputs['cnv'])
+        steps_run.append('cnv')
+
+    if force or not is_up_to_date([outputs['vaf'], outputs['rainfall']], [sample['snv']]):
+        snv_outputs = dict({'vaf': outputs['vaf'], 'rainfall': outputs['rainfall']})
+        run_step(snv_outputs.values(), snv2circos.parse_snv_vcf, sample['snv'], snv_outputs, snv_caller)
+        steps_run.append('snv')
+
+    circosData = [outputs['sv'], outputs['cnv'], outputs['vaf'], outputs['rainfall']]
+    if force or not is_up_to_date([outputs['config']], circosData + [template]):
+        run_step([outputs['config']], circosConfigPrep.create_configuration, 
+                 template, outputs['sv'], outputs['cnv'], outputs['vaf'], outputs['rainfall'], outputs['config'], outputs['plot'])
+        steps_run.append('config')
+
+    return steps_run
+
+
+def run_cohort(samples, template, outputDIR, distance_threshold, snv_caller, jobs, force=False):
+    """processes samples in a pool of at most jobs processes, returns the number of failed samples"""
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = dict({executor.submit(process_sample, sample, template, outputDIR, distance_threshold, snv_caller, force): sample['sample'] for sample in samples})
+        for done, future in enumerate(as_completed(futures), start=1):
+            sampleID = futures[future]
+            try:
+                steps_run = future.result()
+                status = 'ran ' + ', '.join(steps_run) if steps_run else 'up to date'
+            except Exception as e:
+                failed += 1
+                status = f'failed: {e!r}'
+            print(f'[{done}/{len(futures)}] {sampleID}: {status}')
+
+    return failed
+
+
+def main():
+    sample_sheet, template, outputDIR, distance_threshold, snv_caller, jobs, force = argument_parser()
+    samples = read_sample_sheet(sample_sheet)
+    os.makedirs(outputDIR, exist_ok=True)
+    failed = run_cohort(samples, template, outputDIR, distance_threshold, snv_caller, jobs, force)
+    return 1 if failed else 0
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -2,10 +2,17 @@ import os, sys
 import re
 import argparse
 import vcf
-import subprocess
-import shlex
 #import tabix
+import io
+import itertools
 import math
+from array import array
+import numpy as np
+from contextlib import ExitStack
+from circos_io import open_input, open_output, has_tabix_index, read_header, fetch_chromosome, map_chromosomes, index_circos_data, sorted_lines, karyotype_key
+from circos_cache import add_cache_arguments, cached_conversion
+from circos_stats import stats, add_stats_arguments, instrument
+from circos_tracks import add_downsample_arguments, downsample_circos_data, downsample_track
 # Prepare chromosome conversio ndictionary
 chrDict = dict() 
 chromosomeList = [str(i) for i in range(1,23)] + ['X', 'Y']
@@ -22,121 +29,422 @@ complementSNV_change = dict({'G>C': 'C>G',
                             'A>C': 'T>G'})
 SNV_change_color = dict({'C>G': 'black', 'C>A': 'blue', 'C>T': 'red', 'T>A': 'magenta', 'T>C': 'yellow', 'T>G': 'green'})
 
+# REF + ALT -> color in one lookup, G and A reference changes folded onto their complement
+basechange_color = dict()
+for basechange, color in SNV_change_color.items():
+    basechange_color.update({basechange.replace('>', ''): color})
+for basechange, complement in complementSNV_change.items():
+    basechange_color.update({basechange.replace('>', ''): SNV_change_color[complement]})
+
+# VAF plans: each takes the keys of a FORMAT string once and returns, for every record sharing that FORMAT,
+# either the index of the tumor sample value that is the VAF, or a function that computes it from the values
+def format_index(format_keys, caller, *keys):
+    '''index of the first of keys in a FORMAT, the VAF of caller cannot be read without one of them'''
+    for key in keys:
+        if key in format_keys:
+            return format_keys.index(key)
+    raise ValueError(f'{caller} VAF needs the {" or ".join(keys)} FORMAT field, which is missing from FORMAT {":".join(format_keys)}')
+
+def mutect_plan(format_keys):
+    '''FA for MuTect, AF for Mutect2, read as is: records with several ALT alleles have no color and are rejected anyway'''
+    return format_index(format_keys, 'mutect', 'FA', 'AF')
+
+def strelka_plan(format_keys):
+    '''tier1 counts of the REF and ALT bases, e.g. CU and TU for C>T'''
+    tier = dict({base: format_index(format_keys, 'strelka', base + 'U') for base in 'ACGT'})
+    def vaf(values, REF, ALT):
+        ref_count = int(values[tier[REF]].split(',')[0])
+        alt_count = int(values[tier[ALT]].split(',')[0])
+        depth = ref_count + alt_count
+        return f'{alt_count / depth:.4f}' if depth > 0 else '0'
+    return vaf
+
+def freebayes_plan(format_keys):
+    '''AO / (AO + RO), first ALT allele only'''
+    ao = format_index(format_keys, 'freebayes', 'AO')
+    ro = format_index(format_keys, 'freebayes', 'RO')
+    def vaf(values, REF, ALT):
+        alt_count = int(values[ao].split(',')[0])
+        depth = alt_count + int(values[ro])
+        return f'{alt_count / depth:.4f}' if depth > 0 else '0'
+    return vaf
+
+vaf_plans = dict({'mutect': mutect_plan, 'strelka': strelka_plan, 'freebayes': freebayes_plan})
+
+
+class SNVDecoder():
+    '''decodes vcf data lines into (CHROM, POS, vaf, color) tuples
+    the tumor column is looked up once from the #CHROM header line and the VAF plan is 
+    built once per distinct FORMAT string, so each line is only split up to the columns it needs'''
+    def __init__(self, header_columns, caller, tumor_sample=None, vaf=True):
+        self.plan = None
+        self.tumor_column = None
+        self.maxsplit = 5 # CHROM, POS, ID, REF, ALT are enough without VAF
+        self.plans = dict()
+        if vaf:
+            samples = header_columns[9:]
+            if tumor_sample == None:
+                tumor_sample = 'TUMOR' if 'TUMOR' in samples else samples[0]
+            if tumor_sample not in samples:
+                raise ValueError(f'tumor sample {tumor_sample} is not in the vcf header')
+            self.tumor_column = header_columns.index(tumor_sample)
+            self.plan = vaf_plans[caller]
+            self.maxsplit = self.tumor_column + 1
+
+    @classmethod
+    def fromheader(cls, header_line, caller, tumor_sample=None, vaf=True):
+        return SNVDecoder(header_line.rstrip('\n').lstrip('#').split('\t'), caller, tumor_sample, vaf)
+
+    def records(self, lines, record=None):
+        '''yields (CHROM, POS, vaf, color) for each vcf data line on a major chromosome, vaf is None without a VAF plan
+        or, with record, what record(CHROM, POS, vaf, color) returns, so a track can format its lines in this loop
+        instead of in a second generator, which costs as much as decoding the line'''
+        maxsplit, tumor_column, plan, plans = self.maxsplit, self.tumor_column, self.plan, self.plans
+        uses_vaf, as_tuple = plan != None, record == None
+        vaf = None
+        read = filtered = 0 # counted locally, this loop is the hot path
+        try:
+            for read, line in enumerate(lines, 1):
+                fields = line.rstrip('\n').split('\t', maxsplit)
+                CHROM = fields[0]
+                if CHROM not in chrDict: # only consider major chromosome contigs
+                    filtered += 1
+                    continue
+                REF, ALT = fields[3], fields[4]
+                color = basechange_color[REF + ALT]
+
+                if uses_vaf:
+                    FORMAT = fields[8]
+                    vaf_reader = plans.get(FORMAT)
+                    if vaf_reader == None:
+                        vaf_reader = plans[FORMAT] = plan(FORMAT.split(':'))
+                    values = fields[tumor_column].split(':')
+                    vaf = values[vaf_reader] if vaf_reader.__class__ is int else vaf_reader(values, REF, ALT)
+
+                yield (CHROM, fields[1], vaf, color) if as_tuple else record(CHROM, fields[1], vaf, color)
+        finally:
+            stats.count('records_read', read)
+            stats.count('filtered_contig', filtered)
+            stats.count('records_written', read - filtered)
+
+
+# color of each SNV stored as a one byte code by the distance based tracks
+color_names = list(SNV_change_color.values())
+color_codes = dict({color: code for code, color in enumerate(color_names)})
+
+
+def intermutation_distances(positions):
+    '''distance of each SNV to the previous one of a sorted position array, 1 for the first
+    and for SNVs at the same position, so that log10 stays finite'''
+    distances = np.diff(positions, prepend=positions[:1] - 1)
+    return np.maximum(distances, 1)
+
+
+def kataegis_foci(positions, min_mutations=6, mean_distance=1000):
+    '''(first, last) indices of the kataegis foci of a sorted position array
+    every window of min_mutations consecutive SNVs whose mean intermutation distance is at most mean_distance is marked,
+    and windows that share SNVs are merged into one focus, so a dense stretch longer than a window is reported once'''
+    if len(positions) < min_mutations:
+        return []
+    # window i spans SNVs i .. i + min_mutations - 1
+    spans = positions[min_mutations - 1:] - positions[:len(positions) - min_mutations + 1]
+    hits = np.flatnonzero(spans <= mean_distance * (min_mutations - 1))
+    if len(hits) == 0:
+        return []
+    # a window starting min_mutations or more SNVs after the previous one shares none of its SNVs and opens a new focus
+    breaks = np.flatnonzero(np.diff(hits) >= min_mutations) + 1
+    firsts = hits[np.r_[0, breaks]]
+    lasts = hits[np.r_[breaks - 1, len(hits) - 1]] + min_mutations - 1
+    return list(zip(firsts.tolist(), lasts.tolist()))
+
+
+class VafTrack():
+    '''track writer for the variant allele fraction of each SNV'''
+    uses_vaf = True
+    scatter = True # one valued point per SNV, can be downsampled
+
+    def __init__(self, f=None):
+        self.f = f
+
+    @staticmethod
+    def record(CHROM, POS, vaf, color):
+        return f'{chrDict[CHROM]}\t{POS}\t{POS}\t{vaf}\tcolor={color}\n'
+
+    def write(self, CHROM, POS, vaf, color):
+        self.f.write(self.record(CHROM, POS, vaf, color))
+
+    def lines(self, records):
+        '''the records are track lines already'''
+        return records
+
+    def close(self):
+        pass
+
+
+class DistanceTrack():
+    '''base of track writers that depend on the distances between SNVs
+    positions and colors of the current chromosome are collected in compact arrays and handed to chromosome_lines 
+    as sorted NumPy arrays as soon as the next chromosome starts, so only one chromosome is held in memory and the track
+    streams. SNVs need not be sorted within a chromosome, but each chromosome must be contiguous, as --unsorted ensures'''
+    uses_vaf = False
+    scatter = False
+    record = None # collects (CHROM, POS, vaf, color) tuples
+
+    def __init__(self, f=None):
+        self.f = f
+        self.CHROM = None
+        self.positions = array('q')
+        self.colors = bytearray()
+        self.finished = set()
+
+    def start(self, CHROM):
+        '''the track lines of the previous chromosome, SNVs are collected for CHROM from now on'''
+        lines = self.flush()
+        if CHROM in self.finished:
+            raise ValueError(f'SNVs of chromosome {CHROM} are not contiguous in the vcf, use --unsorted')
+        self.CHROM = CHROM
+        return lines
+
+    def write(self, CHROM, POS, vaf, color):
+        if CHROM != self.CHROM:
+            self.f.writelines(self.start(CHROM))
+        self.positions.append(int(POS))
+        self.colors.append(color_codes[color])
+
+    def lines(self, records):
+        '''yields the track lines of each chromosome once the next one starts'''
+        for CHROM, POS, vaf, color in records:
+            if CHROM != self.CHROM:
+                yield from self.start(CHROM)
+            self.positions.append(int(POS))
+            self.colors.append(color_codes[color])
+        yield from self.flush()
+
+    def flush(self):
+        '''the track lines of the current chromosome, from sorted position and color arrays'''
+        if self.CHROM == None:
+            return []
+        positions = np.frombuffer(self.positions, dtype=np.int64)
+        colors = np.frombuffer(self.colors, dtype=np.uint8)
+        if np.any(positions[1:] < positions[:-1]):
+            order = np.argsort(positions, kind='stable')
+            positions, colors = positions[order], colors[order]
+        lines = self.chromosome_lines(chrDict[self.CHROM], positions, colors)
+        self.finished.add(self.CHROM)
+        self.CHROM = None
+        self.positions = array('q')
+        self.colors = bytearray()
+        return lines
+
+    def close(self):
+        self.f.writelines(self.flush())
+
+
+class RainfallTrack(DistanceTrack):
+    '''track writer for the log10 distance of each SNV to the previous one on the same chromosome'''
+    scatter = True
+
+    def chromosome_lines(self, snvCircosChrom, positions, colors):
+        # math.log10 rather than np.log10, which can differ in the last digit from earlier outputs
+        log_distances = map(math.log10, intermutation_distances(positions).tolist())
+        for POS, log_distance, color in zip(positions.tolist(), log_distances, colors.tolist()):
+            yield f'{snvCircosChrom}\t{POS}\t{POS}\t{log_distance}\tcolor={color_names[color]}\n'
+
+
+class KataegisTrack(DistanceTrack):
+    '''highlight track writer for kataegis foci, runs of at least min_mutations SNVs
+    with a mean intermutation distance of at most mean_distance, see kataegis_foci'''
+    def __init__(self, f=None, min_mutations=6, mean_distance=1000):
+        super().__init__(f)
+        self.min_mutations = min_mutations
+        self.mean_distance = mean_distance
+
+    def chromosome_lines(self, snvCircosChrom, positions, colors):
+        for first, last in kataegis_foci(positions, self.min_mutations, self.mean_distance):
+            yield f'{snvCircosChrom}\t{positions[first]}\t{positions[last]}\tmutations={last - first + 1}\n'
+
+
+# maps each --yaxis choice to its track writer, register new per-SNV tracks here
+# a track writer takes the open output handle and its track options, writes one SNV at a time with write
+# or turns the records of SNVDecoder into track lines with lines, and must only depend on SNVs of the same chromosome
+# record, if set, is what SNVDecoder.records builds for lines from each SNV
+# scatter marks tracks of one valued point per SNV, which --max_points downsamples
+snv_tracks = dict({'vaf': VafTrack, 'rainfall': RainfallTrack, 'kataegis': KataegisTrack})
+
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 7
+
 
 def argument_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', required=True, help='SNV file in vcf or vcf.gz file')
-    parser.add_argument('-c', '--caller', required=True, choices=['mutect', 'strelka', 'freebayes'], help='SNV caller used')
-    parser.add_argument('-y', '--yaxis', required=True, choices=['vaf', 'rainfall'], help='value of Y-axis to represent')
+    parser.add_argument('-i', '--input', required=True, help='SNV file in vcf or vcf.gz file, - for stdin')
+    parser.add_argument('-o', '--output', required=False, default=None, help='output .circosData file, - for stdout; with several --yaxis the track name is inserted before .circosData. Defaults to input file name + .<yaxis>.circosData')
+    parser.add_argument('-c', '--caller', required=True, choices=vaf_plans.keys(), help='SNV caller used')
+    parser.add_argument('-s', '--tumor_sample', required=False, default=None, help='tumor sample column, defaults to the ##tumor_sample header line, then TUMOR if present, otherwise the first sample')
+    parser.add_argument('-y', '--yaxis', required=True, nargs='+', choices=snv_tracks.keys(), help='value(s) of Y-axis to represent, all written from a single pass over the vcf')
+    parser.add_argument('--kataegis_min_mutations', required=False, default=6, type=int, help='minimum number of SNVs in a kataegis focus, for the kataegis track')
+    parser.add_argument('--kataegis_distance', required=False, default=1000, type=int, help='maximum mean intermutation distance of a kataegis focus, for the kataegis track')
+    parser.add_argument('-t', '--threads', required=False, default=1, type=int, help='processes converting chromosomes in parallel if the vcf.gz is tabix indexed, otherwise threads for BGZF decompression')
+    parser.add_argument('--unsorted', required=False, action='store_true', help='input is not coordinate sorted, sort it in bounded memory first')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_downsample_arguments(parser)
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
     args = parser.parse_args()
-    return args.input, args.caller, args.yaxis
+    if args.input == '-' and args.output == None:
+        parser.error('--output is required when reading from stdin')
+    if args.output == '-' and (len(args.yaxis) > 1 or args.index):
+        parser.error('--output - writes a single --yaxis track to stdout and cannot be indexed')
+    return args.input, args.output, args.caller, args.tumor_sample, args.yaxis, args.kataegis_min_mutations, args.kataegis_distance, args.threads, args.unsorted, args.max_points, args.cluster_distance, args.index, args.cache_dir, args.cache_max_size, args.stats, args.profile
 
 def output_path(inputfile, yaxis):
     return inputfile +'.' + yaxis +  '.circosData'
 
-def copy_vcfgz(vcfgzfile):
-    '''if input is a compressed vcf.gz file, create a temporary copy and unzip it'''
+def track_outputs(inputfile, yaxis, output=None):
+    """output file of each yaxis track: output itself for a single track, otherwise output with the track name
+    inserted before .circosData. Without output, every track is named after the input file"""
+    if output == None:
+        return dict({track: output_path(inputfile, track) for track in yaxis})
+    if len(yaxis) == 1:
+        return dict({yaxis[0]: output})
+    prefix = output[:-len('.circosData')] if output.endswith('.circosData') else output
+    return dict({track: output_path(prefix, track) for track in yaxis})
+
+def iter_snv_records(lines, caller, tumor_sample=None, vaf=True, record=None):
+    """iterator of (CHROM, POS, vaf, color), or record of them, for every SNV on the major chromosomes of a vcf
+    the header is read at once and the decoder's own generator returned, so no generator is stacked on the hot loop
+    without tumor_sample, the ##tumor_sample header line of Mutect2 names the tumor column if present"""
+    lines = iter(lines)
+    for line in lines:
+        if line.startswith('#CHROM'):
+            return SNVDecoder.fromheader(line, caller, tumor_sample, vaf).records(lines, record)
+        if not line.startswith('##'):
+            raise ValueError('vcf data line found before the #CHROM header line')
+        if line.startswith('##tumor_sample=') and tumor_sample == None:
+            tumor_sample = line.rstrip('\n').split('=', 1)[1]
+    return iter([])
+
+
+def write_snv_tracks(lines, handles, caller, tumor_sample=None, track_options=None):
+    """hands each SNV of the vcf lines to a track writer per requested track
+    handles maps names in snv_tracks to open output handles, track_options optionally
+    maps names in snv_tracks to keyword arguments of their track writer"""
+    if track_options == None:
+        track_options = dict()
+    tracks = [snv_tracks[yaxis](f, **track_options.get(yaxis, dict())) for yaxis, f in handles.items()]
+    uses_vaf = any(track.uses_vaf for track in tracks)
+    for CHROM, POS, vaf, color in iter_snv_records(lines, caller, tumor_sample, uses_vaf):
+        for track in tracks:
+            track.write(CHROM, POS, vaf, color)
+    for track in tracks:
+        track.close()
+
+
+def iter_snv_track(lines, yaxis, caller, tumor_sample=None, **options):
+    """iterator of the circosData lines of the yaxis track from vcf lines, such as an open file or the output of another generator
+    the vaf track yields as it reads, tracks based on distances between SNVs once each chromosome is complete"""
+    track = snv_tracks[yaxis](**options)
+    return track.lines(iter_snv_records(lines, caller, tumor_sample, track.uses_vaf, track.record))
 
-    tempfile = re.sub(string=vcfgzfile, pattern=r'.vcf.gz$', repl='.temp.vcf.gz')
-    
-    copycmd = f'cp {vcfgzfile} {tempfile}'
-    subprocess.call(shlex.split(copycmd))
-    unzipcmd = f'gunzip {tempfile}'
-    subprocess.call(shlex.split(unzipcmd))
-    uncompressed_copy = re.sub(string=tempfile, pattern=r'.gz$', repl='')
-    print(uncompressed_copy)
-    return uncompressed_copy
 
-def parse_snv_vaf_vcf(inputfile, outputfile, caller):
+def convert_snv_chromosome(inputfile, chromosome, header, yaxis, caller, tumor_sample=None, track_options=None):
+    """text of each track for the SNVs on one chromosome of a tabix indexed vcf, run in a worker process
+    rainfall distances restart at every chromosome anyway, so chromosomes are independent"""
+    handles = dict({track: io.StringIO() for track in yaxis})
+    lines = itertools.chain(header, fetch_chromosome(inputfile, chromosome))
+    write_snv_tracks(lines, handles, caller, tumor_sample, track_options)
+    return dict({track: handle.getvalue() for track, handle in handles.items()})
+
+
+def parse_snv_vcf(inputfile, outputs, caller, threads=1, tumor_sample=None, track_options=None, unsorted=False):
+    """reads the vcf once and hands each SNV to every requested track writer
+    outputs maps names in snv_tracks to their output file
+    a tabix indexed vcf.gz is converted one chromosome per process when threads > 1
+    an unsorted vcf is streamed through an external merge sort into karyotype order"""
+    with ExitStack() as stack:
+        handles = dict({yaxis: stack.enter_context(open_output(outputfile)) for yaxis, outputfile in outputs.items()})
+        if threads > 1 and has_tabix_index(inputfile):
+            header = read_header(inputfile)
+            chromosome_tracks = map_chromosomes(convert_snv_chromosome, inputfile, chromosomeList, threads, header, list(outputs), caller, tumor_sample, track_options)
+            for tracks in chromosome_tracks:
+                for yaxis, text in tracks.items():
+                    handles[yaxis].write(text)
+        else:
+            with open_input(inputfile, threads) as g:
+                lines = sorted_lines(g, karyotype_key(chromosomeList)) if unsorted else g
+                write_snv_tracks(lines, handles, caller, tumor_sample, track_options)
+
+    return 0
+
+
+def parse_snv_track(inputfile, outputfile, yaxis, caller, threads=1, tumor_sample=None, options=None, unsorted=False, max_points=None, cluster_distance=0):
+    """parse_snv_vcf for a single track, streamed to outputfile, - for stdin or stdout
+    with max_points, a scatter track is downsampled on its way to the output"""
+    if options == None:
+        options = dict()
+    with ExitStack() as stack:
+        if threads > 1 and has_tabix_index(inputfile):
+            header = read_header(inputfile)
+            chromosome_tracks = map_chromosomes(convert_snv_chromosome, inputfile, chromosomeList, threads, header, [yaxis], caller, tumor_sample, dict({yaxis: options}))
+            lines = (line for tracks in chromosome_tracks for line in tracks[yaxis].splitlines(keepends=True))
+        else:
+            lines = stack.enter_context(open_input(inputfile, threads))
+            if unsorted:
+                lines = sorted_lines(lines, karyotype_key(chromosomeList))
+            lines = iter_snv_track(lines, yaxis, caller, tumor_sample, **options)
+        if max_points != None and snv_tracks[yaxis].scatter:
+            lines = downsample_track(lines, max_points, cluster_distance)
+
+        f = stack.enter_context(open_output(outputfile))
+        f.writelines(lines)
+
+    return 0
+
+
+def parse_snv_vaf_vcf(inputfile, outputfile, caller, threads=1, tumor_sample=None):
     """takes structural variation vcf file as input and parse them into 
     appropriately formatted data file for Circos"""
-    if inputfile.endswith('.gz'):
-        vcffile = copy_vcfgz(inputfile)
-
-    else:
-        vcffile = inputfile
-    with open(vcffile, 'r') as g:
-        with open(outputfile, 'w') as f:
-             for line in g:
-                distance_filter = False # distance filter, if SV too small don't show
-                if not line.startswith('#'): # skip vcf header
-                    
-                    CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, FORMAT, TUMOR, NORMAL = line.strip().split()
-                    if CHROM in chrDict.keys(): # only consider major chromosome contigs
-                        #print(TUMOR.split(';'))
-                        vaf = TUMOR.split(':')[4] # FA column for mutect
-
-                        snvCircosChrom = chrDict[CHROM]
-                         
-                        basechange = f'{REF}>{ALT}'
-                        if REF in ['G', 'A']:
-                            basechange = complementSNV_change[basechange]
-                        
-                        color = SNV_change_color[basechange]
-
-
-                        f.write(f'{snvCircosChrom}\t{POS}\t{POS}\t{vaf}\tcolor={color}\n')
-
-
-def parse_snv_rainfall_vcf(inputfile, outputfile):
+    return parse_snv_vcf(inputfile, dict({'vaf': outputfile}), caller, threads, tumor_sample)
+
+
+def parse_snv_rainfall_vcf(inputfile, outputfile, threads=1):
     """prepare for circos rainfall plot from a given vcf file"""
-    if inputfile.endswith('.gz'):
-        vcffile = copy_vcfgz(inputfile)
-
-    else:
-        vcffile = inputfile
-
-    with open(vcffile, 'r') as g:
-        prev_location = 0
-        prev_chr = '0'
-        with open(outputfile, 'w') as f:
-            for line in g:
-                if not line.startswith('#'):
-                    CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, FORMAT, TUMOR, NORMAL = line.strip().split() 
-                    if CHROM in chrDict.keys():
-                        snvCircosChrom = chrDict[CHROM]
-                        basechange = f'{REF}>{ALT}'
-                        if REF in ['G', 'A']:
-                            basechange = complementSNV_change[basechange]
-
-                        color = SNV_change_color[basechange]
-
-                        if prev_chr == CHROM:
-                            
-                            distance = int(POS) - int(prev_location)
-                            prev_location = int(POS)
-                            prev_chr = CHROM        
-                        else:
-                            distance = 1
-                            prev_location = int(POS)
-                            prev_chr = CHROM
-                        log_distance = math.log10(distance)
-
-                        f.write(f'{snvCircosChrom}\t{POS}\t{POS}\t{log_distance}\tcolor={color}\n')
-                    else:
-                        pass # if on extra contigs other than the major ones then skip  
-
-    # remove temporary copy if vcf.gz file was the input
-    if inputfile.endswith('.vcf.gz'):
-        subprocess.call(shlex.split('rm -rf ' + vcffile))
+    return parse_snv_vcf(inputfile, dict({'rainfall': outputfile}), 'mutect', threads)
 
-    return 0
 
 def main():
     # take input file 
-    input, caller, yaxis = argument_parser()
+    input, output, caller, tumor_sample, yaxis, kataegis_min_mutations, kataegis_distance, threads, unsorted, max_points, cluster_distance, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
     # prepare ouptut file path
-    output = output_path(input, yaxis)
-    # parse input cnvkit file and output circos data file
-    if yaxis == 'vaf':
-        parse_snv_vaf_vcf(input, output, caller)
-    elif yaxis == 'rainfall':
-        parse_snv_rainfall_vcf(input, output)
+    outputs = track_outputs(input, yaxis, output)
+    # parse input vcf once and output a circos data file per track
+    track_options = dict({'kataegis': dict({'min_mutations': kataegis_min_mutations, 'mean_distance': kataegis_distance})})
+    def convert():
+        if len(outputs) == 1:
+            (track, output), = outputs.items()
+            with stats.stage('convert'):
+                parse_snv_track(input, output, track, caller, threads, tumor_sample, track_options.get(track), unsorted, max_points, cluster_distance)
+            return
+        with stats.stage('convert'):
+            parse_snv_vcf(input, outputs, caller, threads, tumor_sample, track_options, unsorted)
+        if max_points != None:
+            with stats.stage('downsample'):
+                for track, output in outputs.items():
+                    if snv_tracks[track].scatter:
+                        downsample_circos_data(output, max_points, cluster_distance)
 
+    params = dict({'caller': caller, 'tumor_sample': tumor_sample, 'yaxis': sorted(outputs), 'track_options': track_options, 'max_points': max_points, 'cluster_distance': cluster_distance, 'unsorted': unsorted})
+    with instrument('snv2circos', stats_path, profile_path):
+        if cached_conversion(cache_dir, 'snv2circos', CONVERTER_VERSION, [input], params, outputs, convert, cache_max_size):
+            stats.count('cache_hit')
 
-    print(f'Output Circos Data file is written: {output}')
+        for output in outputs.values():
+            if index:
+                with stats.stage('index'):
+                    index_circos_data(output)
+            if output != '-':
+                print(f'Output Circos Data file is written: {output}')
 
 
 if __name__=='__main__':
     main()
-
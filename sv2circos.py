@@ -2,9 +2,10 @@ import os, sys
 import re
 import argparse
 import vcf
-import subprocess
-import shlex
 import tabix
+from circos_io import open_input, open_output, has_tabix_index, fetch_chromosome, map_chromosomes, index_circos_data
+from circos_cache import add_cache_arguments, cached_conversion
+from circos_stats import stats, add_stats_arguments, instrument
 
 # Prepare chromosome conversio ndictionary
 chrDict = dict() 
@@ -14,95 +15,174 @@ for i in chromosomeList:
 
 svtype2color = dict({'BND': 'black', 'DEL': 'yellow', 'DUP': 'blue', 'INV': 'orange', 'INS': 'green', 'TRA': 'black'})
 
+# mate position in a BND ALT, e.g. N[12:3456[
+bnd_pattern = re.compile(r'[a-zA-Z]*[0-9]*:[0-9]+')
+
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 1
+
 def argument_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', required=True, help='SV file in vcf or vcf.gz file')
+    parser.add_argument('-i', '--input', required=True, help='SV file in vcf or vcf.gz file, - for stdin')
+    parser.add_argument('-o', '--output', required=False, default=None, help='output .circosData file, - for stdout, defaults to input file name + .circosData')
     parser.add_argument('-c', '--caller', required=True, choices=['delly', 'manta'], help='SV caller used')
     parser.add_argument('-d', '--distance_threshold', required=False, default=100000, type=int, help='Distance threshold within same chromosome to display')
+    parser.add_argument('-t', '--threads', required=False, default=1, type=int, help='processes converting chromosomes in parallel if the vcf.gz is tabix indexed, otherwise threads for BGZF decompression')
+    parser.add_argument('-b', '--backend', required=False, default='tokenizer', choices=['tokenizer', 'cyvcf2'], help='vcf parser, single pass INFO tokenizer or cyvcf2')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
     args = parser.parse_args()
-    return args.input, args.caller, args.distance_threshold
+    if args.input == '-' and args.output == None:
+        parser.error('--output is required when reading from stdin')
+    if args.output == '-' and args.index:
+        parser.error('--index needs an output file')
+    return args.input, args.output, args.caller, args.distance_threshold, args.threads, args.backend, args.index, args.cache_dir, args.cache_max_size, args.stats, args.profile
 
 def output_path(inputfile):
     return inputfile + '.circosData'
 
-def copy_vcfgz(vcfgzfile):
-    '''if input is a compressed vcf.gz file, create a temporary copy and unzip it'''
-
-    tempfile = re.sub(string=vcfgzfile, pattern=r'.vcf.gz$', repl='.temp.vcf.gz')
-    
-    copycmd = f'cp {vcfgzfile} {tempfile}'
-    subprocess.call(shlex.split(copycmd))
-    unzipcmd = f'gunzip {tempfile}'
-    subprocess.call(shlex.split(unzipcmd))
-    uncompressed_copy = re.sub(string=tempfile, pattern=r'.gz$', repl='')
-    print(uncompressed_copy)
-    return uncompressed_copy
-
-def parse_sv_vcf(inputfile, outputfile, caller, distance_threshold):
+def parse_info(INFO):
+    """splits a vcf INFO string into a dictionary in a single pass, flags map to an empty string"""
+    info = dict()
+    for field in INFO.split(';'):
+        key, _, value = field.partition('=')
+        info[key] = value
+    return info
+
+
+def sv_link(CHROM, POS, bp2Chr, bp2POS, svtype, distance_threshold):
+    """circosData link line of a SV, None if both breakpoints are on the same chromosome
+    and closer than distance_threshold"""
+    color = svtype2color[svtype]
+    bp1CircosChrom = chrDict[CHROM]
+    bp2CircosChrom = chrDict[bp2Chr] 
+
+    # if Breakpoints on different chromosome, then display
+    # if on same chromosome, don't show unless it is greater than threshold
+    if CHROM == bp2Chr and abs(int(POS) - int(bp2POS)) <= distance_threshold:
+        return None
+    return f'{bp1CircosChrom}\t{POS}\t{POS}\t{bp2CircosChrom}\t{bp2POS}\t{bp2POS}\tcolor={color}\n'
+
+
+def iter_sv_links(lines, caller, distance_threshold):
+    """yields circosData link lines from the lines of a structural variation vcf, 
+    reading each INFO field once with parse_info"""
+    read = filtered_distance = filtered_contig = 0 # counted locally, this loop is the hot path
+    try:
+        for line in lines:
+            if not line.startswith('#'): # skip vcf header
+                read += 1
+                CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, *args = line.split('\t', 8)
+                info = parse_info(INFO.rstrip('\n'))
+                svtype = info['SVTYPE']
+
+                if CHROM in chrDict.keys(): # only consider major chromosome contigs
+                    if caller=='delly':
+                        bp2Chr = info['CHR2']
+                        bp2POS = info['END']
+                
+                    elif caller=='manta':
+                        if svtype == 'BND': # if sv type is bnd
+                            bnd_pos = bnd_pattern.search(ALT).group(0)
+                            bp2Chr, bp2POS = bnd_pos.split(':')
+                        else: # if variant is on the same chromosome (i.e. not BND)
+                            svlen = int(info['SVLEN'])
+                            bp2Chr=CHROM
+                            bp2POS = int(POS) + svlen                        
+
+                    link = sv_link(CHROM, POS, bp2Chr, bp2POS, svtype, distance_threshold)
+                    if link != None:
+                        yield link
+                    else:
+                        filtered_distance += 1
+                else:
+                    filtered_contig += 1
+    finally:
+        stats.count('records_read', read)
+        stats.count('records_written', read - filtered_distance - filtered_contig)
+        stats.count('filtered_distance', filtered_distance)
+        stats.count('filtered_contig', filtered_contig)
+
+
+def iter_sv_links_cyvcf2(inputfile, caller, distance_threshold, threads=1):
+    """same as iter_sv_links, with the vcf decoded by cyvcf2 instead"""
+    import cyvcf2
+
+    read = filtered_distance = filtered_contig = 0
+    try:
+        for variant in cyvcf2.VCF(inputfile, threads=threads):
+            read += 1
+            svtype = variant.INFO.get('SVTYPE')
+
+            if variant.CHROM in chrDict.keys(): # only consider major chromosome contigs
+                if caller=='delly':
+                    bp2Chr = variant.INFO.get('CHR2')
+                    bp2POS = variant.INFO.get('END')
+
+                elif caller=='manta':
+                    if svtype == 'BND': # if sv type is bnd
+                        bnd_pos = bnd_pattern.search(variant.ALT[0]).group(0)
+                        bp2Chr, bp2POS = bnd_pos.split(':')
+                    else: # if variant is on the same chromosome (i.e. not BND)
+                        svlen = variant.INFO.get('SVLEN')
+                        if isinstance(svlen, tuple):
+                            svlen = svlen[0]
+                        bp2Chr = variant.CHROM
+                        bp2POS = variant.POS + svlen
+
+                link = sv_link(variant.CHROM, variant.POS, bp2Chr, bp2POS, svtype, distance_threshold)
+                if link != None:
+                    yield link
+                else:
+                    filtered_distance += 1
+            else:
+                filtered_contig += 1
+    finally:
+        stats.count('records_read', read)
+        stats.count('records_written', read - filtered_distance - filtered_contig)
+        stats.count('filtered_distance', filtered_distance)
+        stats.count('filtered_contig', filtered_contig)
+
+
+def convert_sv_chromosome(inputfile, chromosome, caller, distance_threshold):
+    """circosData links of the SVs on one chromosome of a tabix indexed vcf, run in a worker process"""
+    return ''.join(iter_sv_links(fetch_chromosome(inputfile, chromosome), caller, distance_threshold))
+
+
+def parse_sv_vcf(inputfile, outputfile, caller, distance_threshold, threads=1, backend='tokenizer'):
     """takes structural variation vcf file as input and parse them into 
-    appropriately formatted data file for Circos"""
-    if inputfile.endswith('.gz'):
-        vcffile = copy_vcfgz(inputfile)
-
-    else:
-        vcffile = inputfile
-    with open(vcffile, 'r') as g:
-        with open(outputfile, 'w') as f:
-             for line in g:
-                distance_filter = False # distance filter, if SV too small don't show
-                if not line.startswith('#'): # skip vcf header
-                    CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, *args = line.strip().split()
-                    svtype = re.sub(string=re.search(string=INFO, pattern=r'SVTYPE=[A-Z]+').group(0), pattern='SVTYPE=', repl='')
-                    color = svtype2color[svtype]
-
-                    if CHROM in chrDict.keys(): # only consider major chromosome contigs
-                        if caller=='delly':
-                            bp2Chr = re.sub(string=re.search(string=INFO, pattern=r'CHR2=[A-Za-z0-9]*').group(0), pattern='CHR2=', repl='')
-                            bp2POS = re.sub(string=re.search(string=INFO, pattern=r'END=[0-9]+').group(0), pattern='END=', repl='')
-                    
-                        elif caller=='manta':
-                            if re.search(string=INFO, pattern=r'SVTYPE=BND'): # if sv type is bnd
-                                bnd_pos= re.search(string=ALT, pattern=r'[a-zA-Z]*[0-9]*:[0-9]+').group(0)
-                                bp2Chr, bp2POS = bnd_pos.split(':')
-                            else: # if variant is on the same chromosome (i.e. not BND)
-                                
-                                svlen = int(re.sub(string=re.search(string=INFO, pattern=r'SVLEN=-*[0-9]+').group(0), pattern=r'SVLEN=', repl=''))
-                                bp2Chr=CHROM
-                                bp2POS = int(POS) + svlen                        
-
-                        bp1CircosChrom = chrDict[CHROM]
-                        bp2CircosChrom = chrDict[bp2Chr] 
-                        
-                        # if Breakpoints on different chromosome, then display
-                        # if on same chromosome, don't show unless it is greater than threshold
-                        if CHROM == bp2Chr:
-                            if abs(int(POS) - int(bp2POS)) > distance_threshold:
-                                distance_filter = True
-                        else:
-                            distance_filter = True
-
-                        if distance_filter == True:
-                            f.write(f'{bp1CircosChrom}\t{POS}\t{POS}\t{bp2CircosChrom}\t{bp2POS}\t{bp2POS}\tcolor={color}\n')
+    appropriately formatted data file for Circos, - for stdin or stdout
+    a tabix indexed vcf.gz is converted one chromosome per process when threads > 1"""
+    with open_output(outputfile) as f:
+        if backend == 'cyvcf2':
+            f.writelines(iter_sv_links_cyvcf2(inputfile, caller, distance_threshold, threads))
+        elif threads > 1 and has_tabix_index(inputfile):
+            f.writelines(map_chromosomes(convert_sv_chromosome, inputfile, chromosomeList, threads, caller, distance_threshold))
+        else:
+            with open_input(inputfile, threads) as g:
+                f.writelines(iter_sv_links(g, caller, distance_threshold))
 
     
-    # remove temporary copy if vcf.gz file was the input
-    if inputfile.endswith('.vcf.gz'):
-        subprocess.call(shlex.split('rm -rf ' + vcffile))
-
-
-
-                    
-        
-                    
 def main():
     # take input file 
-    input, caller, distance_threshold = argument_parser()
+    input, output, caller, distance_threshold, threads, backend, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
     # prepare ouptut file path
-    output = output_path(input)
+    if output == None:
+        output = output_path(input)
     # parse input cnvkit file and output circos data file
-    parse_sv_vcf(input, output, caller, distance_threshold)
-
-    print(f'Output Circos Data file is written: {output}')
+    params = dict({'caller': caller, 'distance_threshold': distance_threshold})
+    with instrument('sv2circos', stats_path, profile_path):
+        with stats.stage('convert'):
+            if cached_conversion(cache_dir, 'sv2circos', CONVERTER_VERSION, [input], params, dict({'circosData': output}),
+                                 lambda: parse_sv_vcf(input, output, caller, distance_threshold, threads, backend), cache_max_size):
+                stats.count('cache_hit')
+        if index:
+            with stats.stage('index'):
+                index_circos_data(output)
+
+    if output != '-':
+        print(f'Output Circos Data file is written: {output}')
 
 
 if __name__=='__main__':
@@ -4,10 +4,8 @@ Combined Structural variation callset from both DELLY and MANTA
 """
 
 import argparse
-import re
 import os
-import subprocess
-import shlex
+from circos_template import load_template
 
 
 def argument_parser():
@@ -33,21 +31,9 @@ def argument_parser():
 
 
 def create_configuration(template, sv, cnv, circosConfig, circosPlot):
-    """read in template file, 
-    substitue <SVCIRCOS>, <CNVCIRCOS>, <OUTPUTFILE> to respective file names"""
-    with open(template, 'r') as f:
-        with open(circosConfig, 'w') as g:
-            for line in f:
-                if re.search(string=line, pattern=r'<OUTPUTFILE>') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<OUTPUTFILE>', repl=circosPlot)
-                elif re.search(string=line, pattern=r'<SVCIRCOS>') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<SVCIRCOS>', repl=sv)
-                elif re.search(string=line, pattern=r'<CNVCIRCOS>') != None:
-                    replaced_line = re.sub(string=line, pattern=r'<CNVCIRCOS>', repl=cnv)
-                else:
-                    replaced_line = line 
-            
-                g.write(replaced_line)
+    """renders template with <SVCIRCOS>, <CNVCIRCOS>, <OUTPUTFILE> substituted by the respective file names"""
+    bindings = dict({'SVCIRCOS': sv, 'CNVCIRCOS': cnv, 'OUTPUTFILE': circosPlot})
+    load_template(template).write(bindings, circosConfig)
 
 
 
@@ -0,0 +1,152 @@
+"""
+Consensus structural variation callset from any number of SV callers (Delly, Manta, Lumpy, GRIDSS, SvABA, ...)
+
+"""
+
+import argparse
+import collections
+import os
+import numpy as np
+from circos_cache import add_cache_arguments, cached_conversion
+from circos_stats import stats, add_stats_arguments, instrument
+from circos_io import index_circos_data, open_output
+from delly_vs_manta import BreakpointTable, chrDict, load_tables, chromosomeList, svtype2color, svtype_codes
+
+
+# bump when a change alters the output, so cached results of older versions are not reused
+CONVERTER_VERSION = 2
+
+def argument_parser():
+    """parses argument passed on from command line"""
+    parser = argparse.ArgumentParser(
+        description='Writes links of SVs called by at least k of the given SV callers as .circosData')
+
+    parser.add_argument('-i', '--input', required=True, nargs='+', help='SV vcf files, one per caller')
+    parser.add_argument('-n', '--names', required=False, nargs='+', default=None, help='caller name of each input, defaults to the input file names')
+    parser.add_argument('-k', '--min_callers', required=False, default=2, type=int, help='minimum number of callers supporting a link')
+    parser.add_argument('-d', '--distance_threshold', required=False, default=1000, type=int, help='maximum distance between breakpoints of the same SV from different callers')
+    parser.add_argument('-o', '--output', required=True, help='output .circosData file, - for stdout')
+    parser.add_argument('-t', '--threads', required=False, default=1, type=int, help='number of VCFs parsed in parallel')
+    parser.add_argument('--index', required=False, action='store_true', help='also write a bgzipped, tabix indexed copy of the output for region zoom plots')
+    add_cache_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+    if args.names == None:
+        args.names = [os.path.basename(input).split('.')[0] for input in args.input]
+    if len(args.names) != len(args.input):
+        parser.error('--names needs one name per input')
+    if args.output == '-' and args.index:
+        parser.error('--index needs an output file')
+    return args.input, args.names, args.min_callers, args.distance_threshold, args.output, args.threads, args.index, args.cache_dir, args.cache_max_size, args.stats, args.profile
+
+
+def normalize_breakpoints(table):
+    '''table with the two break points of every SV ordered by (chromosome code, start),
+    so that the same SV reported from either end, e.g. both mates of a BND, lines up.
+    TRA, as Delly 0.7 reports translocations, becomes BND so that it clusters with the BND calls of other callers'''
+    swap = (table.chromosome2 < table.chromosome1) | ((table.chromosome2 == table.chromosome1) & (table.start2 < table.start1))
+    normalized = table.select(slice(None))
+    for column1, column2 in [('chromosome1', 'chromosome2'), ('start1', 'start2'), ('end1', 'end2')]:
+        setattr(normalized, column1, np.where(swap, getattr(table, column2), getattr(table, column1)))
+        setattr(normalized, column2, np.where(swap, getattr(table, column1), getattr(table, column2)))
+    normalized.svtype = np.where(table.svtype == svtype_codes['TRA'], svtype_codes['BND'], table.svtype)
+    return normalized
+
+
+def cluster_breakpoints(table, distance_threshold):
+    '''assigns every SV of a normalized table to a cluster in one sweep sorted by SV type, chromosomes and start
+    an SV joins the first open cluster of its type and chromosomes whose first SV (the anchor) has both break points
+    within distance_threshold, otherwise it opens a new cluster. Clusters whose anchor fell more than
+    distance_threshold behind the sweep are closed, so the work per SV does not grow with the number of calls.
+    returns the cluster of each row and the anchor row of each cluster'''
+    order = np.lexsort((table.start2, table.start1, table.chromosome2, table.chromosome1, table.svtype))
+    svtype, chromosome1, chromosome2 = table.svtype.tolist(), table.chromosome1.tolist(), table.chromosome2.tolist()
+    start1, start2 = table.start1.tolist(), table.start2.tolist()
+
+    clusters = np.empty(len(table), dtype=np.int64)
+    anchors = []
+    open_clusters = collections.deque()
+    group = None
+    for row in order.tolist():
+        if (svtype[row], chromosome1[row], chromosome2[row]) != group:
+            group = (svtype[row], chromosome1[row], chromosome2[row])
+            open_clusters.clear()
+        while open_clusters and start1[anchors[open_clusters[0]]] < start1[row] - distance_threshold:
+            open_clusters.popleft()
+
+        for cluster in open_clusters:
+            if abs(start2[anchors[cluster]] - start2[row]) <= distance_threshold:
+                clusters[row] = cluster
+                break
+        else:
+            clusters[row] = len(anchors)
+            open_clusters.append(len(anchors))
+            anchors.append(row)
+
+    return clusters, np.array(anchors, dtype=np.int64)
+
+
+def cluster_callers(table, clusters, n_clusters):
+    '''list of the sorted distinct caller codes of each cluster'''
+    pairs = np.unique(np.stack([clusters, table.caller.astype(np.int64)], axis=1), axis=0)
+    callers = [[] for _ in range(n_clusters)]
+    for cluster, caller in pairs.tolist():
+        callers[cluster].append(caller)
+    return callers
+
+
+def consensus_links(vcf_files, names, min_callers, distance_threshold, threads=1):
+    '''yields (chromosome1, start1, chromosome2, start2, svtype, caller names) of every cluster
+    supported by at least min_callers callers, at the break points of its anchor SV, in karyotype order'''
+    with stats.stage('parse'):
+        table = BreakpointTable.concatenate(load_tables(vcf_files, threads))
+    stats.count('records_read', len(table))
+    with stats.stage('cluster'):
+        table = normalize_breakpoints(table)
+        clusters, anchors = cluster_breakpoints(table, distance_threshold)
+        callers = cluster_callers(table, clusters, len(anchors))
+    stats.count('clusters', len(anchors))
+
+    chromosome_names = table.chromosome_names()
+    svtype_names = list(svtype_codes)
+    links = []
+    for cluster, anchor in enumerate(anchors.tolist()):
+        if len(callers[cluster]) < min_callers:
+            stats.count('filtered_support')
+            continue
+        chromosome1, chromosome2 = chromosome_names[table.chromosome1[anchor]], chromosome_names[table.chromosome2[anchor]]
+        if chromosome1 not in chrDict or chromosome2 not in chrDict: # only consider major chromosome contigs
+            stats.count('filtered_contig')
+            continue
+        links.append((chromosome1, int(table.start1[anchor]), chromosome2, int(table.start2[anchor]),
+                      svtype_names[table.svtype[anchor]], [names[caller] for caller in callers[cluster]]))
+
+    links.sort(key=lambda link: (chromosomeList.index(link[0]), link[1], chromosomeList.index(link[2]), link[3]))
+    yield from links
+
+
+def write_consensus(vcf_files, names, min_callers, distance_threshold, circosDataFile, threads=1):
+    with open_output(circosDataFile) as f:
+        for chromosome1, start1, chromosome2, start2, svtype, callers in consensus_links(vcf_files, names, min_callers, distance_threshold, threads):
+            color = svtype2color[svtype]
+            f.write(f"{chrDict[chromosome1]}\t{start1}\t{start1}\t{chrDict[chromosome2]}\t{start2}\t{start2}\tcolor={color},support={len(callers)},callers={'|'.join(callers)}\n")
+            stats.count('records_written')
+    return 0
+
+
+def main():
+    inputs, names, min_callers, distance_threshold, output, threads, index, cache_dir, cache_max_size, stats_path, profile_path = argument_parser()
+    params = dict({'names': names, 'min_callers': min_callers, 'distance_threshold': distance_threshold})
+    with instrument('sv_consensus', stats_path, profile_path):
+        if cached_conversion(cache_dir, 'sv_consensus', CONVERTER_VERSION, inputs, params, dict({'circosData': output}),
+                             lambda: write_consensus(inputs, names, min_callers, distance_threshold, output, threads), cache_max_size):
+            stats.count('cache_hit')
+        if index:
+            with stats.stage('index'):
+                index_circos_data(output)
+    if output != '-':
+        print(f'Output Circos Data file is written: {output}')
+    return 0
+
+if __name__=='__main__':
+    main()
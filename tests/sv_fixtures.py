@@ -0,0 +1,67 @@
+"""
+Synthetic SV callsets for the breakpoint comparison tests
+
+"""
+
+import random
+
+
+chromosomes = [str(i) for i in range(1, 23)] + ['X', 'Y']
+
+header = '''##fileformat=VCFv4.2
+{contigs}##INFO=<ID=SVTYPE,Number=1,Type=String,Description="SV type">
+##INFO=<ID=CHR2,Number=1,Type=String,Description="chromosome of the second break point">
+##INFO=<ID=END,Number=1,Type=Integer,Description="position of the second break point">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+'''
+
+
+def vcf_line(svtype, chromosome1, position1, chromosome2, position2, id):
+    alt = f'N]{chromosome2}:{position2}]' if svtype == 'BND' else f'<{svtype}>'
+    return f'{chromosome1}\t{position1}\t{id}\tN\t{alt}\t.\tPASS\tSVTYPE={svtype};CHR2={chromosome2};END={position2}\n'
+
+
+def write_vcf(path, records, contigs=True):
+    records = sorted(records, key=lambda record: (chromosomes.index(record[1]), record[2]))
+    with open(path, 'w') as f:
+        f.write(header.format(contigs=''.join(f'##contig=<ID={chromosome}>\n' for chromosome in chromosomes) if contigs else ''))
+        for i, record in enumerate(records):
+            f.write(vcf_line(*record, f'sv{i}'))
+    return path
+
+
+def random_events(seed, n, span=200000, n_chromosomes=4):
+    '''(svtype, chromosome1, position1, chromosome2, position2) of n random SVs, some with END before POS'''
+    rng = random.Random(seed)
+    events = []
+    for _ in range(n):
+        svtype = rng.choice(['BND', 'DEL', 'DUP', 'INV', 'INS'])
+        chromosome1 = rng.choice(chromosomes[:n_chromosomes])
+        position1 = rng.randint(1, span)
+        if svtype == 'BND':
+            chromosome2, position2 = rng.choice(chromosomes[:n_chromosomes]), rng.randint(1, span)
+        else:
+            chromosome2, position2 = chromosome1, max(1, position1 + rng.randint(-300, 30000))
+        events.append((svtype, chromosome1, position1, chromosome2, position2))
+    return events
+
+
+def callsets(seed, n=600):
+    '''two jittered callsets of the same events: manta-like, writing both mates of a BND,
+    and delly-like, writing a BND once from either end'''
+    rng = random.Random(seed + 1)
+    jitter = lambda position: max(1, position + rng.randint(-400, 400))
+    manta, delly = [], []
+    for svtype, chromosome1, position1, chromosome2, position2 in random_events(seed, n):
+        if rng.random() < 0.7:
+            start, end = jitter(position1), jitter(position2)
+            manta.append((svtype, chromosome1, start, chromosome2, end))
+            if svtype == 'BND':
+                manta.append((svtype, chromosome2, end, chromosome1, start))
+        if rng.random() < 0.7:
+            start, end = jitter(position1), jitter(position2)
+            if svtype == 'BND' and rng.random() < 0.5:
+                delly.append((svtype, chromosome2, end, chromosome1, start))
+            else:
+                delly.append((svtype, chromosome1, start, chromosome2, end))
+    return manta, delly
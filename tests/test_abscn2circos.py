@@ -0,0 +1,59 @@
+import random
+
+import pysam
+import pytest
+
+from abscn2circos import chrDict, convert_smoothened_cnv_file, iter_smoothened_cnv_lines
+
+
+def smoothened_lines(seed, n=800):
+    rng = random.Random(seed)
+    lines = ['#chrom\tpos\tratio\tsmoothed\tcn\n']
+    for chromosome in ['1', '2', 'X', 'GL000192.1']:
+        copy_number = 2
+        for i in range(n // 4):
+            if rng.random() < 0.2:
+                copy_number = rng.choice([0, 1, 2, 3, 4, 'NA'])
+            lines.append(f'{chromosome}\t{i * 1000 + 1}\t{rng.uniform(0.5, 1.5):.3f}\t{rng.uniform(0.5, 1.5):.3f}\t{copy_number}\n')
+    return lines
+
+
+def baseline_smoothened(lines):
+    '''parse_smoothened_cnv_file as it was before the chunked reader, one line at a time'''
+    for line in lines:
+        if not line.startswith('#'):
+            chromosome, position, _, _, cnv = line.strip().split()
+            if cnv != 'NA' and chromosome in chrDict.keys():
+                yield f'{chrDict[chromosome]}\t{position}\t{position}\t{cnv}\n'
+
+
+def test_chunked_reader_matches_baseline():
+    lines = smoothened_lines(seed=1)
+    expected = list(baseline_smoothened(lines))
+    for chunk_size in [7, 100, 100000]:
+        assert list(iter_smoothened_cnv_lines(iter(lines), chunk_size)) == expected
+
+
+@pytest.mark.parametrize('tolerance', [0, 1])
+def test_collapse_merges_runs_of_close_copy_numbers(tolerance):
+    lines = smoothened_lines(seed=2)
+    segments = []
+    for line in baseline_smoothened(lines):
+        chromosome, start, end, cnv = line.split()
+        if segments and segments[-1][0] == chromosome and abs(int(cnv) - int(segments[-1][3])) <= tolerance:
+            segments[-1][2] = end
+        else:
+            segments.append([chromosome, start, end, cnv])
+    expected = ['\t'.join(segment) + '\n' for segment in segments]
+    for chunk_size in [7, 100000]:
+        assert list(iter_smoothened_cnv_lines(iter(lines), chunk_size, collapse=True, tolerance=tolerance)) == expected
+
+
+def test_tabix_indexed_input_is_converted_per_chromosome(tmp_path):
+    with open(tmp_path / 'smoothened.txt', 'w') as f:
+        f.writelines(smoothened_lines(seed=3))
+    indexed = pysam.tabix_index(str(tmp_path / 'smoothened.txt'), seq_col=0, start_col=1, end_col=1, keep_original=True)
+    convert_smoothened_cnv_file(str(tmp_path / 'smoothened.txt'), str(tmp_path / 'serial.circosData'))
+    convert_smoothened_cnv_file(indexed, str(tmp_path / 'parallel.circosData'), chunk_size=10, threads=2)
+    with open(tmp_path / 'serial.circosData') as f, open(tmp_path / 'parallel.circosData') as g:
+        assert g.read() == f.read()
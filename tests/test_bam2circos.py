@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+import pysam
+import pytest
+
+from bam2circos import chromosome_coverage, parse_bam_coverage
+
+
+lengths = dict({'1': 50000, '2': 30000, 'GL000192.1': 5000})
+
+
+@pytest.fixture(scope='module')
+def bam(tmp_path_factory):
+    '''coordinate sorted, indexed BAM of random reads, some spliced, some filtered, and their per-base depth on 1 and 2'''
+    rng = random.Random(1)
+    path = str(tmp_path_factory.mktemp('bam') / 'reads.bam')
+    header = dict({'HD': dict({'VN': '1.6', 'SO': 'coordinate'}), 'SQ': [dict({'SN': name, 'LN': length}) for name, length in lengths.items()]})
+    depth = dict({name: np.zeros(length, dtype=np.int64) for name, length in lengths.items()})
+    reads = []
+    for name, length in lengths.items():
+        for i in range(length // 50):
+            start = rng.randint(0, length - 400)
+            cigar = [(0, 100)] if rng.random() < 0.7 else [(0, 60), (3, 150), (0, 40)] # 3 is N, skipped bases
+            reads.append((name, start, cigar, rng.choice([0, 20, 60]), rng.random() < 0.1))
+    reads.sort(key=lambda read: (list(lengths).index(read[0]), read[1]))
+    with pysam.AlignmentFile(path, 'wb', header=header) as f:
+        for i, (name, start, cigar, mapq, duplicate) in enumerate(reads):
+            read = pysam.AlignedSegment(f.header)
+            read.query_name = f'read{i}'
+            read.reference_name = name
+            read.reference_start = start
+            read.cigartuples = cigar
+            read.query_sequence = 'A' * sum(length for operation, length in cigar if operation == 0)
+            read.mapping_quality = mapq
+            read.is_duplicate = duplicate
+            f.write(read)
+            if mapq >= 20 and not duplicate:
+                for block_start, block_end in read.get_blocks():
+                    depth[name][block_start:block_end] += 1
+    pysam.index(path)
+    return path, depth
+
+
+def naive_coverage(depth, chromosome, window):
+    for start in range(0, len(depth), window):
+        bases = depth[start:start + window]
+        yield f'hs{chromosome}\t{start + 1}\t{start + len(bases)}\t{bases.mean():.2f}\n'
+
+
+@pytest.mark.parametrize('window', [1000, 7777, 100000])
+def test_chromosome_coverage_matches_per_base_depth(bam, window):
+    path, depth = bam
+    for chromosome in ['1', '2']:
+        assert chromosome_coverage(path, chromosome, window, 20) == list(naive_coverage(depth[chromosome], chromosome, window))
+
+
+def test_parallel_coverage_is_written_in_karyotype_order(bam, tmp_path):
+    path, depth = bam
+    parse_bam_coverage(path, str(tmp_path / 'coverage.circosData'), 5000, min_mapq=20, threads=2)
+    expected = ['# chr1 start1 end1 chr2 start2 end2 [options]\n'] + list(naive_coverage(depth['1'], '1', 5000)) + list(naive_coverage(depth['2'], '2', 5000))
+    with open(tmp_path / 'coverage.circosData') as f:
+        assert f.readlines() == expected
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+
+import pytest
+
+from circosRender import config_files, is_up_to_date, render, render_all
+
+
+# stand-in for circos: reads what to do and the image to write from <config>.behaviour
+stub = f'''#!{sys.executable}
+import sys, time
+config = sys.argv[2]
+with open(config + '.behaviour') as f:
+    behaviour, image = f.read().split()
+with open(config + '.runs', 'a') as f:
+    f.write('run\\n')
+with open(config + '.runs') as f:
+    runs = len(f.readlines())
+with open(image, 'w') as f:
+    f.write('partial')
+if behaviour == 'hang':
+    time.sleep(60)
+if behaviour == 'fail' or (behaviour == 'flaky' and runs == 1):
+    sys.exit(3)
+'''
+
+
+@pytest.fixture
+def circos(tmp_path):
+    path = tmp_path / 'circos'
+    path.write_text(stub)
+    path.chmod(0o755)
+    return str(path)
+
+
+def configuration(tmp_path, name, behaviour):
+    data = tmp_path / f'{name}.circosData'
+    data.write_text('hs1\t1\t1\t0.5\n')
+    config = tmp_path / f'{name}.conf'
+    config.write_text(f'<image>\ndir = {tmp_path}\nfile = {name}.png # plot\n</image>\n<plots>\n<plot>\nfile = {data}\n</plot>\n</plots>\n')
+    (tmp_path / f'{name}.conf.behaviour').write_text(f"{behaviour}\n{tmp_path / f'{name}.png'}\n")
+    return str(config), str(tmp_path / f'{name}.png'), str(data)
+
+
+def runs(config):
+    with open(config + '.runs') as f:
+        return len(f.readlines())
+
+
+def test_config_files(tmp_path):
+    config, image, data = configuration(tmp_path, 'a', 'ok')
+    assert config_files(config) == (image, [data])
+
+
+def test_render_and_skip_up_to_date(tmp_path, circos):
+    config, image, data = configuration(tmp_path, 'a', 'ok')
+    status, attempts, _ = render(circos, config)
+    assert (status, attempts) == ('rendered', 1)
+    assert is_up_to_date(image, [config, data])
+    assert render(circos, config)[0] == 'up to date'
+    assert runs(config) == 1
+
+    os.utime(data, (time.time() + 10, time.time() + 10)) # data changed after the plot
+    assert render(circos, config)[0] == 'rendered'
+    assert render(circos, config, force=True)[0] == 'rendered'
+    assert runs(config) == 3
+
+
+def test_render_retries_failed_runs(tmp_path, circos):
+    config, image, _ = configuration(tmp_path, 'a', 'flaky')
+    status, attempts, _ = render(circos, config, retries=1)
+    assert (status, attempts) == ('rendered', 2)
+
+
+def test_failed_render_leaves_no_image(tmp_path, circos):
+    config, image, _ = configuration(tmp_path, 'a', 'fail')
+    status, attempts, _ = render(circos, config, retries=2)
+    assert status.startswith('failed: exit code 3')
+    assert attempts == 3
+    assert not os.path.exists(image)
+
+
+def test_render_kills_runs_after_timeout(tmp_path, circos):
+    config, image, _ = configuration(tmp_path, 'a', 'hang')
+    start = time.perf_counter()
+    status, attempts, _ = render(circos, config, timeout=0.5, retries=0)
+    assert status.startswith('failed: timed out after 0.5s')
+    assert time.perf_counter() - start < 10
+    assert not os.path.exists(image)
+
+
+def test_render_all_counts_failures(tmp_path, circos, capsys):
+    configs = [configuration(tmp_path, name, behaviour)[0] for name, behaviour in [('a', 'ok'), ('b', 'fail'), ('c', 'flaky')]]
+    assert render_all(configs, circos, jobs=2, retries=1) == 1
+    output = capsys.readouterr().out
+    assert output.count('rendered') == 2
+    assert 'b.conf: failed: exit code 3' in output
@@ -0,0 +1,56 @@
+import os
+
+from circos_io import fetch_region, index_circos_data
+from circosZoom import merge_regions, parse_region, zoom
+
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_track(path, lines):
+    with open(path, 'w') as f:
+        f.write('# chr1 start1 end1 chr2 start2 end2 [options]\n')
+        f.writelines(lines)
+    return str(path)
+
+
+def test_index_sorts_and_queries_are_1_based(tmp_path):
+    points = ['hs2\t500\t500\t0.1\n', 'hs10\t100\t100\t0.2\n', 'hs1\t1000\t1000\t0.3\n', 'hs1\t999\t999\t0.4\n']
+    indexed = index_circos_data(write_track(tmp_path / 'vaf.circosData', points))
+    assert list(fetch_region(indexed, 'hs1', 1000, 1000)) == ['hs1\t1000\t1000\t0.3\n']
+    assert list(fetch_region(indexed, 'hs1', 1, 5000)) == ['hs1\t999\t999\t0.4\n', 'hs1\t1000\t1000\t0.3\n']
+    assert list(fetch_region(indexed, 'hs3', 1, 5000)) == []
+
+
+def test_cnvkit_segments_are_indexed_0_based(tmp_path):
+    # CNVkit starts are 0-based like BED, the segment covers bases 1001-2000
+    indexed = index_circos_data(write_track(tmp_path / 'cnv.circosData', ['hs1\t1000\t2000\t-0.5\n']), zerobased=True)
+    assert list(fetch_region(indexed, 'hs1', 1000, 1000)) == []
+    assert list(fetch_region(indexed, 'hs1', 1001, 1001)) == ['hs1\t1000\t2000\t-0.5\n']
+    assert list(fetch_region(indexed, 'hs1', 2000, 3000)) == ['hs1\t1000\t2000\t-0.5\n']
+    assert list(fetch_region(indexed, 'hs1', 2001, 3000)) == []
+
+
+def test_merge_regions_joins_overlapping_and_adjacent_regions():
+    regions = [parse_region(region) for region in ['hs2:10-20', '1:500-900', '1:100-200', 'hs1:150-300', '1:301-400', '2:30-40']]
+    assert merge_regions(regions) == [('hs1', 100, 400), ('hs1', 500, 900), ('hs2', 10, 20), ('hs2', 30, 40)]
+    assert merge_regions([parse_region('8'), parse_region('8:1,000-2,000')]) == [parse_region('8')]
+
+
+def test_zoom_writes_each_feature_once(tmp_path):
+    cnv = index_circos_data(write_track(tmp_path / 'cnv.circosData', ['hs1\t1000\t9000\t0.5\n', 'hs1\t9000\t20000\t-0.5\n']), zerobased=True)
+    sv = index_circos_data(write_track(tmp_path / 'sv.circosData', ['hs1\t1500\t1500\ths1\t5500\t5500\tcolor=black\n',
+                                                                     'hs1\t1600\t1600\ths5\t100\t100\tcolor=black\n']))
+    points = index_circos_data(write_track(tmp_path / 'vaf.circosData', ['hs1\t1200\t1200\t0.3\n', 'hs1\t3000\t3000\t0.4\n', 'hs1\t5200\t5200\t0.5\n']))
+    regions = [parse_region(region) for region in ['1:1000-2000', '1:5000-6000', '1:1500-2500']]
+    circosConfig = zoom(regions, sv, cnv, points, points, 'sample', str(tmp_path), os.path.join(repository, 'circos_full_template.conf'))
+
+    # the first CNV segment spans the gap between the two merged regions
+    assert (tmp_path / 'sample.zoom.cnv.circosData').read_text() == 'hs1\t1000\t9000\t0.5\n'
+    # a link is only kept if both of its ends are shown
+    assert (tmp_path / 'sample.zoom.sv.circosData').read_text() == 'hs1\t1500\t1500\ths1\t5500\t5500\tcolor=black\n'
+    assert (tmp_path / 'sample.zoom.vaf.circosData').read_text() == 'hs1\t1200\t1200\t0.3\nhs1\t5200\t5200\t0.5\n'
+    with open(circosConfig) as f:
+        configuration = f.read()
+    assert 'chromosomes_display_default = no\n' in configuration
+    assert 'chromosomes = hs1:0.000999-0.0025,0.004999-0.006\n' in configuration
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from circos_cache import cache_key, cached_conversion, evict, file_signature
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    path = tmp_path / 'input.txt'
+    path.write_text('1\t100\t0.5\n')
+    return str(path)
+
+
+def test_cache_key_depends_on_version_content_and_params(input_file):
+    key = cache_key('depth2circos', 1, [input_file], dict({'window': 10, 'statistic': 'mean'}))
+    assert key == cache_key('depth2circos', 1, [input_file], dict({'statistic': 'mean', 'window': 10}))
+    assert key != cache_key('depth2circos', 2, [input_file], dict({'window': 10, 'statistic': 'mean'}))
+    assert key != cache_key('cnvkit2circos', 1, [input_file], dict({'window': 10, 'statistic': 'mean'}))
+    assert key != cache_key('depth2circos', 1, [input_file], dict({'window': 20, 'statistic': 'mean'}))
+    with open(input_file, 'a') as f:
+        f.write('1\t200\t0.7\n')
+    assert key != cache_key('depth2circos', 1, [input_file], dict({'window': 10, 'statistic': 'mean'}))
+
+
+def test_file_signature_follows_size_and_mtime(input_file):
+    signature = file_signature(input_file)
+    assert signature == file_signature(input_file)
+    os.utime(input_file, (1, 1))
+    assert signature != file_signature(input_file)
+    assert file_signature(None) == None
+
+
+def test_cached_conversion_reuses_outputs(tmp_path, input_file):
+    cache_dir = str(tmp_path / 'cache')
+    output = str(tmp_path / 'output.circosData')
+    runs = []
+    def convert():
+        runs.append(1)
+        with open(output, 'w') as f:
+            f.write('hs1\t100\t100\t0.5\n')
+
+    assert not cached_conversion(cache_dir, 'depth2circos', 1, [input_file], dict(), dict({'circosData': output}), convert)
+    os.remove(output)
+    assert cached_conversion(cache_dir, 'depth2circos', 1, [input_file], dict(), dict({'circosData': output}), convert)
+    assert len(runs) == 1
+    with open(output) as f:
+        assert f.read() == 'hs1\t100\t100\t0.5\n'
+    assert not cached_conversion(cache_dir, 'depth2circos', 1, [input_file], dict({'window': 5}), dict({'circosData': output}), convert)
+    assert len(runs) == 2
+
+
+def test_cached_conversion_bypasses_pipes(tmp_path, input_file):
+    runs = []
+    for _ in range(2):
+        assert not cached_conversion(str(tmp_path / 'cache'), 'depth2circos', 1, [input_file], dict(), dict({'circosData': '-'}), lambda: runs.append(1))
+    assert len(runs) == 2
+    assert not os.path.exists(tmp_path / 'cache')
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    for age, key in enumerate(['newest', 'middle', 'oldest']):
+        entry = cache_dir / key
+        entry.mkdir(parents=True)
+        (entry / 'circosData').write_bytes(b'x' * 400)
+        os.utime(entry, (1000 - age, 1000 - age))
+    (cache_dir / '.staging.1').mkdir()
+
+    evict(str(cache_dir), 1000 / 1e9)
+    assert sorted(os.listdir(cache_dir)) == ['.staging.1', 'middle', 'newest']
+    evict(str(cache_dir), 0)
+    assert sorted(os.listdir(cache_dir)) == ['.staging.1']
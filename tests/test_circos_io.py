@@ -0,0 +1,41 @@
+import random
+
+from circos_io import circos_sort_key, karyotype_key, sorted_lines
+
+
+chromosomeList = [str(i) for i in range(1, 23)] + ['X', 'Y']
+
+
+def random_lines(seed, n=500):
+    rng = random.Random(seed)
+    chromosomes = chromosomeList + ['GL000192.1', 'MT']
+    return [f'{rng.choice(chromosomes)}\t{rng.randint(1, 100000)}\t{rng.random():.3f}\n' for _ in range(n)]
+
+
+def test_sorted_lines_matches_sorted():
+    lines = random_lines(seed=1)
+    key = karyotype_key(chromosomeList)
+    for chunk_size in [1, 7, 100, 10000]:
+        assert list(sorted_lines(iter(lines), key, chunk_size=chunk_size)) == sorted(lines, key=key)
+
+
+def test_sorted_lines_keeps_the_header_first():
+    header = ['##fileformat=VCFv4.1\n', '#CHROM\tPOS\n']
+    lines = random_lines(seed=2, n=50)
+    key = karyotype_key(chromosomeList)
+    assert list(sorted_lines(iter(header + lines), key, chunk_size=7)) == header + sorted(lines, key=key)
+
+
+def test_sorted_lines_terminates_the_last_line():
+    lines = ['2\t5\tb\n', '1\t9\ta']
+    assert list(sorted_lines(iter(lines), karyotype_key(chromosomeList), chunk_size=1)) == ['1\t9\ta\n', '2\t5\tb\n']
+
+
+def test_karyotype_key_orders_other_contigs_after_by_name():
+    lines = ['MT\t1\t.\n', 'X\t1\t.\n', '10\t1\t.\n', '2\t1\t.\n', 'GL000192.1\t1\t.\n']
+    assert sorted(lines, key=karyotype_key(chromosomeList)) == ['2\t1\t.\n', '10\t1\t.\n', 'X\t1\t.\n', 'GL000192.1\t1\t.\n', 'MT\t1\t.\n']
+
+
+def test_circos_sort_key_sorts_hs_chromosomes_in_karyotype_order():
+    lines = ['hs10\t5\t5\t1\n', 'hs2\t7\t7\t1\n', 'hs2\t3\t3\t1\n', 'hsX\t1\t1\t1\n']
+    assert sorted(lines, key=circos_sort_key) == ['hs2\t3\t3\t1\n', 'hs2\t7\t7\t1\n', 'hs10\t5\t5\t1\n', 'hsX\t1\t1\t1\n']
@@ -0,0 +1,56 @@
+import pysam
+
+import delly_vs_manta
+from circos_stats import collect_counts, counted, stats
+from sv2circos import iter_sv_links, iter_sv_links_cyvcf2, parse_sv_vcf
+from sv_fixtures import callsets, write_vcf
+
+
+def count_records(n):
+    stats.count('records_read', n)
+    return n * 2
+
+
+def test_counted_returns_only_the_counts_of_the_call():
+    stats.counters.clear()
+    stats.count('records_read', 5)
+    result, counts = counted(count_records, 3)
+    assert (result, counts) == (6, dict({'records_read': 3}))
+    stats.counters.clear()
+    assert collect_counts((result, counts)) == 6
+    assert stats.counters == dict({'records_read': 3})
+
+
+def run_counted(function, *args, **kwargs):
+    stats.counters.clear()
+    function(*args, **kwargs)
+    return dict(stats.counters)
+
+
+def test_counts_of_worker_processes_reach_the_parent(tmp_path):
+    manta, delly = callsets(seed=2)
+    vcf1, vcf2 = str(write_vcf(tmp_path / 'manta.vcf', manta)), str(write_vcf(tmp_path / 'delly.vcf', delly))
+    with open(vcf2, 'a') as f:
+        f.write('4\t900000\tsingle\tN\tN.\t.\tPASS\tSVTYPE=BND\n')
+    serial = run_counted(delly_vs_manta.load_tables, [vcf1, vcf2])
+    assert serial['skipped_single_breakend'] == 1
+    assert run_counted(delly_vs_manta.load_tables, [vcf1, vcf2], threads=2) == serial
+
+    # converted one chromosome per process from a tabix index
+    indexed = pysam.tabix_index(vcf1, preset='vcf', keep_original=True)
+    serial = run_counted(parse_sv_vcf, vcf1, str(tmp_path / 'serial.circosData'), 'delly', 1000)
+    assert serial['records_read'] == len(manta)
+    assert run_counted(parse_sv_vcf, indexed, str(tmp_path / 'parallel.circosData'), 'delly', 1000, threads=2) == serial
+
+
+def test_sv_links_count_filtered_records_once_consumed(tmp_path):
+    manta, delly = callsets(seed=3)
+    vcf = str(write_vcf(tmp_path / 'delly.vcf', delly + [('DEL', '5', 1000, '5', 1500)]))
+    with open(vcf, 'a') as f:
+        f.write('GL000192.1\t100\tunplaced\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;CHR2=GL000192.1;END=90000\n')
+    with open(vcf) as f:
+        tokenizer = run_counted(lambda: list(iter_sv_links(f, 'delly', 1000)))
+    assert (tokenizer['records_read'], tokenizer['filtered_contig']) == (len(delly) + 2, 1)
+    assert tokenizer['filtered_distance'] >= 1
+    assert tokenizer['records_written'] == len(delly) + 1 - tokenizer['filtered_distance']
+    assert run_counted(lambda: list(iter_sv_links_cyvcf2(vcf, 'delly', 1000))) == tokenizer
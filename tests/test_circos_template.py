@@ -0,0 +1,75 @@
+import os
+import re
+
+import pytest
+
+from circosConfigPrep import create_configuration
+from circos_template import Template, load_template, read_manifest, render_manifest
+
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def baseline_configuration(template, sv, cnv, snv_vaf, snv_rainfall, circosConfig, circosPlot):
+    '''create_configuration as it was before the template engine, one regular expression per line'''
+    with open(template, 'r') as f, open(circosConfig, 'w') as g:
+        for line in f:
+            if re.search(string=line, pattern=r'<OUTPUTFILE>') != None:
+                line = re.sub(string=line, pattern=r'<OUTPUTFILE>', repl=circosPlot)
+            elif re.search(string=line, pattern=r'<SVCIRCOS>') != None:
+                line = re.sub(string=line, pattern=r'<SVCIRCOS>', repl=sv)
+            elif re.search(string=line, pattern=r'<CNVCIRCOS>') != None:
+                line = re.sub(string=line, pattern=r'<CNVCIRCOS>', repl=cnv)
+            elif re.search(string=line, pattern=r'<SNV_VAF_CIRCOS') != None:
+                line = re.sub(string=line, pattern=r'<SNV_VAF_CIRCOS>', repl=snv_vaf)
+            elif re.search(string=line, pattern=r'<SNV_RAINFALL_CIRCOS') != None:
+                line = re.sub(string=line, pattern=r'<SNV_RAINFALL_CIRCOS>', repl=snv_rainfall)
+            g.write(line)
+
+
+def test_bundled_template_renders_like_baseline(tmp_path):
+    paths = ['/data/s1.sv.circosData', '/data/s1.cnv.circosData', '/data/s1.vaf.circosData', '/data/s1.rainfall.circosData']
+    template = os.path.join(repository, 'circos_full_template.conf')
+    baseline_configuration(template, *paths, tmp_path / 'baseline.conf', '/plots/s1.png')
+    create_configuration(template, *paths, tmp_path / 'engine.conf', '/plots/s1.png')
+    with open(tmp_path / 'baseline.conf') as f, open(tmp_path / 'engine.conf') as g:
+        assert g.read() == f.read()
+
+
+def test_render_leaves_circos_blocks_alone():
+    template = Template('<plots>\nfile = <SVCIRCOS>\n<<include etc/housekeeping.conf>>\n</plots>\n')
+    assert template.placeholders == frozenset(['SVCIRCOS'])
+    assert template.render(dict({'SVCIRCOS': 'a.circosData'})) == '<plots>\nfile = a.circosData\n<<include etc/housekeeping.conf>>\n</plots>\n'
+
+
+def test_render_inserts_values_literally():
+    assert Template('file = <SVCIRCOS>').render(dict({'SVCIRCOS': r'C:\data\1.circosData'})) == r'file = C:\data\1.circosData'
+
+
+def test_render_names_unbound_placeholders():
+    with pytest.raises(ValueError, match='CNVCIRCOS, SVCIRCOS'):
+        Template('<SVCIRCOS> <CNVCIRCOS> <OUTPUTFILE>').render(dict({'OUTPUTFILE': 'x.png'}))
+
+
+def test_load_template_reloads_changed_file(tmp_path):
+    path = tmp_path / 'template.conf'
+    path.write_text('file = <SVCIRCOS>\n')
+    assert load_template(str(path)) is load_template(str(path))
+    path.write_text('file = <CNVCIRCOS>\n')
+    os.utime(path, (1, 1))
+    assert load_template(str(path)).placeholders == frozenset(['CNVCIRCOS'])
+
+
+def test_render_manifest_validates_every_sample_first(tmp_path):
+    manifest = tmp_path / 'samples.tsv'
+    manifest.write_text('sample\tsv\tcnv\nA\ta.sv\ta.cnv\n#skipped\tx\tx\nB\tb.sv\t\n')
+    samples = read_manifest(manifest)
+    assert samples == [('A', dict({'SVCIRCOS': 'a.sv', 'CNVCIRCOS': 'a.cnv'})), ('B', dict({'SVCIRCOS': 'b.sv'}))]
+    template = Template('<SVCIRCOS> <CNVCIRCOS> <OUTPUTFILE>')
+    with pytest.raises(ValueError, match='B: CNVCIRCOS'):
+        render_manifest(template, samples, str(tmp_path))
+    assert not (tmp_path / 'A.conf').exists()
+
+    circosConfigs = render_manifest(template, samples, str(tmp_path), dict({'CNVCIRCOS': 'default.cnv'}))
+    assert circosConfigs == [str(tmp_path / 'A.conf'), str(tmp_path / 'B.conf')]
+    assert (tmp_path / 'B.conf').read_text() == f"b.sv default.cnv {tmp_path / 'B.circosPlot.png'}"
@@ -0,0 +1,88 @@
+import random
+
+from circos_tracks import adaptive_window, collapse_segments, downsample_track
+
+
+def naive_collapse(records, tolerance):
+    '''collapse_segments over a list, by index'''
+    segments = []
+    for chromosome, start, end, value in records:
+        if segments and segments[-1][0] == chromosome and abs(float(value) - float(segments[-1][3])) <= tolerance:
+            segments[-1] = (chromosome, segments[-1][1], end, segments[-1][3])
+        else:
+            segments.append((chromosome, start, end, value))
+    return segments
+
+
+def cnv_records(seed, n=3000):
+    rng = random.Random(seed)
+    records = []
+    for chromosome in ['1', '2', 'X']:
+        value = 0.0
+        for i in range(n // 3):
+            if rng.random() < 0.3:
+                value = round(rng.uniform(-2, 2), 1)
+            records.append((chromosome, i * 1000, (i + 1) * 1000, str(value)))
+    return records
+
+
+def test_collapse_segments_matches_naive_merge():
+    for tolerance in [0, 0.1, 0.5]:
+        records = cnv_records(seed=1)
+        assert list(collapse_segments(iter(records), tolerance)) == naive_collapse(records, tolerance)
+
+
+def test_collapse_segments_keeps_chromosomes_apart():
+    records = [('1', 0, 10, '1.0'), ('2', 0, 10, '1.0')]
+    assert list(collapse_segments(records)) == records
+
+
+def track_lines(seed, n=5000):
+    rng = random.Random(seed)
+    lines = ['# chr1 start1 end1 chr2 start2 end2 [options]\n']
+    for chromosome in ['hs1', 'hs2', 'hsGL000192.1']:
+        for position in sorted(rng.sample(range(1, 2000000), n)):
+            lines.append(f'{chromosome}\t{position}\t{position}\t{rng.uniform(0, 1):.4f}\tcolor=red\n')
+    return lines
+
+
+def naive_downsample(lines, max_points, cluster_distance):
+    '''lowest and highest point of every bin plus clustered points, from whole chromosomes in memory'''
+    reduced = []
+    chromosomes = dict()
+    for line in lines:
+        chromosomes.setdefault(line.split('\t', 1)[0], []).append(line)
+    for circosChr, group in chromosomes.items():
+        if circosChr.startswith('#') or circosChr == 'hsGL000192.1':
+            reduced.extend(group)
+            continue
+        bin_size = adaptive_window(circosChr[2:], max(1, max_points // 2))
+        points = [(int(line.split('\t')[1]), float(line.split('\t')[3]), line) for line in group]
+        bins = dict()
+        for i, point in enumerate(points):
+            bins.setdefault(point[0] // bin_size, []).append(i)
+        for members in bins.values():
+            kept = set([min(members, key=lambda i: points[i][1]), max(members, key=lambda i: points[i][1])])
+            for i in members:
+                near_previous = i > 0 and points[i][0] - points[i - 1][0] <= cluster_distance
+                near_next = i + 1 < len(points) and points[i + 1][0] - points[i][0] <= cluster_distance
+                if cluster_distance > 0 and (near_previous or near_next):
+                    kept.add(i)
+            reduced.extend(points[i][2] for i in sorted(kept))
+    return reduced
+
+
+def test_downsample_track_matches_naive_binning():
+    lines = track_lines(seed=2)
+    for max_points, cluster_distance in [(100, 0), (1000, 0), (100, 50), (10, 2000)]:
+        assert list(downsample_track(iter(lines), max_points, cluster_distance)) == naive_downsample(lines, max_points, cluster_distance)
+
+
+def test_downsample_track_keeps_extremes():
+    lines = track_lines(seed=3)
+    reduced = list(downsample_track(iter(lines), 50))
+    hs1 = [line for line in lines if line.startswith('hs1\t')]
+    values = [float(line.split('\t')[3]) for line in hs1]
+    assert hs1[values.index(min(values))] in reduced
+    assert hs1[values.index(max(values))] in reduced
+    assert len([line for line in reduced if line.startswith('hs1\t')]) <= 50
@@ -0,0 +1,74 @@
+import random
+
+import pysam
+import pytest
+
+from cnvkit2circos import chrDict, iter_cnvkit_lines, parse_cnvkit_cns
+
+
+def cnr_lines(seed, n=2000):
+    rng = random.Random(seed)
+    lines = ['chromosome\tstart\tend\tgene\tlog2\tdepth\tweight\n']
+    for chromosome in ['1', '2', 'X', 'GL000192.1']:
+        log2 = 0.0
+        for i in range(n // 4):
+            if rng.random() < 0.2:
+                log2 = rng.choice([-1.0, -0.4, 0.0, 0.3, 0.35, 0.6])
+            lines.append(f'{chromosome}\t{i * 1000}\t{(i + 1) * 1000}\t-\t{log2}\t{rng.uniform(5, 60):.3f}\t0.9\n')
+    return lines
+
+
+def baseline_cnvkit(lines):
+    '''parse_cnvkit_cns as it was before the chunked reader, one line at a time'''
+    for line in lines:
+        if not line.startswith('chromosome'):
+            chr, start, end, _, log2, depth, *args = line.strip().split()
+            if chr in chrDict.keys():
+                yield f'{chrDict[chr]}\t{start}\t{end}\t{log2}\n'
+
+
+def naive_collapse(lines, tolerance):
+    '''consecutive baseline lines of a chromosome merged while within tolerance of the first log2 of the segment'''
+    segments = []
+    for line in lines:
+        chromosome, start, end, log2 = line.split()
+        if segments and segments[-1][0] == chromosome and abs(float(log2) - float(segments[-1][3])) <= tolerance:
+            segments[-1][2] = end
+        else:
+            segments.append([chromosome, start, end, log2])
+    return ['\t'.join(segment) + '\n' for segment in segments]
+
+
+def test_chunked_reader_matches_baseline():
+    lines = cnr_lines(seed=1)
+    expected = list(baseline_cnvkit(lines))
+    for chunk_size in [7, 333, 100000]:
+        assert list(iter_cnvkit_lines(iter(lines), chunk_size)) == expected
+
+
+def test_chunked_reader_drops_na_log2():
+    lines = cnr_lines(seed=2, n=40)
+    fields = lines[3].split('\t')
+    lines[3] = '\t'.join(fields[:4] + ['NA'] + fields[5:])
+    expected = [line for i, line in enumerate(baseline_cnvkit(lines), start=1) if i != 3]
+    assert list(iter_cnvkit_lines(iter(lines), chunk_size=4)) == expected
+
+
+@pytest.mark.parametrize('tolerance', [0, 0.05, 0.5])
+def test_collapse_merges_runs_of_close_log2(tolerance):
+    lines = cnr_lines(seed=3, n=800)
+    expected = naive_collapse(baseline_cnvkit(lines), tolerance)
+    assert len(expected) < len(lines) / 2
+    for chunk_size in [7, 100000]:
+        assert list(iter_cnvkit_lines(iter(lines), chunk_size, collapse=True, tolerance=tolerance)) == expected
+
+
+def test_tabix_indexed_input_is_converted_per_chromosome(tmp_path):
+    with open(tmp_path / 'sample.cnr', 'w') as f:
+        f.writelines(cnr_lines(seed=4))
+    indexed = pysam.tabix_index(str(tmp_path / 'sample.cnr'), seq_col=0, start_col=1, end_col=2, line_skip=1, zerobased=True, keep_original=True)
+    for collapse in [False, True]:
+        parse_cnvkit_cns(str(tmp_path / 'sample.cnr'), str(tmp_path / 'serial.circosData'), collapse=collapse)
+        parse_cnvkit_cns(indexed, str(tmp_path / 'parallel.circosData'), chunk_size=10, collapse=collapse, threads=2)
+        with open(tmp_path / 'serial.circosData') as f, open(tmp_path / 'parallel.circosData') as g:
+            assert g.read() == f.read()
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+import delly_vs_manta
+from delly_vs_manta import BreakpointTable, Position, compare_breakpoints, compare_breakpoints_streaming, compared_svtypes, load_tables, svtype_codes
+from sv_fixtures import callsets, random_events, write_vcf
+
+
+def baseline_support(upstream_bp1, downstream_bp1, upstream_bp2, downstream_bp2, distance_threshold):
+    '''support_breakpoint as it was before BreakpointTable, one Position pair at a time'''
+    mask = 0
+    edge_number = 1
+    for bp1 in [upstream_bp1, downstream_bp1]:
+        for bp2 in [upstream_bp2, downstream_bp2]:
+            if Position.overlap(bp1.extend('both', distance_threshold), bp2):
+                mask += edge_number
+            edge_number *= 2
+    return delly_vs_manta.support_dict[mask]
+
+
+def positions(events):
+    return [(Position(chromosome1, position1, position1 + 1), Position(chromosome2, position2, position2 + 1))
+            for _, chromosome1, position1, chromosome2, position2 in events]
+
+
+def table(events, chromosome_codes):
+    columns = list(zip(*events))
+    starts1, starts2 = np.array(columns[2]), np.array(columns[4])
+    return BreakpointTable(chromosome_codes, [chromosome_codes.setdefault(chromosome, len(chromosome_codes)) for chromosome in columns[1]],
+                           starts1, starts1 + 1, [chromosome_codes.setdefault(chromosome, len(chromosome_codes)) for chromosome in columns[3]],
+                           starts2, starts2 + 1, [svtype_codes[svtype] for svtype in columns[0]], np.zeros(len(events)))
+
+
+@pytest.mark.parametrize('distance_threshold', [50, 1000, 20000])
+def test_supported_by_matches_support_breakpoint_loop(distance_threshold):
+    manta, delly = callsets(seed=3, n=300)
+    chromosome_codes = dict()
+    manta_table, delly_table = table(manta, chromosome_codes), table(delly, chromosome_codes)
+    for svtype in compared_svtypes:
+        rows1 = [i for i, event in enumerate(manta) if event[0] == svtype]
+        rows2 = [i for i, event in enumerate(delly) if event[0] == svtype]
+        pairs2 = positions([delly[i] for i in rows2])
+        expected = [any(baseline_support(bp1, bp2, other1, other2, distance_threshold) == 2 for other1, other2 in pairs2)
+                    for bp1, bp2 in positions([manta[i] for i in rows1])]
+        supported = manta_table.select(rows1).supported_by(delly_table.select(rows2), distance_threshold)
+        assert supported.tolist() == expected
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+@pytest.mark.parametrize('distance_threshold', [50, 300, 1000, 20000])
+def test_streaming_matches_compare_breakpoints_in_either_order(tmp_path, seed, distance_threshold):
+    manta, delly = callsets(seed)
+    vcfs = dict({'manta': write_vcf(tmp_path / 'manta.vcf', manta), 'delly': write_vcf(tmp_path / 'delly.vcf', delly)})
+    for vcf1, vcf2 in [('manta', 'delly'), ('delly', 'manta')]:
+        compare_breakpoints(str(vcfs[vcf1]), str(vcfs[vcf2]), distance_threshold, tmp_path / 'all.circosData')
+        compare_breakpoints_streaming(str(vcfs[vcf1]), str(vcfs[vcf2]), distance_threshold, tmp_path / 'streamed.circosData')
+        with open(tmp_path / 'all.circosData') as f, open(tmp_path / 'streamed.circosData') as g:
+            assert sorted(g) == sorted(f)
+
+
+def test_streaming_without_contig_lines(tmp_path):
+    manta, delly = callsets(seed=5)
+    # contigs appear in a different order in the two files, neither declares them
+    manta = [event for event in manta if event[1] in ('1', '3')]
+    delly = [event for event in delly if event[1] in ('2', '3')]
+    vcf1 = str(write_vcf(tmp_path / 'manta.vcf', manta, contigs=False))
+    vcf2 = str(write_vcf(tmp_path / 'delly.vcf', delly, contigs=False))
+    compare_breakpoints(vcf1, vcf2, 1000, tmp_path / 'all.circosData')
+    compare_breakpoints_streaming(vcf1, vcf2, 1000, tmp_path / 'streamed.circosData')
+    with open(tmp_path / 'all.circosData') as f, open(tmp_path / 'streamed.circosData') as g:
+        assert sorted(g) == sorted(f)
+
+
+def reverse_records(vcf, path):
+    '''copy of vcf with its records in reverse order'''
+    with open(vcf) as f:
+        lines = f.readlines()
+    with open(path, 'w') as f:
+        f.writelines([line for line in lines if line.startswith('#')] + [line for line in lines if not line.startswith('#')][::-1])
+    return str(path)
+
+
+def test_streaming_rejects_unsorted_input(tmp_path):
+    vcf = write_vcf(tmp_path / 'sorted.vcf', random_events(seed=7, n=50))
+    with pytest.raises(ValueError):
+        compare_breakpoints_streaming(reverse_records(vcf, tmp_path / 'unsorted.vcf'), str(vcf), 1000, tmp_path / 'out.circosData')
+
+
+def test_streaming_sorts_unsorted_input(tmp_path):
+    vcf = write_vcf(tmp_path / 'sorted.vcf', random_events(seed=7, n=50))
+    unsorted = reverse_records(vcf, tmp_path / 'unsorted.vcf')
+    compare_breakpoints_streaming(unsorted, str(vcf), 1000, tmp_path / 'out.circosData', unsorted=True)
+    compare_breakpoints(unsorted, str(vcf), 1000, tmp_path / 'all.circosData')
+    with open(tmp_path / 'all.circosData') as f, open(tmp_path / 'out.circosData') as g:
+        assert sorted(g) == sorted(f)
+
+
+def test_fromvcf_skips_single_breakends_and_unknown_types(tmp_path):
+    vcf = write_vcf(tmp_path / 'gridss.vcf', [('DEL', '1', 100, '1', 900)])
+    with open(vcf, 'a') as f:
+        f.write('1\t500\tsingle\tN\tN.\t.\tPASS\tSVTYPE=BND\n')
+        f.write('2\t100\tcomplex\tN\t<CPX>\t.\tPASS\tSVTYPE=CPX;END=900\n')
+    delly_vs_manta.stats.counters.clear()
+    breakpoints = BreakpointTable.fromvcf(str(vcf))
+    assert len(breakpoints) == 1
+    assert delly_vs_manta.stats.counters['skipped_single_breakend'] == 1
+    assert delly_vs_manta.stats.counters['skipped_svtype'] == 1
+
+
+@pytest.mark.parametrize('distance_threshold', [50, 1000])
+def test_stats_count_records_dropped_by_type_and_distance(tmp_path, distance_threshold):
+    manta, delly = callsets(seed=4)
+    vcf1 = write_vcf(tmp_path / 'manta.vcf', manta + [('TRA', '1', 100, '2', 900), ('TRA', '3', 500, '4', 700)])
+    with open(vcf1, 'a') as f:
+        f.write('4\t900000\tcomplex\tN\t<CPX>\t.\tPASS\tSVTYPE=CPX;END=900900\n')
+    vcf2 = write_vcf(tmp_path / 'delly.vcf', delly)
+    counts = []
+    for compare in [compare_breakpoints, compare_breakpoints_streaming]:
+        delly_vs_manta.stats.counters.clear()
+        compare(str(vcf1), str(vcf2), distance_threshold, tmp_path / 'sv.circosData')
+        counts.append(+delly_vs_manta.stats.counters) # without the zero counts of the batch comparison
+    assert counts[0] == counts[1]
+    assert (counts[0]['filtered_svtype'], counts[0]['skipped_svtype']) == (2, 1)
+    # every record of vcf1 with a known type is either written or dropped by one of the filters
+    assert counts[0]['records_written'] + counts[0]['filtered_svtype'] + counts[0]['filtered_distance'] == len(manta) + 2
+
+
+def test_concurrent_parsing_and_matching_match_serial(tmp_path):
+    manta, delly = callsets(seed=9)
+    vcf1, vcf2 = str(write_vcf(tmp_path / 'manta.vcf', manta)), str(write_vcf(tmp_path / 'delly.vcf', delly))
+    serial, concurrent = load_tables([vcf1, vcf2]), load_tables([vcf1, vcf2], threads=2)
+    assert serial[0].chromosome_codes == concurrent[0].chromosome_codes
+    for table, other in zip(serial, concurrent):
+        for column in BreakpointTable.columns:
+            assert getattr(table, column).tolist() == getattr(other, column).tolist()
+    compare_breakpoints(vcf1, vcf2, 1000, tmp_path / 'serial.circosData')
+    compare_breakpoints(vcf1, vcf2, 1000, tmp_path / 'concurrent.circosData', threads=2)
+    assert (tmp_path / 'concurrent.circosData').read_text() == (tmp_path / 'serial.circosData').read_text()
@@ -0,0 +1,67 @@
+import gzip
+import os
+import random
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from circos_tracks import adaptive_window, chromosomeLength
+from depth2circos import chrDict, iter_depth_points, iter_depth_windows, window_statistic
+
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def depth_lines(seed, n=3000):
+    rng = random.Random(seed)
+    lines = []
+    for chromosome in ['1', '2', 'GL000192.1', 'MT']:
+        for position in sorted(rng.sample(range(1, 16000), n // 4)):
+            lines.append(f'{chromosome}\t{position}\t{rng.randint(0, 80)}\n')
+    return lines
+
+
+def naive_windows(lines, window, statistic, target_points=None):
+    '''windowed depth from all lines in memory, grouped by chromosome and window'''
+    windows = dict()
+    for line in lines:
+        chromosome, position, depth = line.split()
+        if chromosome not in chrDict:
+            continue
+        size = adaptive_window(chromosome, target_points) if target_points != None else window
+        windows.setdefault((chromosome, size, (int(position) - 1) // size), []).append(int(depth))
+    for (chromosome, size, index), depths in windows.items():
+        end = min((index + 1) * size, chromosomeLength[chromosome])
+        yield f'{chrDict[chromosome]}\t{index * size + 1}\t{end}\t{window_statistic[statistic](np.array(depths)):.2f}\n'
+
+
+@pytest.mark.parametrize('statistic', ['mean', 'median', 'max'])
+def test_windows_match_naive_grouping(statistic):
+    lines = depth_lines(seed=1)
+    for window in [1, 100, 5000]:
+        expected = list(naive_windows(lines, window, statistic))
+        for chunk_size in [1, 7, 1000, 100000]:
+            assert list(iter_depth_windows(iter(lines), window, statistic, chunk_size=chunk_size)) == expected
+
+
+def test_target_points_sizes_windows_per_chromosome():
+    lines = depth_lines(seed=2)
+    expected = list(naive_windows(lines, None, 'mean', target_points=20000))
+    assert list(iter_depth_windows(iter(lines), None, 'mean', target_points=20000, chunk_size=50)) == expected
+
+
+def test_window_of_one_base_is_every_point():
+    lines = depth_lines(seed=3)
+    points = [line.replace('\n', '.00\n') for line in iter_depth_points(lines)]
+    assert list(iter_depth_windows(iter(lines), 1, 'mean', chunk_size=13)) == points
+
+
+def test_pipes_through_stdin_and_stdout():
+    lines = depth_lines(seed=4)
+    header = '# chr1 start1 end1 chr2 start2 end2 [options]\n'
+    for stdin in [''.join(lines).encode(), gzip.compress(''.join(lines).encode())]:
+        command = [sys.executable, os.path.join(repository, 'depth2circos.py'), '-i', '-', '-o', '-', '-w', '100']
+        output = subprocess.run(command, input=stdin, stdout=subprocess.PIPE, check=True).stdout.decode()
+        assert output == header + ''.join(naive_windows(lines, 100, 'mean'))
@@ -0,0 +1,71 @@
+import os
+import time
+
+import pytest
+
+from run_cohort import process_sample, run_cohort, sample_outputs
+from sv_fixtures import callsets, write_vcf
+
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+template = os.path.join(repository, 'circos_full_template.conf')
+
+snv_vcf = '''##fileformat=VCFv4.1
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tTUMOR\tNORMAL
+1\t100\t.\tC\tT\t.\tPASS\t.\tGT:FA\t0/1:0.3\t0/0:0.0
+1\t250\t.\tG\tA\t.\tPASS\t.\tGT:FA\t0/1:0.5\t0/0:0.0
+'''
+
+cns = '''chromosome\tstart\tend\tgene\tlog2\tdepth\tweight
+1\t0\t1000\t-\t0.2\t30\t0.9
+2\t0\t1000\t-\t-0.4\t30\t0.9
+'''
+
+
+def sample(directory, name, snv=snv_vcf):
+    '''inputs of one sample in directory, named as a pipeline would name them whatever the sample'''
+    os.makedirs(directory, exist_ok=True)
+    manta, delly = callsets(seed=1, n=50)
+    paths = dict({'sample': name, 'delly': str(write_vcf(os.path.join(directory, 'delly.vcf'), delly)),
+                  'manta': str(write_vcf(os.path.join(directory, 'manta.vcf'), manta))})
+    for column, filename, text in [('cnv', 'tumor.cns', cns), ('snv', 'mutect.vcf', snv)]:
+        paths[column] = os.path.join(directory, filename)
+        with open(paths[column], 'w') as f:
+            f.write(text)
+    for column in ['delly', 'manta', 'cnv', 'snv']:
+        os.utime(paths[column], (time.time() - 100, time.time() - 100))
+    return paths
+
+
+def test_process_sample_skips_up_to_date_steps(tmp_path):
+    inputs = sample(tmp_path / 'A', 'A')
+    output_dir = str(tmp_path / 'out')
+    os.makedirs(output_dir)
+    assert process_sample(inputs, template, output_dir, 1000, 'mutect') == ['sv', 'cnv', 'snv', 'config']
+    assert all(os.path.isfile(path) for step, path in sample_outputs(inputs, output_dir).items() if step != 'plot')
+    assert process_sample(inputs, template, output_dir, 1000, 'mutect') == []
+
+    os.utime(inputs['cnv'], (time.time() + 100, time.time() + 100)) # the CNV calls changed
+    assert process_sample(inputs, template, output_dir, 1000, 'mutect') == ['cnv', 'config']
+    assert process_sample(inputs, template, output_dir, 1000, 'mutect', force=True) == ['sv', 'cnv', 'snv', 'config']
+
+
+def test_samples_with_the_same_input_names_get_their_own_outputs(tmp_path):
+    samples = [sample(tmp_path / name, name) for name in ['A', 'B']]
+    outputs = [sample_outputs(inputs, str(tmp_path)) for inputs in samples]
+    assert set(outputs[0].values()).isdisjoint(outputs[1].values())
+    assert all(os.path.basename(path).startswith('A') for path in outputs[0].values())
+
+
+def test_failed_step_leaves_no_output_and_is_counted(tmp_path, capsys):
+    samples = [sample(tmp_path / 'A', 'A'), sample(tmp_path / 'B', 'B', snv='1\t100\t.\tC\tT\n')] # B has no vcf header
+    with pytest.raises(ValueError):
+        process_sample(samples[1], template, str(tmp_path), 1000, 'mutect')
+    outputs = sample_outputs(samples[1], str(tmp_path))
+    assert os.path.isfile(outputs['cnv'])
+    assert not os.path.exists(outputs['vaf']) and not os.path.exists(outputs['rainfall'])
+
+    assert run_cohort(samples, template, str(tmp_path), 1000, 'mutect', jobs=2) == 1
+    printed = capsys.readouterr().out
+    assert 'A: ran sv, cnv, snv, config' in printed
+    assert 'B: failed: ValueError' in printed
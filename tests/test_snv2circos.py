@@ -0,0 +1,186 @@
+import io
+import math
+import os
+import random
+import subprocess
+import sys
+
+import numpy as np
+import pysam
+import pytest
+
+from snv2circos import chrDict, iter_snv_track, kataegis_foci, parse_snv_track, parse_snv_vcf, track_outputs, write_snv_tracks
+
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+header = '''##fileformat=VCFv4.1
+##FORMAT=<ID=FA,Number=A,Type=Float,Description="allele fraction">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tTUMOR\tNORMAL
+'''
+
+
+def snv_vcf(seed, n=2000):
+    rng = random.Random(seed)
+    lines = header.splitlines(keepends=True)
+    for chromosome in ['1', '2', 'GL000192.1', 'X']:
+        for position in sorted(rng.sample(range(1, 400000), n // 4)):
+            ref, alt = rng.sample('ACGT', 2)
+            lines.append(f'{chromosome}\t{position}\t.\t{ref}\t{alt}\t.\tPASS\t.\tGT:AD:BQ:DP:FA\t0/1:5,5:30:10:{rng.random():.3f}\t0/0:9,0:30:9:0.0\n')
+    return lines
+
+
+def baseline_rainfall(lines):
+    '''the rainfall lines of snv2circos before the distance tracks, one SNV at a time'''
+    from snv2circos import SNV_change_color, complementSNV_change
+    previous_chromosome, previous_position = None, 0
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        CHROM, POS, ID, REF, ALT, QUAL, FILTER, INFO, FORMAT, TUMOR, NORMAL = line.strip().split()
+        if CHROM not in chrDict:
+            continue
+        basechange = f'{REF}>{ALT}'
+        if REF in ['G', 'A']:
+            basechange = complementSNV_change[basechange]
+        distance = int(POS) - previous_position if CHROM == previous_chromosome else 1
+        previous_chromosome, previous_position = CHROM, int(POS)
+        yield f'{chrDict[CHROM]}\t{POS}\t{POS}\t{math.log10(distance)}\tcolor={SNV_change_color[basechange]}\n'
+
+
+def test_rainfall_matches_baseline():
+    lines = snv_vcf(seed=1)
+    assert list(iter_snv_track(lines, 'rainfall', 'mutect')) == list(baseline_rainfall(lines))
+
+
+def test_distance_tracks_stream_one_chromosome_at_a_time():
+    read = []
+    def lines():
+        for line in snv_vcf(seed=2):
+            read.append(line)
+            yield line
+    track = iter_snv_track(lines(), 'rainfall', 'mutect')
+    first = next(track)
+    assert first.startswith('hs1\t')
+    assert read[-1].startswith('2\t') # the first chromosome is written once the second starts
+
+
+def test_distance_tracks_reject_interleaved_chromosomes():
+    lines = snv_vcf(seed=3)
+    header_lines = [line for line in lines if line.startswith('#')]
+    data = lines[len(header_lines):]
+    interleaved = header_lines + data[:10] + [line for line in data if line.startswith('2\t')][:5] + data[10:20]
+    with pytest.raises(ValueError):
+        list(iter_snv_track(interleaved, 'rainfall', 'mutect'))
+
+
+def test_single_pass_tracks_match_single_tracks():
+    lines = snv_vcf(seed=4)
+    handles = dict({'vaf': io.StringIO(), 'rainfall': io.StringIO(), 'kataegis': io.StringIO()})
+    write_snv_tracks(lines, handles, 'mutect', track_options=dict({'kataegis': dict({'mean_distance': 2000})}))
+    assert handles['vaf'].getvalue() == ''.join(iter_snv_track(lines, 'vaf', 'mutect'))
+    assert handles['rainfall'].getvalue() == ''.join(iter_snv_track(lines, 'rainfall', 'mutect'))
+    assert handles['kataegis'].getvalue() == ''.join(iter_snv_track(lines, 'kataegis', 'mutect', mean_distance=2000))
+
+
+def definition_foci(positions, min_mutations, mean_distance):
+    '''kataegis foci by their definition: every run of min_mutations consecutive SNVs with a mean intermutation distance
+    of at most mean_distance, runs that share SNVs joined into one focus'''
+    runs = [set(range(first, first + min_mutations)) for first in range(len(positions) - min_mutations + 1)
+            if (positions[first + min_mutations - 1] - positions[first]) / (min_mutations - 1) <= mean_distance]
+    foci = []
+    for run in runs:
+        if foci and foci[-1] & run:
+            foci[-1] |= run
+        else:
+            foci.append(run)
+    return [(min(focus), max(focus)) for focus in foci]
+
+
+def test_kataegis_foci_match_definition():
+    rng = np.random.default_rng(1)
+    for _ in range(2000):
+        positions = np.sort(rng.integers(0, rng.integers(1, 40000), rng.integers(0, 60)))
+        min_mutations, mean_distance = int(rng.integers(2, 8)), int(rng.integers(1, 2000))
+        assert kataegis_foci(positions, min_mutations, mean_distance) == definition_foci(positions.tolist(), min_mutations, mean_distance)
+
+
+def test_focus_after_a_wide_first_gap():
+    # the first distance alone is above the threshold, the mean of the run is 380
+    assert kataegis_foci(np.array([0, 1500, 1600, 1700, 1800, 1900]), 6, 1000) == [(0, 5)]
+    assert kataegis_foci(np.array([0, 15, 16]), 3, 10) == [(0, 2)]
+
+
+def test_overlapping_dense_stretches_are_one_focus():
+    # two stretches of 6 SNVs sharing two SNVs, the union has a mean distance of 100
+    positions = np.arange(0, 1000, 100)
+    assert kataegis_foci(positions, 6, 1000) == [(0, 9)]
+    # a gap that raises the mean above the threshold ends the focus
+    positions = np.concatenate([np.arange(0, 600, 100), np.arange(100000, 100600, 100)])
+    assert kataegis_foci(positions, 6, 1000) == [(0, 5), (6, 11)]
+
+
+def vcf(samples, records):
+    return ['##fileformat=VCFv4.1\n', '\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT'] + samples) + '\n'] + \
+           [f'{chromosome}\t{position}\t.\t{REF}\t{ALT}\t.\tPASS\t.\t' + '\t'.join(fields) + '\n' for chromosome, position, REF, ALT, fields in records]
+
+
+def test_strelka_vaf_from_tier1_counts():
+    lines = vcf(['NORMAL', 'TUMOR'], [
+        ('1', 100, 'C', 'T', ['DP:AU:CU:GU:TU', '30:0,0:30,30:0,0:0,0', '40:0,0:30,31:0,0:10,12']),
+        ('1', 200, 'A', 'G', ['AU:CU:GU:TU:DP', '0,0:0,0:0,0:0,0:0', '0,0:0,0:0,0:0,0:0']), # another FORMAT, no coverage
+        ('GL000192.1', 300, 'C', 'T', ['DP:AU:CU:GU:TU', '30:0,0:30,30:0,0:0,0', '40:0,0:30,31:0,0:10,12'])])
+    assert list(iter_snv_track(lines, 'vaf', 'strelka')) == ['hs1\t100\t100\t0.2500\tcolor=red\n', 'hs1\t200\t200\t0\tcolor=yellow\n']
+
+
+def test_freebayes_vaf_of_the_chosen_sample():
+    lines = vcf(['normal', 'tumor'], [('2', 100, 'G', 'T', ['GT:RO:AO', '0/0:20:0', '0/1:6:2'])])
+    assert list(iter_snv_track(lines, 'vaf', 'freebayes', tumor_sample='tumor')) == ['hs2\t100\t100\t0.2500\tcolor=blue\n']
+    assert list(iter_snv_track(lines, 'vaf', 'freebayes', tumor_sample='normal')) == ['hs2\t100\t100\t0.0000\tcolor=blue\n']
+    with pytest.raises(ValueError):
+        list(iter_snv_track(lines, 'vaf', 'freebayes', tumor_sample='TUMOR'))
+
+
+def test_mutect2_tumor_sample_header_names_the_tumor_column():
+    lines = vcf(['normal', 'tumor'], [('3', 100, 'C', 'A', ['GT:AD:AF', '0/0:20,0:0.0', '0/1:6,2:0.25'])])
+    lines.insert(1, '##tumor_sample=tumor\n')
+    assert list(iter_snv_track(lines, 'vaf', 'mutect')) == ['hs3\t100\t100\t0.25\tcolor=blue\n']
+    assert list(iter_snv_track(lines, 'vaf', 'mutect', tumor_sample='normal')) == ['hs3\t100\t100\t0.0\tcolor=blue\n']
+
+
+def test_missing_vaf_field_names_caller_and_field():
+    lines = vcf(['TUMOR'], [('1', 100, 'C', 'T', ['GT:AD', '0/1:5,5'])])
+    with pytest.raises(ValueError, match='mutect VAF needs the FA or AF FORMAT field'):
+        list(iter_snv_track(lines, 'vaf', 'mutect'))
+    with pytest.raises(ValueError, match='freebayes VAF needs the AO FORMAT field'):
+        list(iter_snv_track(lines, 'vaf', 'freebayes'))
+    # tracks without VAF do not need the field
+    assert list(iter_snv_track(lines, 'rainfall', 'mutect')) == ['hs1\t100\t100\t0.0\tcolor=red\n']
+
+
+def test_tabix_indexed_vcf_is_converted_per_chromosome(tmp_path):
+    with open(tmp_path / 'snv.vcf', 'w') as f:
+        f.writelines(snv_vcf(seed=5))
+    indexed = pysam.tabix_index(str(tmp_path / 'snv.vcf'), preset='vcf', keep_original=True)
+    tracks = ['vaf', 'rainfall', 'kataegis']
+    parse_snv_vcf(str(tmp_path / 'snv.vcf'), dict({track: str(tmp_path / f'serial.{track}') for track in tracks}), 'mutect')
+    parse_snv_vcf(indexed, dict({track: str(tmp_path / f'parallel.{track}') for track in tracks}), 'mutect', threads=2)
+    parse_snv_track(indexed, str(tmp_path / 'single.rainfall'), 'rainfall', 'mutect', threads=2)
+    for track in tracks:
+        assert (tmp_path / f'parallel.{track}').read_text() == (tmp_path / f'serial.{track}').read_text()
+    assert (tmp_path / 'single.rainfall').read_text() == (tmp_path / 'serial.rainfall').read_text()
+
+
+def test_pipes_through_stdin_and_stdout():
+    lines = snv_vcf(seed=6)
+    command = [sys.executable, os.path.join(repository, 'snv2circos.py'), '-i', '-', '-c', 'mutect', '-y', 'rainfall', '-o', '-']
+    output = subprocess.run(command, input=''.join(lines), stdout=subprocess.PIPE, text=True, check=True).stdout
+    assert output == ''.join(iter_snv_track(lines, 'rainfall', 'mutect'))
+
+
+def test_track_outputs_follow_output():
+    assert track_outputs('snv.vcf', ['vaf', 'rainfall']) == dict({'vaf': 'snv.vcf.vaf.circosData', 'rainfall': 'snv.vcf.rainfall.circosData'})
+    assert track_outputs('snv.vcf', ['vaf'], 'tumor.circosData') == dict({'vaf': 'tumor.circosData'})
+    assert track_outputs('snv.vcf', ['vaf', 'rainfall'], 'tumor.circosData') == dict({'vaf': 'tumor.vaf.circosData', 'rainfall': 'tumor.rainfall.circosData'})
+    assert track_outputs('-', ['rainfall'], '-') == dict({'rainfall': '-'})
@@ -0,0 +1,12 @@
+from sv_consensus import consensus_links
+from sv_fixtures import write_vcf
+
+
+def test_tra_and_bnd_of_one_translocation_cluster(tmp_path):
+    delly = write_vcf(tmp_path / 'delly.vcf', [('TRA', '1', 1000, '5', 50000), ('DEL', '2', 500, '2', 9000)])
+    manta = write_vcf(tmp_path / 'manta.vcf', [('BND', '1', 1100, '5', 50100), ('BND', '5', 50100, '1', 1100), ('DEL', '2', 520, '2', 9010)])
+    with open(manta, 'a') as f:
+        f.write('3\t100\tsingle\tN\tN.\t.\tPASS\tSVTYPE=BND\n')
+        f.write('3\t200\tcomplex\tN\t<CPX>\t.\tPASS\tSVTYPE=CPX;END=900\n')
+    links = list(consensus_links([str(delly), str(manta)], ['delly', 'manta'], 2, 1000))
+    assert [(link[0], link[2], link[4], link[5]) for link in links] == [('1', '5', 'BND', ['delly', 'manta']), ('2', '2', 'DEL', ['delly', 'manta'])]